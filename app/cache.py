@@ -1,31 +1,100 @@
 import hashlib
 import json
 import math
+import sys
+import threading
+from collections import OrderedDict
 from datetime import datetime, timezone
+from . import timing
+
+
+class CachedObjects:
+    """An entry stored with EventRequestCache.set_object(): the items as
+    objects, plus the model to serialize them with when needed."""
+
+    def __init__(self, items: tuple, model):
+        self.items = items
+        self.model = model
+
+    def to_content(self) -> str:
+        return json.dumps(self.model.to_json(list(self.items)),
+                          sort_keys=True)
+
+    def size(self) -> int:
+        # Shallow per field: close enough for the memory budget, and far
+        # cheaper than serializing just to measure.
+        size = sys.getsizeof(self.items)
+        for item in self.items:
+            size += sys.getsizeof(item)
+            size += sum(sys.getsizeof(v) for v in vars(item).values())
+        return size
 
 
 class EventRequestCache:
 
-    # How much longer an expired entry stays available to peek() before
-    # being purged, bounding growth for keys that get requeried after
-    # expiring but never receive a fresh set() (e.g. a failed refetch).
-    # Keys that are never requeried at all aren't touched by this -- they
-    # need an access to trigger the check in the first place.
+    # How much longer an expired entry's digest stays available to
+    # peek_digest() (and its content to peek(), until sweep() drops it)
+    # before being purged, bounding growth for keys that get requeried
+    # after expiring but never receive a fresh set() (e.g. a failed
+    # refetch). Keys that are never requeried at all are left to sweep().
     STALE_RETENTION_SECONDS = 3600 * 24
 
-    def __init__(self, prefix="event-request:"):
+    def __init__(self, prefix="event-request:", max_bytes=None):
+        """max_bytes caps the total size of cached entries; once exceeded,
+        the least recently used entries are evicted until it fits again.
+        Entries stored with ex=None are pinned and never evicted. None
+        means unbounded."""
         self._prefix = prefix
         self._store = {}
         self._expiry = {}
+        self.max_bytes = max_bytes
+        # Entry key -> its size in bytes, least recently used first.
+        self._sizes = OrderedDict()
+        self._bytes = 0
+        self._evictions = 0
+        self._reclaimed = 0
+        self._trimmed = 0
+        # (tokens, updated_at) of take_request_token()'s bucket.
+        self._request_tokens = None
+        self._lock = threading.Lock()
 
     def get(self, key_data) -> dict | None:
         key = self.generate_key(key_data)
         key_content = key + ":content"
 
         if not self._is_valid(key_content):
+            timing.count("cache-miss")
             return None
 
-        return self._read(key)
+        timing.count("cache-hit")
+        self._touch(key)
+        with timing.measure("cache-read"):
+            return self._read(key)
+
+    def get_version(self, key_data) -> dict | None:
+        """The last_modified of the entry get() would return for key_data,
+        with an opaque "version" that changes whenever the entry is stored
+        again, without reading or decoding its content. None if get() would
+        miss. For telling whether something derived from the entry (e.g. a
+        rendered response) is still current."""
+        key = self.generate_key(key_data)
+        key_content = key + ":content"
+
+        if not self._is_valid(key_content):
+            return None
+
+        # Stamped from the clock on every write; pinned entries (never
+        # rewritten) fall back on their last_modified alone.
+        try:
+            version = self._expiry[key_content]
+        except KeyError:
+            # Evicted or swept since the check above.
+            return None
+        return {
+            "version": version,
+            "last_modified": self._to_datetime(
+                self._store.get(key + ":last_modified"))
+        }
 
     def peek(self, key_data) -> dict | None:
         """Like get(), but ignores TTL expiry and returns whatever is
@@ -42,23 +111,30 @@ class EventRequestCache:
             self._delete(key)
             return None
 
+        self._touch(key)
         return self._read(key)
 
     def _read(self, key: str) -> dict | None:
         key_content = key + ":content"
         key_last_modified = key + ":last_modified"
 
-        content = self._store.get(key_content)
-        last_modified = self._store.get(key_last_modified)
+        # Under the lock _put() stores with, so the digest is always that
+        # of this very content.
+        with self._lock:
+            content = self._store.get(key_content)
+            last_modified = self._store.get(key_last_modified)
+            digest = self._store.get(key + ":digest")
 
+        if isinstance(content, CachedObjects):
+            content = content.to_content()
+
+        return self._to_response(content, last_modified, digest)
+
+    def _to_response(self, content, last_modified,
+                     digest=None) -> dict | None:
         if content is None:
             return None
 
-        last_modified_dt = None
-        if last_modified is not None:
-            last_modified_dt = datetime.fromtimestamp(int(last_modified),
-                                                      timezone.utc)
-
         json_data = None
         try:
             json_data = json.loads(content)
@@ -68,35 +144,226 @@ class EventRequestCache:
         return {
             "content": content,
             "json": json_data,
-            "last_modified": last_modified_dt
+            "last_modified": self._to_datetime(last_modified),
+            # content_digest() of content, if the entry was stored with one.
+            "digest": digest
+        }
+
+    def _to_datetime(self, last_modified) -> datetime | None:
+        if last_modified is None:
+            return None
+        return datetime.fromtimestamp(int(last_modified), timezone.utc)
+
+    def get_object(self, key_data, model) -> dict | None:
+        """Like get(), but returns the entry as already built model objects
+        under "items" (a tuple), instead of decoding JSON and rebuilding
+        them on every hit. model must provide from_json() and to_json()
+        static methods, e.g. Event or Group.
+
+        The same tuple and objects are handed to every caller, so they must
+        be treated as read-only. An entry stored as JSON with set() is
+        decoded once, here, and kept as objects from then on."""
+        key = self.generate_key(key_data)
+        key_content = key + ":content"
+
+        if not self._is_valid(key_content):
+            timing.count("cache-miss")
+            return None
+
+        self._touch(key)
+        content = self._store.get(key_content)
+        if content is None:
+            timing.count("cache-miss")
+            return None
+        timing.count("cache-hit")
+        if not isinstance(content, CachedObjects):
+            with timing.measure("cache-read"):
+                response = self._read(key)
+                if response["json"] is None:
+                    return None
+                content = CachedObjects(
+                    tuple(model.from_json(response["json"])), model)
+            self._store[key_content] = content
+            self._account(key)
+
+        last_modified = self._store.get(key + ":last_modified")
+        return {
+            "items": content.items,
+            "last_modified": self._to_datetime(last_modified)
         }
 
+    def set_object(self, key_data, items, model, last_modified=None,
+                   ex=3600, digest=None):
+        """Like set(), but keeps items as objects (see get_object()); they're
+        only serialized if get()/peek() asks for the entry as JSON. No
+        digest is kept for these (see peek_digest()) unless the caller
+        passes the content_digest() their JSON would have."""
+        self._put(self.generate_key(key_data),
+                  CachedObjects(tuple(items), model), last_modified, ex,
+                  digest=digest)
+
     def set(self, key_data, response_data, last_modified=None, ex=3600):
+        self._put(self.generate_key(key_data),
+                  self._to_content(response_data), last_modified, ex)
+
+    def renew(self, key_data, ex=3600) -> dict | None:
+        """Keep the entry for key_data, even an expired one still held
+        for peek(), for another ex seconds as it is, and return it like
+        get(). For when upstream confirms it's unchanged (e.g. a 304), so
+        it needn't be stored again. None if its content isn't held."""
+        key = self.generate_key(key_data)
+        if key + ":content" not in self._store:
+            return None
+        expiry = None
+        if ex is not None:
+            expiry = datetime.now(timezone.utc).timestamp() + ex
+        for suffix in (":content", ":last_modified", ":digest"):
+            if key + suffix in self._expiry:
+                self._expiry[key + suffix] = expiry
+        self._touch(key)
+        return self._read(key)
+
+    def _put(self, key: str, content, last_modified, ex, digest=None):
+        key_content = key + ":content"
+        key_last_modified = key + ":last_modified"
+        key_digest = key + ":digest"
+
+        if isinstance(content, str):
+            digest = self.content_digest(content)
+        expiry = None
+        if ex is not None:
+            expiry = datetime.now(timezone.utc).timestamp() + ex
+
+        # One step as far as _read() is concerned; see there.
+        with self._lock:
+            self._store[key_content] = content
+            self._expiry[key_content] = expiry
+
+            if last_modified is not None:
+                self._store[key_last_modified] = int(last_modified.timestamp())
+                self._expiry[key_last_modified] = expiry
+
+            if digest is not None:
+                self._store[key_digest] = digest
+                self._expiry[key_digest] = expiry
+            else:
+                self._store.pop(key_digest, None)
+                self._expiry.pop(key_digest, None)
+
+        self._account(key)
+        self._evict(protect=key)
+
+    def peek_digest(self, key_data) -> dict | None:
+        """The content digest and last_modified last stored for key_data,
+        kept for STALE_RETENTION_SECONDS after expiry even once sweep() has
+        dropped the content itself. Lets a fresh fetch be checked for
+        changes (compare against content_digest()) without holding on to
+        the whole stale copy. None if there's nothing to compare against."""
         key = self.generate_key(key_data)
+        key_digest = key + ":digest"
+
+        if self._is_stale_beyond_retention(key_digest):
+            self._delete(key)
+            return None
+
+        digest = self._store.get(key_digest)
+        if digest is None:
+            return None
+
+        return {
+            "digest": digest,
+            "last_modified": self._to_datetime(
+                self._store.get(key + ":last_modified"))
+        }
+
+    def content_digest(self, response_data) -> str:
+        """Digest of response_data as set() would store it."""
+        content = self._to_content(response_data)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def _to_content(self, response_data) -> str:
         if isinstance(response_data, dict) or isinstance(response_data, list):
-            content = json.dumps(response_data, sort_keys=True)
+            return json.dumps(response_data, sort_keys=True)
         elif isinstance(response_data, str):
-            content = response_data
+            return response_data
         else:
             raise ValueError("Invalid data type for cache content")
 
-        key_content = key + ":content"
-        key_last_modified = key + ":last_modified"
+    def add(self, key_data, response_data, ex=3600) -> bool:
+        """Store response_data only if nothing unexpired is cached for
+        key_data yet, as one atomic step. Returns whether it was stored.
+        Used for locks that must hold across concurrent callers."""
+        key_content = self.generate_key(key_data) + ":content"
+        with self._lock:
+            if self._is_valid(key_content):
+                return False
+            self._store[key_content] = self._to_content(response_data)
+            self._expiry[key_content] = \
+                datetime.now(timezone.utc).timestamp() + ex
+            return True
 
-        self._store[key_content] = content
-        if ex is None:
-            self._expiry[key_content] = None
-        else:
-            self._expiry[key_content] = datetime.now(timezone.utc).timestamp() + ex
+    def delete(self, key_data):
+        """Drop the entry for key_data altogether, digest included, e.g.
+        one nothing will read again or an add() lock being released."""
+        self._delete(self.generate_key(key_data))
 
-        if last_modified is not None:
-            ts = int(last_modified.timestamp())
-            self._store[key_last_modified] = ts
-            if ex is None:
-                self._expiry[key_last_modified] = None
-            else:
-                expiry = datetime.now(timezone.utc).timestamp() + ex
-                self._expiry[key_last_modified] = expiry
+    def ttl(self, key_data) -> float | None:
+        """Seconds until key_data's content expires (negative once it has
+        expired but is still held for peek()), math.inf if it never
+        expires, or None if nothing is cached for it."""
+        key_content = self.generate_key(key_data) + ":content"
+        if key_content not in self._expiry:
+            return None
+        expiry = self._expiry[key_content]
+        if expiry is None:
+            return math.inf
+        return expiry - datetime.now(timezone.utc).timestamp()
+
+    def sweep(self) -> int:
+        """Drop the content of every expired entry, keeping only its digest
+        and last_modified (see peek_digest()), and delete entries stale for
+        longer than STALE_RETENTION_SECONDS altogether, rather than waiting
+        for peek() to come across them. Returns how many entries were
+        trimmed or deleted."""
+        now = datetime.now(timezone.utc).timestamp()
+        expired = set()
+        stale = set()
+        for key, expiry in list(self._expiry.items()):
+            if expiry is None or now <= expiry:
+                continue
+            base, _, suffix = key.rpartition(":")
+            if suffix not in ("content", "digest"):
+                continue
+            if now > expiry + self.STALE_RETENTION_SECONDS:
+                stale.add(base)
+            elif suffix == "content":
+                expired.add(base)
+        expired -= stale
+
+        for key in stale:
+            self._delete(key)
+        for key in expired:
+            self._drop_content(key)
+        with self._lock:
+            self._reclaimed += len(stale)
+            self._trimmed += len(expired)
+        return len(stale) + len(expired)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._sizes),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions,
+                "reclaimed": self._reclaimed,
+                "trimmed": self._trimmed,
+            }
+
+    def close(self):
+        """Called on app shutdown; the in-memory cache has nothing to
+        release."""
 
     def generate_key(self, data) -> str:
         if isinstance(data, dict):
@@ -110,33 +377,35 @@ class EventRequestCache:
         key = self._prefix + key_sha256.hexdigest()
         return key
 
-    def get_wait_for_request(self) -> int:
-        key = "request_wait_sec"
-
-        if not self._is_valid(key):
-            return 0
-
-        ttl = self._expiry.get(key, 0) - datetime.now(timezone.utc).timestamp()
-        return max(0, math.ceil(ttl))
-
-    def set_wait_for_request(self, wait_sec: int):
-        key = "request_wait_sec"
-        date = datetime.now()
-        date_str = date.strftime('%Y-%m-%d %H:%M:%S')
-
-        self._store[key] = date_str
-        self._expiry[key] = datetime.now(timezone.utc).timestamp() + wait_sec
+    def take_request_token(self, rate: float, burst: int) -> float:
+        """Take a token from the upstream request bucket, which refills at
+        rate tokens per second up to burst, and return 0; or, if it's
+        empty, return how many seconds until the next token. Taking and
+        checking are one step, so two callers can never share a token.
+        Used by ratelimit.TokenBucketLimiter."""
+        with self._lock:
+            now = datetime.now(timezone.utc).timestamp()
+            tokens, updated_at = self._request_tokens or (burst, now)
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            if tokens >= 1:
+                self._request_tokens = (tokens - 1, now)
+                return 0
+            self._request_tokens = (tokens, now)
+            return (1 - tokens) / rate
 
     def _is_valid(self, key: str) -> bool:
-        if key not in self._expiry:
+        # One lookup, not a membership test and a read: a concurrent
+        # eviction or sweep may delete the key in between.
+        expiry = self._expiry.get(key, False)
+        if expiry is False:
             return False
-        if self._expiry[key] is None:
+        if expiry is None:
             return True
         # Deliberately doesn't delete the entry on expiry: peek() relies on
         # stale entries staying readable so a fresh fetch can be compared
         # against them. A future set() for the same key overwrites it, and
         # peek() itself purges entries once they're stale for too long.
-        return datetime.now(timezone.utc).timestamp() <= self._expiry[key]
+        return datetime.now(timezone.utc).timestamp() <= expiry
 
     def _is_stale_beyond_retention(self, key: str) -> bool:
         if key not in self._expiry:
@@ -147,7 +416,78 @@ class EventRequestCache:
         deadline = expiry + self.STALE_RETENTION_SECONDS
         return datetime.now(timezone.utc).timestamp() > deadline
 
+    def _put_digest(self, key: str, digest: str, last_modified, expiry):
+        """Store just the digest side of an entry whose content has already
+        been dropped elsewhere, e.g. when loading a trimmed row back from a
+        persistent tier."""
+        self._store[key + ":digest"] = digest
+        self._expiry[key + ":digest"] = expiry
+        if last_modified is not None:
+            self._store[key + ":last_modified"] = last_modified
+            self._expiry[key + ":last_modified"] = expiry
+        self._account(key)
+        self._evict(protect=key)
+
+    def _drop_content(self, key: str):
+        self._store.pop(key + ":content", None)
+        self._expiry.pop(key + ":content", None)
+        if key + ":digest" in self._store:
+            self._account(key)
+        else:
+            # Nothing left worth keeping (e.g. an add() lock).
+            self._delete(key)
+
     def _delete(self, key: str):
-        for suffix in (":content", ":last_modified"):
+        for suffix in (":content", ":last_modified", ":digest"):
             self._store.pop(key + suffix, None)
             self._expiry.pop(key + suffix, None)
+        with self._lock:
+            self._bytes -= self._sizes.pop(key, 0)
+
+    def _touch(self, key: str):
+        with self._lock:
+            if key in self._sizes:
+                self._sizes.move_to_end(key)
+
+    def _account(self, key: str):
+        # Counts the Python objects actually held, keys included, so the
+        # budget tracks real memory rather than just the payload length.
+        size = 0
+        for suffix in (":content", ":last_modified", ":digest"):
+            value = self._store.get(key + suffix)
+            if value is None:
+                continue
+            if isinstance(value, CachedObjects):
+                size += value.size()
+            else:
+                size += sys.getsizeof(value)
+            size += 2 * sys.getsizeof(key + suffix)
+        with self._lock:
+            self._bytes += size - self._sizes.pop(key, 0)
+            self._sizes[key] = size
+
+    def _evict(self, protect: str = None):
+        """Evict least recently used, unpinned entries until the cache fits
+        in max_bytes. protect (the entry just stored) is never evicted."""
+        if self.max_bytes is None:
+            return
+        with self._lock:
+            if self._bytes <= self.max_bytes:
+                return
+            victims = []
+            excess = self._bytes - self.max_bytes
+            for key, size in self._sizes.items():
+                if excess <= 0:
+                    break
+                if key == protect or self._is_pinned(key):
+                    continue
+                victims.append(key)
+                excess -= size
+        for key in victims:
+            self._delete(key)
+        with self._lock:
+            self._evictions += len(victims)
+
+    def _is_pinned(self, key: str) -> bool:
+        key_content = key + ":content"
+        return key_content in self._expiry and self._expiry[key_content] is None
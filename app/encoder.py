@@ -0,0 +1,72 @@
+import dataclasses
+import functools
+import json
+import operator
+from pydantic import TypeAdapter
+
+try:
+    # Optional: encodes the model dataclasses natively, roughly twice as
+    # fast as the pydantic fallback below (see benchmarks/encode_events.py).
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_json(content, response_type=None) -> bytes:
+    """content as a route's response body: compact UTF-8 JSON, byte for
+    byte what its response_model would have produced.
+
+    Meant for data the service layer built itself (e.g. Event.from_json()
+    or a summary of those), which is valid by construction, so unlike
+    FastAPI's response_model handling nothing is converted to dicts,
+    validated or checked again on the way out. response_type (e.g.
+    List[Event]) is only needed without orjson; None means content is
+    already plain JSON data, like a fields= subset."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    if response_type is None:
+        # default: nested dataclasses left in by project() (e.g.
+        # GroupSummary.years).
+        return json.dumps(content, ensure_ascii=False, allow_nan=False,
+                          separators=(",", ":"),
+                          default=dataclasses.asdict).encode("utf-8")
+    return _type_adapter(response_type).dump_json(content, warnings=False)
+
+
+@functools.lru_cache(maxsize=None)
+def _type_adapter(response_type) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
+
+def normalize_fields(fields: str | None) -> tuple | None:
+    """The field names of a fields= parameter, deduplicated and sorted, so
+    equivalent ones share a projector() (and a stored response); None if
+    there are none, i.e. no projection."""
+    if fields is None:
+        return None
+    return tuple(sorted({f.strip() for f in fields.split(",")
+                         if f.strip()})) or None
+
+
+def project(items, model, field_names: tuple) -> list:
+    """items (instances of the dataclass model) as dicts of just
+    field_names (see normalize_fields()), in the model's field order;
+    unknown names are ignored. For encode_json()."""
+    to_dict = projector(model, field_names)
+    return [to_dict(item) for item in items]
+
+
+@functools.lru_cache(maxsize=256)
+def projector(model, field_names: tuple):
+    """A function turning one model instance into the dict of field_names,
+    made once per model and field set. It reads only those attributes, so
+    e.g. a large description is never touched unless asked for."""
+    names = tuple(f.name for f in dataclasses.fields(model)
+                  if f.name in field_names)
+    if not names:
+        return lambda item: {}
+    if len(names) == 1:
+        name = names[0]
+        return lambda item: {name: getattr(item, name)}
+    values = operator.attrgetter(*names)
+    return lambda item: dict(zip(names, values(item)))
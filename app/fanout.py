@@ -0,0 +1,37 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class FanOutTimeout(Exception):
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.message = f"Upstream sources did not respond within {timeout}s"
+
+
+class FanOutExecutor:
+    """Runs independent upstream fetches concurrently on a shared, bounded
+    thread pool, so a request's latency is that of its slowest source
+    rather than the sum of all of them."""
+
+    def __init__(self, max_workers=8):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="fanout")
+
+    def run(self, tasks, timeout=None) -> list:
+        """Call every zero-argument callable in tasks and return their
+        results in the same order as tasks, regardless of completion order.
+
+        If any task raised, the exception from the earliest such task (in
+        tasks order) is re-raised. Raises FanOutTimeout if the tasks haven't
+        all finished within timeout seconds; tasks already running can't be
+        interrupted and are left to finish in the background."""
+        # copy_context(): each task sees the caller's context variables.
+        futures = [self._executor.submit(contextvars.copy_context().run, task)
+                   for task in tasks]
+        _, not_done = wait(futures, timeout=timeout)
+        if not_done:
+            for future in not_done:
+                future.cancel()
+            raise FanOutTimeout(timeout)
+
+        return [future.result() for future in futures]
@@ -1,15 +1,26 @@
 import asyncio
+import contextlib
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from mangum import Mangum
-from .service import config, preload_archive_indexes
+from .providers.http import async_client
+from .timing import ServerTimingMiddleware
+from . import service
+from .service import config, preload_archive_indexes, sweep_cache_periodically
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await asyncio.to_thread(preload_archive_indexes)
+    await preload_archive_indexes()
+    sweeper = asyncio.create_task(sweep_cache_periodically())
     yield
+    sweeper.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await sweeper
+    service.cache.close()
+    # The pooled client is bound to this event loop; don't let it outlive it.
+    await async_client.aclose()
 
 
 app = FastAPI(
@@ -25,9 +36,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Total-Count", "X-Page", "X-Per-Page", "X-Total-Pages"],
+    expose_headers=["X-Total-Count", "X-Page", "X-Per-Page", "X-Total-Pages",
+                    "ETag"],
 )
 
+if service.server_timing_enabled:
+    app.add_middleware(ServerTimingMiddleware)
+
 # Imported for its side effect: registers all routes and mounts MCP onto
 # `app`. Must come after `app` is constructed above, since routes.py
 # imports `app` back from this module.
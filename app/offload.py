@@ -0,0 +1,31 @@
+import functools
+from anyio import CapacityLimiter, to_thread
+from anyio.lowlevel import RunVar
+
+
+class ServiceExecutor:
+    """Runs the blocking service layer (cache lookups, upstream fetches and
+    their pacing sleeps) on worker threads, so an async route handler
+    awaits it instead of stalling the event loop for every other request.
+
+    At most max_threads calls run at once; further calls wait for a free
+    thread without holding up the loop. The limiter is kept per event loop
+    (as anyio does for its own default limiter), since a limiter can't be
+    shared across loops."""
+
+    def __init__(self, max_threads=16):
+        self.max_threads = max_threads
+        self._limiter = RunVar(f"service_executor_limiter_{id(self)}")
+
+    async def run(self, func, *args, **kwargs):
+        return await to_thread.run_sync(
+            functools.partial(func, *args, **kwargs),
+            limiter=self._get_limiter())
+
+    def _get_limiter(self) -> CapacityLimiter:
+        try:
+            return self._limiter.get()
+        except LookupError:
+            limiter = CapacityLimiter(self.max_threads)
+            self._limiter.set(limiter)
+            return limiter
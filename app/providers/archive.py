@@ -1,8 +1,23 @@
+import asyncio
+import dataclasses
+import hashlib
+import httpx
+import json
 import requests
+import threading
 from datetime import datetime, timezone
+from urllib.parse import urljoin
+from .. import timing
 from ..models import Event, Group
+from .http import async_client, conditional_headers, response_validators
+from .http import session, store_validators
+from .jsonstream import JsonMembersParser
 
 ARCHIVE_REQUEST_TIMEOUT = 10
+# Size of the pieces an archive index is read and parsed in.
+ARCHIVE_CHUNK_BYTES = 64 * 1024
+# Top-level arrays of an archive index parsed element by element.
+STREAMED_MEMBERS = ("events", "communities", "shards")
 
 
 class ArchiveException(Exception):
@@ -11,22 +26,215 @@ class ArchiveException(Exception):
         self.message = message
 
 
+class ArchiveIndex:
+    """An archive index's events and groups as loaded once, with the
+    events indexed by the month and the day they start in and by
+    group_key. Treated as immutable: select() hands out copies.
+
+    shards lists the (year, url) of the per-year files a sharded index
+    keeps its events in, url already resolved against the index's own;
+    see ArchiveIndexRequest."""
+
+    def __init__(self, events, groups, shards=()):
+        # (position in the index, event)
+        self.entries = tuple(enumerate(events))
+        self.by_month = {}
+        self.by_day = {}
+        self.by_group = {}
+        for entry in self.entries:
+            event = entry[1]
+            day = event.started_at[:10].replace("-", "")
+            self.by_month.setdefault(day[:6], []).append(entry)
+            self.by_day.setdefault(day, []).append(entry)
+            self.by_group.setdefault(event.group_key, []).append(entry)
+        self.groups = tuple(groups)
+        self.shards = tuple(shards)
+
+    @staticmethod
+    def from_json(json, url=None):
+        """Build the index of an already decoded archive index document."""
+        builder = ArchiveIndexBuilder(url)
+        builder.add("source", json.get("source", {}))
+        for key in STREAMED_MEMBERS:
+            for item in json.get(key, []):
+                builder.add(key, item)
+        return builder.build()
+
+    def select(self, ym, ymd, group_key=None) -> list:
+        """Events starting in any month of ym or on any day of ymd (all of
+        them if neither is given), of group_key only if it's given, in
+        index order."""
+        if group_key is not None:
+            entries = self.by_group.get(group_key, ())
+            if len(ym) > 0 or len(ymd) > 0:
+                entries = [entry for entry in entries
+                           if self._starts_in(entry[1], ym, ymd)]
+        elif len(ym) == 0 and len(ymd) == 0:
+            entries = self.entries
+        else:
+            entries = [entry for month in ym
+                       for entry in self.by_month.get(month, ())]
+            entries += [entry for day in ymd if day[:6] not in ym
+                        for entry in self.by_day.get(day, ())]
+            entries.sort(key=lambda entry: entry[0])
+        return [dataclasses.replace(entry[1]) for entry in entries]
+
+    def get_groups(self) -> list:
+        return [dataclasses.replace(group) for group in self.groups]
+
+    def shard_urls(self, ym, ymd) -> list:
+        """URLs of the shards holding events of any month of ym or day of
+        ymd; every shard if neither is given."""
+        years = {unit[:4] for unit in list(ym) + list(ymd)}
+        return [url for year, url in self.shards
+                if len(years) == 0 or year in years]
+
+    def to_content(self) -> str:
+        """The index as cached by external tiers: JSON of only what it
+        holds, which from_json() reads back."""
+        return "".join(self._content_pieces())
+
+    def content_digest(self) -> str:
+        """EventRequestCache.content_digest() of to_content(), computed
+        piece by piece without holding the whole document."""
+        digest = hashlib.sha256()
+        for piece in self._content_pieces():
+            digest.update(piece.encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def to_json(indexes) -> dict:
+        """For EventRequestCache.set_object(), which keeps an index as the
+        one-item list [index]: its document, whose json.dumps(...,
+        sort_keys=True) is exactly to_content()."""
+        index = indexes[0]
+        return {
+            "communities": Group.to_json(list(index.groups)),
+            "events": [Event.to_json(entry[1]) for entry in index.entries],
+            "shards": [{"year": year, "url": url}
+                       for year, url in index.shards],
+        }
+
+    def _content_pieces(self):
+        """to_content() encoded event by event, without first building
+        the whole document as dicts."""
+        yield '{"communities": '
+        yield json.dumps(Group.to_json(list(self.groups)), sort_keys=True)
+        yield ', "events": ['
+        for i, entry in enumerate(self.entries):
+            if i > 0:
+                yield ", "
+            yield json.dumps(Event.to_json(entry[1]), sort_keys=True)
+        yield '], "shards": '
+        yield json.dumps([{"year": year, "url": url}
+                          for year, url in self.shards], sort_keys=True)
+        yield "}"
+
+    @staticmethod
+    def _starts_in(event, ym, ymd):
+        event_date = event.started_at[:10].replace("-", "")
+        return event_date[:6] in ym or event_date in ymd
+
+
+class ArchiveIndexBuilder:
+    """Builds an ArchiveIndex from the top-level members of an archive
+    index document as they're parsed, one element of each streamed array
+    at a time (see JsonMembersParser), turning each event into an Event
+    right away rather than keeping its decoded JSON."""
+
+    def __init__(self, url=None):
+        self.url = url
+        self._source = {}
+        self._communities = []
+        self._events = []
+        self._shards = []
+
+    def add(self, key, value):
+        if key == "events":
+            event = Event.from_json(value)
+            event.source = "archive"
+            self._events.append(event)
+        elif key == "communities":
+            # Completed once "source" is known, wherever it comes.
+            self._communities.append(value)
+        elif key == "shards":
+            url = value["url"] if self.url is None \
+                else urljoin(self.url, value["url"])
+            self._shards.append((str(value["year"]), url))
+        elif key == "source" and isinstance(value, dict):
+            self._source = value
+
+    def build(self) -> ArchiveIndex:
+        archive_source = self._source.get("name")
+        archive_url = self._source.get("url")
+        communities = []
+        for community in self._communities:
+            item = community.copy()
+            item["archive_source"] = item.get("archive_source",
+                                              archive_source)
+            item["archive_url"] = item.get("archive_url", archive_url)
+            communities.append(item)
+
+        return ArchiveIndex(self._events, Group.from_json(communities),
+                            self._shards)
+
+
+class ArchiveIndexMemo:
+    """The ArchiveIndex built for the version of each URL's index held in
+    the cache, keyed by its content digest, so a request served from the
+    cache neither parses the stored JSON nor rebuilds Events. Only the
+    latest version of each URL is kept."""
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, url, digest) -> ArchiveIndex | None:
+        with self._lock:
+            held = self._indexes.get(url)
+        if held is None or held[0] != digest:
+            return None
+        return held[1]
+
+    def put(self, url, digest, index: ArchiveIndex):
+        with self._lock:
+            self._indexes[url] = (digest, index)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+
+archive_indexes = ArchiveIndexMemo()
+
+
 class ArchiveIndexRequest:
-    def __init__(self, url, ym=None, ymd=None, cache=None):
+    """Events and communities of one archive index.
+
+    The index is parsed straight from the response stream, so the raw
+    document is never held in memory as a whole. An index may also keep
+    its events in per-year shard files, listed under "shards" (see
+    docs/archive-index.md); each shard is fetched, cached and memoized
+    like an index of its own, and only the years a request covers are
+    loaded."""
+
+    def __init__(self, url, ym=None, ymd=None, cache=None, group_key=None):
         self.url = url
         self.ym = [] if ym is None else ym
         self.ymd = [] if ymd is None else ymd
         self.cache = cache
+        # Only this group's events, if given; see ArchiveIndex.select().
+        self.group_key = group_key
         self.last_modified = datetime.fromtimestamp(0, timezone.utc)
+        # ETag/Last-Modified of the index just fetched; see store_validators().
+        self._validators = None
 
     def get_events(self):
         try:
-            json = self.__get_json_or_fetch()
-
-            events = Event.from_json(json.get("events", []))
-            events = self.__find_by_ym_ymd(events)
-            for event in events:
-                event.source = "archive"
+            index = self.__get_index_or_fetch()
+            events = self._events_from_index(index)
+            for url in index.shard_urls(self.ym, self.ymd):
+                events += self._events_from_shard(self._shard_request(url))
             return events
 
         except requests.RequestException as e:
@@ -40,20 +248,7 @@ class ArchiveIndexRequest:
 
     def get_groups(self):
         try:
-            json = self.__get_json_or_fetch()
-
-            source = json.get("source", {})
-            archive_source = source.get("name")
-            archive_url = source.get("url")
-            communities = []
-            for community in json.get("communities", []):
-                item = community.copy()
-                item["archive_source"] = item.get("archive_source",
-                                                  archive_source)
-                item["archive_url"] = item.get("archive_url", archive_url)
-                communities.append(item)
-
-            return Group.from_json(communities)
+            return self.__get_index_or_fetch().get_groups()
 
         except requests.RequestException as e:
             raise ArchiveException(500, str(e))
@@ -69,7 +264,9 @@ class ArchiveIndexRequest:
 
     def preload(self):
         try:
-            self.__get_json_or_fetch()
+            index = self.__get_index_or_fetch()
+            for url in index.shard_urls([], []):
+                self._shard_request(url).preload()
 
         except requests.RequestException as e:
             raise ArchiveException(500, str(e))
@@ -80,62 +277,238 @@ class ArchiveIndexRequest:
         except Exception as e:
             raise ArchiveException(500, str(e))
 
-    def __get_json_or_fetch(self):
-        json = self.__get_json_from_cache()
+    def _events_from_index(self, index):
+        return index.select(self.ym, self.ymd, self.group_key)
+
+    def _shard_request(self, url):
+        return type(self)(url=url, ym=self.ym, ymd=self.ymd,
+                          cache=self.cache, group_key=self.group_key)
+
+    def _events_from_shard(self, shard, events=None):
+        """shard's events (events, if already awaited), counting its
+        last_modified towards the index's."""
+        if events is None:
+            events = shard.get_events()
+        self.last_modified = max(self.last_modified,
+                                 shard.get_last_modified())
+        return events
+
+    def _get_index_from_memo(self):
+        """The memoized ArchiveIndex of the index version currently cached,
+        if it's been built already; None if the cache has to be read (or
+        the index fetched) first."""
+        if self.cache is None:
+            return None
+        key = self._cache_key()
+        ttl = self.cache.ttl(key)
+        if ttl is None or ttl <= 0:
+            return None
+        stored = self.cache.peek_digest(key)
+        if stored is None:
+            return None
+        index = archive_indexes.get(self.url, stored["digest"])
+        if index is not None:
+            self.last_modified = stored["last_modified"]
+        return index
+
+    def _build_index(self, json):
+        index = ArchiveIndex.from_json(json, self.url)
+        self._memoize(index)
+        return index
+
+    def _memoize(self, index):
+        if self.cache is not None:
+            stored = self.cache.peek_digest(self._cache_key())
+            if stored is not None:
+                archive_indexes.put(self.url, stored["digest"], index)
+
+    def __get_index_or_fetch(self):
+        index = self._get_index_from_memo()
+        if index is not None:
+            return index
+        json = self._get_json_from_cache()
         if json is not None:
-            return json
-
-        previous = self.cache.peek(self.__cache_key()) if self.cache is not None else None
-        json = self.__get_json()
-        self.last_modified = self.__resolve_last_modified(previous, json)
-        self.__set_json_to_cache(json, self.last_modified)
-        return json
-
-    def __resolve_last_modified(self, previous, json):
+            return self._build_index(json)
+
+        previous = self.cache.peek_digest(self._cache_key()) \
+            if self.cache is not None else None
+        index = self.__get_index(self._conditional_headers())
+        if index is None:
+            json = self._renew_json_in_cache()
+            if json is not None:
+                return self._build_index(json)
+            # Dropped from the cache since; fetch it in full after all.
+            index = self.__get_index({})
+        return self._store_index(index, previous)
+
+    def _store_index(self, index, previous):
+        """Cache a freshly fetched index and memoize it under its version.
+        The in-process cache keeps the ArchiveIndex itself (see
+        EventRequestCache.set_object()), so only tiers that need bytes
+        (Redis, SQLite) ever serialize it (see ArchiveIndex.to_json())."""
+        if self.cache is None:
+            self.last_modified = datetime.now(timezone.utc)
+            return index
+        digest = index.content_digest()
+        self.last_modified = self._resolve_last_modified(previous, digest)
+        self.cache.set_object(self._cache_key(), [index], ArchiveIndex,
+                              last_modified=self.last_modified, ex=None,
+                              digest=digest)
+        store_validators(self.cache, self.url, self._validators, None)
+        self._memoize(index)
+        return index
+
+    def _resolve_last_modified(self, previous, digest):
         """Reuse the previously cached last_modified if the freshly fetched
-        index is identical to it, rather than always stamping "now" --
-        otherwise every periodic refetch would look modified even when
-        nothing actually changed upstream."""
+        index is identical to it (per the digests, see
+        EventRequestCache.peek_digest()), rather than always stamping
+        "now" -- otherwise every periodic refetch would look modified even
+        when nothing actually changed upstream."""
         if previous is not None and previous["last_modified"] is not None \
-                and previous["json"] == json:
+                and previous["digest"] == digest:
             return previous["last_modified"]
         return datetime.now(timezone.utc)
 
-    def __find_by_ym_ymd(self, events):
-        if len(self.ym) == 0 and len(self.ymd) == 0:
-            return events
-
-        selected = []
-        for event in events:
-            event_date = event.started_at[:10].replace("-", "")
-            if event_date[:6] in self.ym or event_date in self.ymd:
-                selected.append(event)
-        return selected
-
-    def __get_json_from_cache(self):
+    def _get_json_from_cache(self):
         if self.cache is None:
             return None
-        cache_content = self.cache.get(self.__cache_key())
+        cache_content = self.cache.get(self._cache_key())
         if cache_content is None:
             return None
 
         self.last_modified = cache_content["last_modified"]
         return cache_content["json"]
 
-    def __set_json_to_cache(self, json, last_modified):
-        if self.cache is None:
-            return
-        self.cache.set(self.__cache_key(), json, last_modified=last_modified,
-                       ex=None)
+    def _conditional_headers(self):
+        return conditional_headers(self.cache, self._cache_key(), self.url)
 
-    def __get_json(self):
-        print(f"Fetching archive index from {self.url}")
-        response = requests.get(self.url, timeout=ARCHIVE_REQUEST_TIMEOUT)
+    def _renew_json_in_cache(self):
+        """After a 304: keep the cached index as it is, last_modified
+        included, rather than downloading and storing it again. None if
+        it's no longer held."""
+        cache_content = self.cache.renew(self._cache_key(), ex=None)
+        if cache_content is None:
+            return None
+        store_validators(self.cache, self.url, self._validators, None)
+        self.last_modified = cache_content["last_modified"]
+        return cache_content["json"]
+
+    def _check_response(self, response, headers) -> bool:
+        """Whether response carries the index; False for a 304 to a
+        conditional request."""
         status_code = response.status_code
+        if status_code == 304 and headers:
+            self._validators = response_validators(response) \
+                or self._validators
+            return False
         if status_code != 200:
             raise ArchiveException(status_code, "Failed to fetch archive index")
 
-        return response.json()
+        self._validators = response_validators(response)
+        return True
+
+    def __get_index(self, headers):
+        """The index parsed from the response as it streams in, or None for
+        a 304 to a conditional request."""
+        print(f"Fetching archive index from {self.url}")
+        with timing.measure("archive"):
+            return self.__read_index(headers)
 
-    def __cache_key(self):
+    def __read_index(self, headers):
+        response = session.get(self.url, headers=headers, stream=True,
+                               timeout=ARCHIVE_REQUEST_TIMEOUT)
+        try:
+            if not self._check_response(response, headers):
+                return None
+            parser = JsonMembersParser(STREAMED_MEMBERS)
+            builder = ArchiveIndexBuilder(self.url)
+            for chunk in response.iter_content(ARCHIVE_CHUNK_BYTES):
+                for key, value in parser.feed(chunk):
+                    builder.add(key, value)
+            for key, value in parser.close():
+                builder.add(key, value)
+            return builder.build()
+        finally:
+            response.close()
+
+    def _cache_key(self):
         return {"archive_index_url": self.url}
+
+
+class AsyncArchiveIndexRequest(ArchiveIndexRequest):
+    """ArchiveIndexRequest whose index fetch awaits the shared pooled
+    client (see providers.http) instead of blocking a thread."""
+
+    async def get_events(self):
+        index = await self._get_index_or_fetch_async()
+        shards = [self._shard_request(url)
+                  for url in index.shard_urls(self.ym, self.ymd)]
+        shard_events = await asyncio.gather(
+            *(shard.get_events() for shard in shards))
+        try:
+            events = self._events_from_index(index)
+            for shard, fetched in zip(shards, shard_events):
+                events += self._events_from_shard(shard, fetched)
+            return events
+        except Exception as e:
+            raise ArchiveException(500, str(e))
+
+    async def get_groups(self):
+        index = await self._get_index_or_fetch_async()
+        try:
+            return index.get_groups()
+        except Exception as e:
+            raise ArchiveException(500, str(e))
+
+    async def preload(self):
+        index = await self._get_index_or_fetch_async()
+        await asyncio.gather(*(self._shard_request(url).preload()
+                               for url in index.shard_urls([], [])))
+
+    async def _get_index_or_fetch_async(self):
+        try:
+            index = self._get_index_from_memo()
+            if index is not None:
+                return index
+            json = self._get_json_from_cache()
+            if json is not None:
+                return self._build_index(json)
+
+            previous = self.cache.peek_digest(self._cache_key()) \
+                if self.cache is not None else None
+            index = await self._get_index_async(self._conditional_headers())
+            if index is None:
+                json = self._renew_json_in_cache()
+                if json is not None:
+                    return self._build_index(json)
+                index = await self._get_index_async({})
+            return self._store_index(index, previous)
+
+        except httpx.HTTPError as e:
+            raise ArchiveException(500, str(e))
+
+        except ArchiveException as e:
+            raise e
+
+        except Exception as e:
+            raise ArchiveException(500, str(e))
+
+    async def _get_index_async(self, headers):
+        print(f"Fetching archive index from {self.url}")
+        with timing.measure("archive"):
+            return await self._read_index_async(headers)
+
+    async def _read_index_async(self, headers):
+        async with async_client.stream(
+                self.url, headers=headers,
+                timeout=ARCHIVE_REQUEST_TIMEOUT) as response:
+            if not self._check_response(response, headers):
+                return None
+            parser = JsonMembersParser(STREAMED_MEMBERS)
+            builder = ArchiveIndexBuilder(self.url)
+            async for chunk in response.aiter_bytes(ARCHIVE_CHUNK_BYTES):
+                for key, value in parser.feed(chunk):
+                    builder.add(key, value)
+            for key, value in parser.close():
+                builder.add(key, value)
+            return builder.build()
@@ -1,8 +1,24 @@
+import httpx
 import requests
 import re
-import time
 from datetime import datetime, timezone
+from .. import timing
 from ..models import Event, Group
+from ..ratelimit import TokenBucketLimiter
+from ..singleflight import SingleFlight
+from .http import async_client, session
+
+CONNPASS_REQUEST_TIMEOUT = 10
+
+# Shared by ConnpassEventRequest and ConnpassGroupRequest, sync and async:
+# they all draw on the same connpass rate limit. service applies the
+# configured rate to it.
+request_limiter = TokenBucketLimiter(rate=1.0, burst=1)
+
+# Coalesces concurrent fetches of the same events page across requests,
+# sync and async alike, so each page costs one paced connpass request
+# however many callers want it.
+page_inflight = SingleFlight()
 
 
 class ConnpassException(Exception):
@@ -11,6 +27,38 @@ class ConnpassException(Exception):
         self.message = message
 
 
+def raise_for_connpass_error(response):
+    """Raise ConnpassException for a non-200 response (requests or httpx),
+    using the error page's <title> as the message when there is one."""
+    if response.status_code != 200:
+        status_code = response.status_code
+        text = response.text
+        title = re.search(r'<title>(.+?)</title>', text)
+        message = title.group(1) if title else text
+        raise ConnpassException(status_code, message)
+
+
+async def get_async(url, params, headers, cache):
+    """Async counterpart of the providers' sync __get(): paces the request,
+    sends it on the shared pooled client and checks the response."""
+    with timing.measure("connpass-wait"):
+        await request_limiter.acquire_async(cache)
+
+    date = datetime.now()
+    date_str = date.strftime('%Y-%m-%d %H:%M:%S')
+    print({"params": params, "url": url, "date": date_str})
+    try:
+        with timing.measure("connpass"):
+            response = await async_client.get(
+                url, params=params, headers=headers,
+                timeout=CONNPASS_REQUEST_TIMEOUT)
+    except httpx.HTTPError as e:
+        raise ConnpassException(500, str(e))
+
+    raise_for_connpass_error(response)
+    return response
+
+
 class ConnpassEventRequest:
     # Fixed so get_events() and get_events_page() always request the same
     # (subdomain, start, count) params, sharing cache entries between them.
@@ -58,7 +106,7 @@ class ConnpassEventRequest:
             chunk += 1
 
         if len(self.prefecture) > 0:
-            events = list(filter(self.__is_in_pref, events))
+            events = list(filter(self._is_in_pref, events))
 
         return events
 
@@ -69,21 +117,28 @@ class ConnpassEventRequest:
         onto it (needs the total count first) and reverses the result."""
         if order == "asc":
             self.__fetch_chunk(0)
-            total = self.total_available or 0
-            if item_start > total:
+            desc_range = self._descending_range(item_start, item_count)
+            if desc_range is None:
                 return []
-            desc_start = max(total - item_start - item_count + 2, 1)
-            desc_count = min(item_count, total - item_start + 1)
-            events = self.__fetch_range(desc_start, desc_count)
+            events = self.__fetch_range(*desc_range)
             events.reverse()
             return events
 
         return self.__fetch_range(item_start, item_count)
 
+    def _descending_range(self, item_start: int, item_count: int):
+        """Mirror an ascending (item_start, item_count) onto connpass's
+        descending order; needs total_available, so chunk 0 must have been
+        fetched first. None if the range starts past the last item."""
+        total = self.total_available or 0
+        if item_start > total:
+            return None
+        desc_start = max(total - item_start - item_count + 2, 1)
+        desc_count = min(item_count, total - item_start + 1)
+        return desc_start, desc_count
+
     def __fetch_range(self, item_start: int, item_count: int):
-        item_end = item_start + item_count - 1
-        first_chunk = (item_start - 1) // self.PAGE_SIZE
-        last_chunk = (item_end - 1) // self.PAGE_SIZE
+        first_chunk, last_chunk = self._chunk_span(item_start, item_count)
 
         events = []
         chunk = first_chunk
@@ -94,22 +149,71 @@ class ConnpassEventRequest:
                 break
             chunk += 1
 
+        return self._slice_range(events, item_start, item_count, first_chunk)
+
+    def _chunk_span(self, item_start: int, item_count: int):
+        item_end = item_start + item_count - 1
+        first_chunk = (item_start - 1) // self.PAGE_SIZE
+        last_chunk = (item_end - 1) // self.PAGE_SIZE
+        return first_chunk, last_chunk
+
+    def _slice_range(self, events, item_start: int, item_count: int,
+                     first_chunk: int):
         if len(self.prefecture) > 0:
-            events = list(filter(self.__is_in_pref, events))
+            events = list(filter(self._is_in_pref, events))
 
         offset = item_start - 1 - first_chunk * self.PAGE_SIZE
         return events[offset:offset + item_count]
 
     def __fetch_chunk(self, chunk_index: int):
         """Fetch one PAGE_SIZE-aligned chunk; returns (events, results_returned)."""
-        params = self.__query_params()
+        json = self.__fetch_json(self._chunk_params(chunk_index))
+        return self._read_chunk(json)
+
+    def _chunk_params(self, chunk_index: int):
+        params = self._query_params()
         params["count"] = self.PAGE_SIZE
         params["order"] = 2
         params["start"] = chunk_index * self.PAGE_SIZE + 1
+        return params
 
-        json = self.__fetch_json(params)
+    def _read_chunk(self, json):
         self.total_available = json.get('results_available')
-        return self.__convert_to_events(json['events']), json['results_returned']
+        return self._convert_to_events(json['events']), json['results_returned']
+
+    def get_updated_events(self, since: str, max_pages: int = 2):
+        """Events of this query updated at or after since (an updated_at
+        value), paging connpass in update order (order=1) newest first and
+        stopping at the first page that reaches back past since. ym/ymd
+        are not sent: an update can move an event into any month.
+
+        Returns {uid: Event}, with None for an event that no longer
+        matches the prefecture filter, or None if max_pages weren't
+        enough to reach since. The pages change with every update, so
+        they're always fetched rather than cached."""
+        watermark = datetime.fromisoformat(since)
+        updated = {}
+        for chunk_index in range(max_pages):
+            params = self._query_params()
+            params.pop("ym", None)
+            params.pop("ymd", None)
+            params["count"] = self.PAGE_SIZE
+            params["order"] = 1
+            params["start"] = chunk_index * self.PAGE_SIZE + 1
+            json = self.__get(params).json()
+
+            reached = json['results_returned'] < self.PAGE_SIZE
+            for event in self._convert_to_events(json['events']):
+                if datetime.fromisoformat(event.updated_at) < watermark:
+                    reached = True
+                    continue
+                if len(self.prefecture) > 0 and not self._is_in_pref(event):
+                    updated[event.uid] = None
+                else:
+                    updated[event.uid] = event
+            if reached:
+                return updated
+        return None
 
     def get_last_modified(self):
         return self.last_modified
@@ -118,7 +222,7 @@ class ConnpassEventRequest:
         """Total results matching the query's filters; set after get_events()/get_events_page()."""
         return self.total_available
 
-    def __query_params(self):
+    def _query_params(self):
         params = {}
         if self.event_id is not None:
             params["event_id"] = self.event_id
@@ -135,80 +239,92 @@ class ConnpassEventRequest:
         return params
 
     def __fetch_json(self, params):
-        json = None
-        last_modified = None
-        if self.cache is not None and not self.skip_cache:
-            response = self.cache.get(params)
-            if response is not None:
-                json = response["json"]
-                last_modified = response["last_modified"]
+        json, last_modified = self._get_json_from_cache(params)
         if json is None:
-            # peek() is read regardless of skip_cache: last_modified
-            # should reflect when the data actually last changed, not
-            # merely when it was last checked, so even a forced refresh
-            # still needs the previous value to compare against.
-            # skip_cache only bypasses using the cache to serve a
-            # response, not this comparison.
-            previous = self.cache.peek(params) if self.cache is not None else None
-            try:
-                response = self.__get(params)
-            except ConnpassException as e:
-                raise e
-
-            json = response.json()
-            last_modified = self.__resolve_last_modified(previous, json)
             if self.cache is not None:
-                self.cache.set(params, json, last_modified=last_modified,
-                               ex=self.cache_ttl)
+                json, last_modified = page_inflight.do(
+                    self.cache.generate_key(params), self.__load_json, params)
+            else:
+                json, last_modified = self.__load_json(params)
 
         if last_modified is not None:
             self.last_modified = max(self.last_modified, last_modified)
 
         return json
 
-    def __resolve_last_modified(self, previous, json):
+    def __load_json(self, params):
+        # Checked again: the previous flight for this page may have just
+        # stored it.
+        json, last_modified = self._get_json_from_cache(params)
+        if json is None:
+            previous = self._peek_previous(params)
+            response = self.__get(params)
+            json = response.json()
+            last_modified = self._set_json_to_cache(params, previous, json)
+        return json, last_modified
+
+    def _get_json_from_cache(self, params):
+        if self.cache is None or self.skip_cache:
+            return None, None
+        response = self.cache.get(params)
+        if response is None:
+            return None, None
+        return response["json"], response["last_modified"]
+
+    def _peek_previous(self, params):
+        # peek_digest() is read regardless of skip_cache: last_modified
+        # should reflect when the data actually last changed, not
+        # merely when it was last checked, so even a forced refresh
+        # still needs the previous digest to compare against.
+        # skip_cache only bypasses using the cache to serve a
+        # response, not this comparison.
+        return self.cache.peek_digest(params) \
+            if self.cache is not None else None
+
+    def _set_json_to_cache(self, params, previous, json):
+        last_modified = self._resolve_last_modified(previous, json)
+        if self.cache is not None:
+            self.cache.set(params, json, last_modified=last_modified,
+                           ex=self.cache_ttl)
+        return last_modified
+
+    def _resolve_last_modified(self, previous, json):
         """Reuse the previously cached last_modified for this page if the
         freshly fetched content is identical to it, rather than always
         stamping "now" -- otherwise every periodic refetch would look
         modified even when nothing actually changed upstream."""
         if previous is not None and previous["last_modified"] is not None \
-                and previous["json"] == json:
+                and previous["digest"] == self.cache.content_digest(json):
             return previous["last_modified"]
         return datetime.now(timezone.utc)
 
     def __get(self, params):
-        if self.cache is not None:
-            while True:
-                wait_sec = self.cache.get_wait_for_request()
-                if wait_sec == 0:
-                    break
-                time.sleep(wait_sec)
-            self.cache.set_wait_for_request(1)
+        with timing.measure("connpass-wait"):
+            request_limiter.acquire(self.cache)
 
+        date = datetime.now()
+        date_str = date.strftime('%Y-%m-%d %H:%M:%S')
+        print({"params": params, "url": self.url, "date": date_str})
+        try:
+            with timing.measure("connpass"):
+                response = session.get(self.url, headers=self._headers(),
+                                       params=params,
+                                       timeout=CONNPASS_REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            raise ConnpassException(500, str(e))
+
+        raise_for_connpass_error(response)
+        return response
+
+    def _headers(self):
         headers = {}
         if self.user_agent is not None:
             headers["User-Agent"] = self.user_agent
         if self.api_key is not None:
             headers["X-API-Key"] = self.api_key
+        return headers
 
-        date = datetime.now()
-        date_str = date.strftime('%Y-%m-%d %H:%M:%S')
-        print({"params": params, "url": self.url, "date": date_str})
-        response = requests.get(self.url, headers=headers, params=params)
-
-        if self.cache is not None:
-            self.cache.set_wait_for_request(1)
-
-        if response.status_code != 200:
-            status_code = response.status_code
-            text = response.text
-            title = re.search(r'<title>(.+?)</title>', text)
-            message = title.group(1) if title else text
-            raise ConnpassException(status_code, message)
-
-        return response
-
-    def __is_in_pref(self, event):
+    def _is_in_pref(self, event):
         if event.address is None:
             return False
 
@@ -218,7 +334,7 @@ class ConnpassEventRequest:
 
         return False
 
-    def __convert_to_events(self, json: dict):
+    def _convert_to_events(self, json: dict):
         events = []
 
         for item in json:
@@ -264,6 +380,8 @@ class ConnpassEventRequest:
 
 
 class ConnpassGroupRequest:
+    PAGE_SIZE = 100
+
     def __init__(self, subdomain=None, cache=None, api_key=None,
                  user_agent=None):
         self.url = "https://connpass.com/api/v2/groups/"
@@ -280,91 +398,91 @@ class ConnpassGroupRequest:
         return groups[0]
 
     def get_groups(self):
-        params = {}
-        if self.subdomain is not None:
-            params["subdomain"] = self.subdomain
-
-        page_size = 100
-        params["count"] = page_size
         page = 0
         groups = []
         while True:
-            params["start"] = page * page_size + 1
+            params = self._page_params(page)
 
-            json = None
-            if self.cache is not None:
-                response = self.cache.get(params)
-                if response is not None:
-                    json = response["json"]
-                    last_modified = response["last_modified"]
+            json, last_modified = self._get_json_from_cache(params)
             if json is None:
-                previous = self.cache.peek(params) if self.cache is not None else None
-                try:
-                    response = self.__get(params)
-                except ConnpassException as e:
-                    raise e
-
+                previous = self.cache.peek_digest(params) \
+                    if self.cache is not None else None
+                response = self.__get(params)
                 json = response.json()
-                last_modified = self.__resolve_last_modified(previous, json)
-                if self.cache is not None:
-                    self.cache.set(params, json, last_modified=last_modified)
-            groups += self.__convert_to_groups(json['groups'])
+                last_modified = self._set_json_to_cache(params, previous, json)
+            groups += self._convert_to_groups(json['groups'])
 
             if last_modified is not None:
                 self.last_modified = max(self.last_modified, last_modified)
 
-            if json['results_returned'] < page_size:
+            if json['results_returned'] < self.PAGE_SIZE:
                 break
             page += 1
 
         return groups
 
+    def _page_params(self, page: int):
+        params = {}
+        if self.subdomain is not None:
+            params["subdomain"] = self.subdomain
+        params["count"] = self.PAGE_SIZE
+        params["start"] = page * self.PAGE_SIZE + 1
+        return params
+
+    def _get_json_from_cache(self, params):
+        if self.cache is None:
+            return None, None
+        response = self.cache.get(params)
+        if response is None:
+            return None, None
+        return response["json"], response["last_modified"]
+
+    def _set_json_to_cache(self, params, previous, json):
+        last_modified = self._resolve_last_modified(previous, json)
+        if self.cache is not None:
+            self.cache.set(params, json, last_modified=last_modified)
+        return last_modified
+
     def get_last_modified(self):
         return self.last_modified
 
-    def __resolve_last_modified(self, previous, json):
+    def _resolve_last_modified(self, previous, json):
         """Reuse the previously cached last_modified for this page if the
         freshly fetched content is identical to it, rather than always
         stamping "now" -- otherwise every periodic refetch would look
         modified even when nothing actually changed upstream."""
         if previous is not None and previous["last_modified"] is not None \
-                and previous["json"] == json:
+                and previous["digest"] == self.cache.content_digest(json):
             return previous["last_modified"]
         return datetime.now(timezone.utc)
 
     def __get(self, params):
-        if self.cache is not None:
-            while True:
-                wait_sec = self.cache.get_wait_for_request()
-                if wait_sec == 0:
-                    break
-                time.sleep(wait_sec)
-            self.cache.set_wait_for_request(1)
+        with timing.measure("connpass-wait"):
+            request_limiter.acquire(self.cache)
+
+        date = datetime.now()
+        date_str = date.strftime('%Y-%m-%d %H:%M:%S')
+        print({"params": params, "url": self.url, "date": date_str})
+        try:
+            with timing.measure("connpass"):
+                response = session.get(self.url, headers=self._headers(),
+                                       params=params,
+                                       timeout=CONNPASS_REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            raise ConnpassException(500, str(e))
+
+        raise_for_connpass_error(response)
+        return response
 
+    def _headers(self):
         headers = {}
         if self.user_agent is not None:
             headers["User-Agent"] = self.user_agent
         if self.api_key is not None:
             headers["X-API-Key"] = self.api_key
+        return headers
 
-        date = datetime.now()
-        date_str = date.strftime('%Y-%m-%d %H:%M:%S')
-        print({"params": params, "url": self.url, "date": date_str})
-        response = requests.get(self.url, headers=headers, params=params)
-
-        if self.cache is not None:
-            self.cache.set_wait_for_request(1)
-
-        if response.status_code != 200:
-            status_code = response.status_code
-            text = response.text
-            title = re.search(r'<title>(.+?)</title>', text)
-            message = title.group(1) if title else text
-            raise ConnpassException(status_code, message)
-
-        return response
-
-    def __convert_to_groups(self, json: dict):
+    def _convert_to_groups(self, json: dict):
         groups = []
 
         for item in json:
@@ -386,3 +504,126 @@ class ConnpassGroupRequest:
                 )
             )
         return groups
+
+
+class AsyncConnpassEventRequest(ConnpassEventRequest):
+    """ConnpassEventRequest whose fetches await the shared pooled client
+    (see providers.http) instead of blocking a thread. Caching, pacing,
+    page coalescing and last_modified tracking behave exactly as in the
+    sync class."""
+
+    async def get_event(self):
+        events = await self.get_events()
+        if len(events) == 0:
+            return None
+        return events[0]
+
+    async def get_events(self):
+        events = []
+        chunk = 0
+        while True:
+            chunk_events, results_returned = \
+                await self._fetch_chunk_async(chunk)
+            events += chunk_events
+            if results_returned < self.PAGE_SIZE:
+                break
+            chunk += 1
+
+        if len(self.prefecture) > 0:
+            events = list(filter(self._is_in_pref, events))
+
+        return events
+
+    async def get_events_page(self, item_start: int, item_count: int,
+                              order: str = "desc"):
+        if order == "asc":
+            await self._fetch_chunk_async(0)
+            desc_range = self._descending_range(item_start, item_count)
+            if desc_range is None:
+                return []
+            events = await self._fetch_range_async(*desc_range)
+            events.reverse()
+            return events
+
+        return await self._fetch_range_async(item_start, item_count)
+
+    async def _fetch_range_async(self, item_start: int, item_count: int):
+        first_chunk, last_chunk = self._chunk_span(item_start, item_count)
+
+        events = []
+        chunk = first_chunk
+        while chunk <= last_chunk:
+            chunk_events, results_returned = \
+                await self._fetch_chunk_async(chunk)
+            events += chunk_events
+            if results_returned < self.PAGE_SIZE:
+                break
+            chunk += 1
+
+        return self._slice_range(events, item_start, item_count, first_chunk)
+
+    async def _fetch_chunk_async(self, chunk_index: int):
+        json = await self._fetch_json_async(self._chunk_params(chunk_index))
+        return self._read_chunk(json)
+
+    async def _fetch_json_async(self, params):
+        json, last_modified = self._get_json_from_cache(params)
+        if json is None:
+            if self.cache is not None:
+                json, last_modified = await page_inflight.do_async(
+                    self.cache.generate_key(params), self._load_json_async,
+                    params)
+            else:
+                json, last_modified = await self._load_json_async(params)
+
+        if last_modified is not None:
+            self.last_modified = max(self.last_modified, last_modified)
+
+        return json
+
+    async def _load_json_async(self, params):
+        # Checked again, as in the sync __load_json().
+        json, last_modified = self._get_json_from_cache(params)
+        if json is None:
+            previous = self._peek_previous(params)
+            response = await get_async(self.url, params, self._headers(),
+                                       self.cache)
+            json = response.json()
+            last_modified = self._set_json_to_cache(params, previous, json)
+        return json, last_modified
+
+
+class AsyncConnpassGroupRequest(ConnpassGroupRequest):
+    """ConnpassGroupRequest whose fetches await the shared pooled client
+    (see providers.http) instead of blocking a thread."""
+
+    async def get_group(self):
+        groups = await self.get_groups()
+        if len(groups) == 0:
+            return None
+        return groups[0]
+
+    async def get_groups(self):
+        page = 0
+        groups = []
+        while True:
+            params = self._page_params(page)
+
+            json, last_modified = self._get_json_from_cache(params)
+            if json is None:
+                previous = self.cache.peek_digest(params) \
+                    if self.cache is not None else None
+                response = await get_async(self.url, params, self._headers(),
+                                           self.cache)
+                json = response.json()
+                last_modified = self._set_json_to_cache(params, previous, json)
+            groups += self._convert_to_groups(json['groups'])
+
+            if last_modified is not None:
+                self.last_modified = max(self.last_modified, last_modified)
+
+            if json['results_returned'] < self.PAGE_SIZE:
+                break
+            page += 1
+
+        return groups
@@ -0,0 +1,136 @@
+import asyncio
+import contextlib
+from urllib.parse import urlsplit
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_TIMEOUT = 10
+MAX_CONNECTIONS = 20
+MAX_CONNECTIONS_PER_HOST = 4
+
+
+class AsyncHttpClient:
+    """Pooled HTTP client shared by the async provider variants, so
+    upstream connections are kept alive and reused across requests rather
+    than opened per fetch. On top of the pool's overall connection cap,
+    concurrent requests to any one host are capped separately, so a burst
+    against one slow source can't take every connection.
+
+    The underlying httpx.AsyncClient is bound to the event loop it was
+    first used on; call aclose() before that loop ends (see main.lifespan)."""
+
+    def __init__(self, max_connections=MAX_CONNECTIONS,
+                 max_connections_per_host=MAX_CONNECTIONS_PER_HOST,
+                 timeout=DEFAULT_TIMEOUT):
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self._client = None
+        self._host_semaphores = {}
+
+    async def get(self, url, params=None, headers=None,
+                  timeout=None) -> httpx.Response:
+        async with self._host_semaphore(url):
+            return await self._get_client().get(
+                url, params=params, headers=headers,
+                timeout=timeout if timeout is not None else self.timeout)
+
+    @contextlib.asynccontextmanager
+    async def stream(self, url, params=None, headers=None, timeout=None):
+        """Like get(), but yields the response before its body is read, to
+        be consumed incrementally (aiter_bytes()); the connection counts
+        against the host's cap until the block exits."""
+        async with self._host_semaphore(url):
+            async with self._get_client().stream(
+                    "GET", url, params=params, headers=headers,
+                    timeout=timeout if timeout is not None
+                    else self.timeout) as response:
+                yield response
+
+    def _host_semaphore(self, url) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_connections_per_host)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+        self._host_semaphores = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            self._client = httpx.AsyncClient(limits=limits,
+                                             timeout=self.timeout,
+                                             follow_redirects=True)
+        return self._client
+
+
+async_client = AsyncHttpClient()
+
+
+def make_session(max_connections=MAX_CONNECTIONS) -> requests.Session:
+    """A requests.Session keeping up to max_connections connections per
+    host alive for reuse, for the sync providers. A Session has no default
+    timeout, so every request must still pass one."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_connections,
+                          pool_maxsize=max_connections)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Shared by the sync providers (connpass, iCalendar, archive), used by the
+# service threads (fan-out fetches, background refreshes) concurrently;
+# urllib3's pools are thread-safe.
+session = make_session()
+
+
+def conditional_headers(cache, key_data, url) -> dict:
+    """If-None-Match/If-Modified-Since for url, from the validators stored
+    by store_validators() with its last response, provided that response
+    (cached under key_data) may still be held to fall back on after a 304.
+    cache.renew() has the final say on that: if it finds nothing, the
+    caller refetches without these."""
+    if cache is None or cache.ttl(key_data) is None:
+        return {}
+    response = cache.get(_validators_key(url))
+    if response is None or not isinstance(response["json"], dict):
+        return {}
+    validators = response["json"]
+    headers = {}
+    if validators.get("etag") is not None:
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified") is not None:
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def response_validators(response) -> dict | None:
+    """The ETag/Last-Modified of a requests or httpx response, if any."""
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if etag is None and last_modified is None:
+        return None
+    return {"etag": etag, "last_modified": last_modified}
+
+
+def store_validators(cache, url, validators, ex):
+    """Keep validators as long as the response they belong to may be
+    held, i.e. ex plus the cache's stale retention."""
+    if cache is None or validators is None:
+        return
+    if ex is not None:
+        ex += cache.STALE_RETENTION_SECONDS
+    cache.set(_validators_key(url), validators, ex=ex)
+
+
+def _validators_key(url) -> dict:
+    return {"http_validators": url}
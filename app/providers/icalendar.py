@@ -1,9 +1,20 @@
+import dataclasses
+import hashlib
+import httpx
 import requests
 import re
+import threading
+from collections import OrderedDict
 from icalendar import Calendar as IcalCalendar
+from .. import timing
 from ..models import Event
+from .http import async_client, conditional_headers, response_validators
+from .http import session, store_validators
 from datetime import datetime, timezone
 
+ICAL_CACHE_TTL = 3600
+ICAL_REQUEST_TIMEOUT = 10
+
 
 class IcalException(Exception):
     def __init__(self, status_code, message):
@@ -11,6 +22,69 @@ class IcalException(Exception):
         self.message = message
 
 
+class ParsedFeed:
+    """A feed's valid events as parsed once, with their start and end
+    kept as datetimes so open_status can be recomputed on every read, and
+    indexed by the month they start in."""
+
+    def __init__(self, parsed):
+        # (position in the feed, event, dtstart, dtend)
+        self.entries = tuple((i, event, dtstart, dtend)
+                             for i, (event, dtstart, dtend)
+                             in enumerate(parsed))
+        self.by_month = {}
+        for entry in self.entries:
+            month = entry[1].started_at[:7].replace("-", "")
+            self.by_month.setdefault(month, []).append(entry)
+
+    def select(self, ym, ymd):
+        """Entries starting in any month of ym or on any day of ymd, in
+        feed order; all of them if neither is given."""
+        if len(ym) == 0 and len(ymd) == 0:
+            return self.entries
+
+        selected = []
+        for month in set(ym) | {day[:6] for day in ymd}:
+            for entry in self.by_month.get(month, ()):
+                event_date = entry[1].started_at[:10].replace("-", "")
+                if event_date[:6] in ym or event_date in ymd:
+                    selected.append(entry)
+        selected.sort(key=lambda entry: entry[0])
+        return selected
+
+
+class ParsedFeedMemo:
+    """ParsedFeeds keyed by feed content digest (and the group the feed is
+    configured as, which its events carry), so a cache hit, or a refetch
+    of an unchanged feed, skips from_ical() and the VEVENT walk entirely.
+    On a cache hit the digest is the one the cache keeps for the entry
+    (see EventRequestCache.peek_digest()), the same sha256 of the feed, so
+    the feed isn't hashed again. Holds the max_entries most recently used
+    feeds."""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._feeds = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> ParsedFeed | None:
+        with self._lock:
+            feed = self._feeds.get(key)
+            if feed is not None:
+                self._feeds.move_to_end(key)
+            return feed
+
+    def put(self, key, feed: ParsedFeed):
+        with self._lock:
+            self._feeds[key] = feed
+            self._feeds.move_to_end(key)
+            while len(self._feeds) > self.max_entries:
+                self._feeds.popitem(last=False)
+
+
+parsed_feeds = ParsedFeedMemo()
+
+
 class IcalEventRequest:
     def __init__(self, url, key, name=None, image_url=None, group_url=None,
                  ym=None, ymd=None, cache=None):
@@ -23,6 +97,8 @@ class IcalEventRequest:
         self.ymd = [] if ymd is None else ymd
         self.cache = cache
         self.last_modified = datetime.fromtimestamp(0, timezone.utc)
+        # ETag/Last-Modified of the feed just fetched; see store_validators().
+        self._validators = None
 
     def get_events(self):
         url = self.url
@@ -31,15 +107,10 @@ class IcalEventRequest:
         ymd = self.ymd
 
         try:
-            content = self.__get_content_from_cache(url, cache)
+            content, digest = self._get_content_from_cache(url, cache)
             if content is None:
-                previous = cache.peek(url) if cache is not None else None
-                content = self.__get_content(url)
-                self.last_modified = self.__resolve_last_modified(previous, content)
-                self.__set_content_to_cache(url, cache, content, self.last_modified)
-            all_events = self.__parse_icalendar(content)
-            selected_events = self.__find_by_ym_ymd(all_events, ym, ymd)
-            return selected_events
+                content = self.__fetch_content(url, cache)
+            return self._select_events(content, ym, ymd, digest)
 
         except requests.RequestException as e:
             raise IcalException(500, str(e))
@@ -53,63 +124,111 @@ class IcalEventRequest:
     def get_last_modified(self):
         return self.last_modified
 
-    def __resolve_last_modified(self, previous, content):
+    def __fetch_content(self, url, cache):
+        previous = cache.peek_digest(url) if cache is not None else None
+        content = self.__get_content(url, conditional_headers(cache, url, url))
+        if content is None:
+            content = self._renew_content_in_cache(url, cache)
+            if content is not None:
+                return content
+            # Dropped from the cache since; fetch it in full after all.
+            content = self.__get_content(url, {})
+        self.last_modified = self._resolve_last_modified(cache, previous, content)
+        self._set_content_to_cache(url, cache, content, self.last_modified)
+        return content
+
+    def _resolve_last_modified(self, cache, previous, content):
         """Reuse the previously cached last_modified if the freshly fetched
-        feed is byte-for-byte identical to it, rather than always stamping
+        feed is byte-for-byte identical to it (per the digests, see
+        EventRequestCache.peek_digest()), rather than always stamping
         "now" -- otherwise every periodic refetch would look modified even
         when nothing actually changed upstream."""
         if previous is not None and previous["last_modified"] is not None \
-                and previous["content"].encode("utf-8") == content:
+                and previous["digest"] == cache.content_digest(
+                    content.decode("utf-8")):
             return previous["last_modified"]
         return datetime.now(timezone.utc)
 
-    def __find_by_ym_ymd(self, events, ym, ymd):
-        if len(ym) == 0 and len(ymd) == 0:
-            return events
+    def _select_events(self, content, ym, ymd, digest=None):
+        """The feed's events within ym/ymd, as copies of the memoized
+        parse (see ParsedFeedMemo) with open_status as of now. digest is
+        content's, if the cache already knows it."""
+        if digest is None:
+            digest = hashlib.sha256(content).hexdigest()
+        key = (digest, self.key, self.name, self.group_url)
+        feed = parsed_feeds.get(key)
+        if feed is None:
+            with timing.measure("ical-parse"):
+                feed = ParsedFeed(self._parse_icalendar(content))
+            parsed_feeds.put(key, feed)
 
-        selected = []
-        for event in events:
-            event_date = event.started_at[:10].replace("-", "")
-            if event_date[:6] in self.ym or event_date in self.ymd:
-                selected.append(event)
-        return selected
+        return [dataclasses.replace(
+                    event, open_status=self._make_open_status(dtstart, dtend))
+                for _, event, dtstart, dtend in feed.select(ym, ymd)]
 
-    def __get_content_from_cache(self, url, cache):
+    def _get_content_from_cache(self, url, cache):
+        """(content, digest) of the cached feed, the digest being the one
+        stored along with that very content (see EventRequestCache.get());
+        (None, None) on a miss."""
         if cache is None:
-            return None
+            return None, None
         cache_content = cache.get(url)
         if cache_content is None:
-            return None
+            return None, None
 
         content_text = cache_content["content"]
         content = content_text.encode("utf-8")
         self.last_modified = cache_content["last_modified"]
 
-        return content
+        return content, cache_content.get("digest")
 
-    def __set_content_to_cache(self, url, cache, content, last_modified):
+    def _set_content_to_cache(self, url, cache, content, last_modified):
         if cache is None:
             return
         content_text = content.decode("utf-8")
-        cache.set(url, content_text, last_modified=last_modified)
+        cache.set(url, content_text, last_modified=last_modified,
+                  ex=ICAL_CACHE_TTL)
+        store_validators(cache, url, self._validators, ICAL_CACHE_TTL)
 
-    def __get_content(self, url):
-        print(f"Fetching content from {url}")
-        response = requests.get(url)
+    def _renew_content_in_cache(self, url, cache):
+        """After a 304: keep serving the cached feed for another TTL, with
+        its last_modified unchanged. None if it's no longer held."""
+        cache_content = cache.renew(url, ex=ICAL_CACHE_TTL)
+        if cache_content is None:
+            return None
+        store_validators(cache, url, self._validators, ICAL_CACHE_TTL)
+        self.last_modified = cache_content["last_modified"]
+        return cache_content["content"].encode("utf-8")
+
+    def _read_response(self, response, headers):
+        """The feed's body, or None for a 304 to a conditional request."""
         status_code = response.status_code
+        if status_code == 304 and headers:
+            self._validators = response_validators(response) \
+                or self._validators
+            return None
         if status_code != 200:
             raise IcalException(status_code, "Failed to fetch content")
 
+        self._validators = response_validators(response)
         return response.content
 
-    def __parse_icalendar(self, ical_str):
+    def __get_content(self, url, headers):
+        print(f"Fetching content from {url}")
+        with timing.measure("icalendar"):
+            response = session.get(url, headers=headers,
+                                   timeout=ICAL_REQUEST_TIMEOUT)
+        return self._read_response(response, headers)
+
+    def _parse_icalendar(self, ical_str):
+        """[(event, dtstart, dtend)] for every valid VEVENT, in feed order."""
         cal = IcalCalendar.from_ical(ical_str)
 
         events = []
         for data in cal.walk("VEVENT"):
             dtstart = data.get("dtstart").dt
             dtend = data.get("dtend").dt
-            open_status = self.__make_open_status(dtstart, dtend)
+            open_status = self._make_open_status(dtstart, dtend)
 
             event = Event.from_json({
                 "uid": data.get("uid"),
@@ -133,11 +252,11 @@ class IcalEventRequest:
                     event.event_url = match.group(0)
             if not event.is_valid():
                 continue
-            events.append(event)
+            events.append((event, dtstart, dtend))
 
         return events
 
-    def __make_open_status(self, dtstart, dtend):
+    def _make_open_status(self, dtstart, dtend):
         now = datetime.now(dtstart.tzinfo)
         if dtstart > now:
             return "preopen"
@@ -145,3 +264,48 @@ class IcalEventRequest:
             return "open"
         else:
             return "close"
+
+
+class AsyncIcalEventRequest(IcalEventRequest):
+    """IcalEventRequest whose feed fetch awaits the shared pooled client
+    (see providers.http) instead of blocking a thread."""
+
+    async def get_events(self):
+        url = self.url
+        cache = self.cache
+
+        try:
+            content, digest = self._get_content_from_cache(url, cache)
+            if content is None:
+                content = await self._fetch_content_async(url, cache)
+            return self._select_events(content, self.ym, self.ymd, digest)
+
+        except httpx.HTTPError as e:
+            raise IcalException(500, str(e))
+
+        except IcalException as e:
+            raise e
+
+        except Exception as e:
+            raise IcalException(500, str(e))
+
+    async def _fetch_content_async(self, url, cache):
+        previous = cache.peek_digest(url) if cache is not None else None
+        content = await self._get_content_async(
+            url, conditional_headers(cache, url, url))
+        if content is None:
+            content = self._renew_content_in_cache(url, cache)
+            if content is not None:
+                return content
+            content = await self._get_content_async(url, {})
+        self.last_modified = self._resolve_last_modified(cache, previous,
+                                                         content)
+        self._set_content_to_cache(url, cache, content, self.last_modified)
+        return content
+
+    async def _get_content_async(self, url, headers):
+        print(f"Fetching content from {url}")
+        with timing.measure("icalendar"):
+            response = await async_client.get(url, headers=headers,
+                                              timeout=ICAL_REQUEST_TIMEOUT)
+        return self._read_response(response, headers)
@@ -0,0 +1,143 @@
+import codecs
+import json
+
+_WHITESPACE = " \t\n\r"
+
+
+class JsonMembersParser:
+    """Incrementally parses a JSON document whose top level is an object,
+    as its text arrives in pieces (see feed()), yielding (key, value) for
+    each member as soon as it's complete.
+
+    The value of a key in streamed that is an array is not yielded whole:
+    each element is yielded as (key, element) instead, so a long array
+    never has to be held in memory, only the element being parsed. Already
+    parsed text is dropped as it goes."""
+
+    def __init__(self, streamed=()):
+        self.streamed = frozenset(streamed)
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"
+        self._key = None
+        # Don't retry decoding an incomplete value until the buffer has
+        # grown past this, so a value spanning many pieces isn't rescanned
+        # from its start on every one of them.
+        self._retry_at = 0
+
+    def feed(self, data):
+        """Add the next piece of the document (bytes in UTF-8, or str) and
+        yield the members it completes."""
+        if isinstance(data, bytes):
+            data = self._text_decoder.decode(data)
+        self._buffer += data
+        if len(self._buffer) >= self._retry_at:
+            yield from self._parse(final=False)
+        self._buffer = self._buffer[self._pos:]
+        self._retry_at = max(0, self._retry_at - self._pos)
+        self._pos = 0
+
+    def close(self):
+        """Yield whatever the rest of the document completes; raises
+        ValueError if it ends before the top-level object does."""
+        self._buffer += self._text_decoder.decode(b"", final=True)
+        yield from self._parse(final=True)
+        if self._state != "done":
+            raise ValueError("Incomplete JSON document")
+        if self._skip_whitespace() < len(self._buffer):
+            raise ValueError(f"Extra data at {self._pos}")
+
+    def _parse(self, final):
+        while self._state != "done":
+            pos = self._skip_whitespace()
+            if pos == len(self._buffer):
+                return
+            char = self._buffer[pos]
+            state = self._state
+
+            if state == "start":
+                self._expect(char, "{")
+                self._state = "first_key"
+            elif state in ("key", "first_key"):
+                if char == "}" and state == "first_key":
+                    self._pos += 1
+                    self._state = "done"
+                    continue
+                key = self._decode(final)
+                if key is self._INCOMPLETE:
+                    return
+                if not isinstance(key, str):
+                    raise ValueError(f"Expected a key at {pos}")
+                self._key = key
+                self._state = "colon"
+            elif state == "colon":
+                self._expect(char, ":")
+                self._state = "value"
+            elif state == "value":
+                if char == "[" and self._key in self.streamed:
+                    self._pos += 1
+                    self._state = "first_item"
+                    continue
+                value = self._decode(final)
+                if value is self._INCOMPLETE:
+                    return
+                yield self._key, value
+                self._state = "after_value"
+            elif state in ("item", "first_item"):
+                if char == "]" and state == "first_item":
+                    self._pos += 1
+                    self._state = "after_value"
+                    continue
+                value = self._decode(final)
+                if value is self._INCOMPLETE:
+                    return
+                yield self._key, value
+                self._state = "after_item"
+            elif state == "after_item":
+                self._expect(char, ",]")
+                self._state = "item" if char == "," else "after_value"
+            elif state == "after_value":
+                self._expect(char, ",}")
+                self._state = "key" if char == "," else "done"
+
+    # Returned by _decode() when the value isn't complete yet.
+    _INCOMPLETE = object()
+
+    def _decode(self, final):
+        """The value starting at the current position, or _INCOMPLETE if
+        more of the document is needed to tell where it ends."""
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            self._wait_for_more()
+            return self._INCOMPLETE
+        # A number (or anything) running up to the very end of what's
+        # arrived so far might continue in the next piece.
+        if end == len(self._buffer) and not final:
+            self._wait_for_more()
+            return self._INCOMPLETE
+        self._pos = end
+        self._retry_at = 0
+        return value
+
+    def _wait_for_more(self):
+        pending = len(self._buffer) - self._pos
+        self._retry_at = len(self._buffer) + max(pending, 1)
+
+    def _skip_whitespace(self) -> int:
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return pos
+
+    def _expect(self, char, allowed):
+        if char not in allowed:
+            raise ValueError(
+                f"Expected one of {allowed!r} at {self._pos}, got {char!r}")
+        self._pos += 1
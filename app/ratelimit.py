@@ -0,0 +1,184 @@
+import asyncio
+import collections
+import contextlib
+import contextvars
+import threading
+import time
+
+FOREGROUND = "foreground"
+BACKGROUND = "background"
+# Served in this order: a waiting foreground request always goes first.
+PRIORITIES = (FOREGROUND, BACKGROUND)
+
+_priority = contextvars.ContextVar("upstream_request_priority",
+                                   default=FOREGROUND)
+
+
+@contextlib.contextmanager
+def background_priority():
+    """Mark the upstream requests made inside (including those fanned out
+    to other threads, which copy the caller's context) as background, so
+    they yield to user-facing ones waiting on the same limiter."""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+class _Waiter:
+    """One caller queued in TokenBucketLimiter; woken when it reaches the
+    head of the queue. Sync callers block on a threading.Event, async ones
+    on an asyncio.Event set from whichever thread dequeues their turn."""
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None \
+            else threading.Event()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.event.set)
+
+
+class TokenBucketLimiter:
+    """Paces upstream requests to rate per second, allowing bursts of up to
+    burst requests after a quiet spell.
+
+    Callers wait in FIFO order, per priority (see background_priority()),
+    and only the one at the head of the queue draws on the bucket, so a
+    steady stream of newcomers can't starve an earlier caller. The bucket
+    itself lives in the cache (see EventRequestCache.take_request_token()),
+    so workers sharing the cache share the rate; ordering between workers
+    is not FIFO, only within each.
+
+    acquire() blocks the calling thread; acquire_async() waits without
+    blocking the event loop, for the async providers (see
+    providers.connpass.get_async()). Both queue in the same FIFO and skip
+    pacing when cache is None, as the providers do for uncached one-off
+    requests."""
+
+    def __init__(self, rate=1.0, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._queues = {priority: collections.deque()
+                        for priority in PRIORITIES}
+        self._lock = threading.Lock()
+        self._acquired = 0
+        self._waited_seconds = 0.0
+        self._max_waiting = 0
+
+    def configure(self, rate=None, burst=None):
+        """Apply the configured rate/burst to the shared instance."""
+        if rate is not None:
+            self.rate = rate
+        if burst is not None:
+            self.burst = burst
+
+    def acquire(self, cache, priority=None):
+        if cache is None:
+            return
+        waiter = _Waiter()
+        started = self._enqueue(waiter, priority)
+        try:
+            while True:
+                # Cleared first, so a wake() arriving while this tries for
+                # a token isn't lost.
+                waiter.event.clear()
+                wait_sec = self._try_take(waiter, cache)
+                if wait_sec == 0:
+                    return
+                waiter.event.wait(wait_sec)
+        finally:
+            self._leave(waiter, started)
+
+    async def acquire_async(self, cache, priority=None):
+        if cache is None:
+            return
+        waiter = _Waiter(asyncio.get_running_loop())
+        started = self._enqueue(waiter, priority)
+        try:
+            while True:
+                waiter.event.clear()
+                if self._is_head(waiter):
+                    # Off the loop: with Redis, taking a token is a network
+                    # round-trip.
+                    wait_sec = self._took(await asyncio.to_thread(
+                        cache.take_request_token, self.rate, self.burst))
+                else:
+                    wait_sec = self.IDLE_WAIT_SECONDS
+                if wait_sec == 0:
+                    return
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), wait_sec)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._leave(waiter, started)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "waiting": {priority: len(queue)
+                            for priority, queue in self._queues.items()},
+                "max_waiting": self._max_waiting,
+                "acquired": self._acquired,
+                "waited_seconds": round(self._waited_seconds, 3),
+            }
+
+    # Polling interval for a caller that isn't at the head yet; it's also
+    # woken as soon as it gets there, so this is only a safety net.
+    IDLE_WAIT_SECONDS = 1.0
+
+    def _enqueue(self, waiter, priority) -> float:
+        priority = priority or current_priority()
+        with self._lock:
+            self._queues[priority].append(waiter)
+            self._max_waiting = max(
+                self._max_waiting,
+                sum(len(queue) for queue in self._queues.values()))
+        return time.monotonic()
+
+    def _try_take(self, waiter, cache) -> float:
+        """0 once waiter has taken a token; otherwise how long to wait
+        before trying again."""
+        if not self._is_head(waiter):
+            return self.IDLE_WAIT_SECONDS
+        # Outside the lock: with Redis this is a network round-trip, which
+        # mustn't hold up callers enqueuing or leaving meanwhile. The
+        # bucket is atomic by itself, so a newcomer taking over the head
+        # in the meantime can't push requests past the rate.
+        return self._took(cache.take_request_token(self.rate, self.burst))
+
+    def _is_head(self, waiter) -> bool:
+        with self._lock:
+            return self._head() is waiter
+
+    def _took(self, wait_sec) -> float:
+        if wait_sec == 0:
+            with self._lock:
+                self._acquired += 1
+        return wait_sec
+
+    def _leave(self, waiter, started):
+        with self._lock:
+            for queue in self._queues.values():
+                if waiter in queue:
+                    queue.remove(waiter)
+                    break
+            self._waited_seconds += time.monotonic() - started
+            head = self._head()
+        if head is not None:
+            head.wake()
+
+    def _head(self):
+        for priority in PRIORITIES:
+            if self._queues[priority]:
+                return self._queues[priority][0]
+        return None
@@ -0,0 +1,181 @@
+import math
+from datetime import datetime, timezone
+from . import timing
+from .cache import EventRequestCache
+
+
+class RedisEventRequestCache(EventRequestCache):
+    """EventRequestCache kept in Redis (or anything speaking its protocol),
+    so every uvicorn worker and Lambda container shares one copy of the
+    cached responses, the connpass request pacing and the refresh lock,
+    instead of each warming its own.
+
+    Keys are laid out as in memory (prefix + sha256 + ":content" /
+    ":last_modified" / ":digest"). Redis expires keys outright, so the
+    content is simply given a Redis TTL of ex, while the digest and
+    last_modified, which peek_digest() needs for STALE_RETENTION_SECONDS
+    after expiry, are kept for ex + STALE_RETENTION_SECONDS. Each entry's
+    logical expiry is stored under ":expires_at" alongside them.
+    Eviction under memory pressure is left to Redis' own maxmemory policy.
+
+    client is a redis.Redis (or compatible) instance; see from_url()."""
+
+    NO_EXPIRY = "none"
+
+    def __init__(self, client, prefix="event-request:"):
+        super().__init__(prefix=prefix)
+        self._client = client
+
+    @classmethod
+    def from_url(cls, url, prefix="event-request:"):
+        # Imported here so the redis package is only required when a
+        # Redis URL is actually configured.
+        import redis
+        return cls(redis.Redis.from_url(url, decode_responses=True),
+                   prefix=prefix)
+
+    def get(self, key_data) -> dict | None:
+        with timing.measure("cache-read"):
+            content, last_modified, expires_at, digest = \
+                self._read_entry(key_data)
+            if expires_at is None or (
+                    expires_at != self.NO_EXPIRY and
+                    datetime.now(timezone.utc).timestamp() > float(expires_at)):
+                timing.count("cache-miss")
+                return None
+            timing.count("cache-hit")
+            return self._to_response(content, last_modified, digest)
+
+    def get_version(self, key_data) -> dict | None:
+        key = self.generate_key(key_data)
+        last_modified, expires_at = self._client.mget(key + ":last_modified",
+                                                      key + ":expires_at")
+        if expires_at is None or (
+                expires_at != self.NO_EXPIRY and
+                datetime.now(timezone.utc).timestamp() > float(expires_at)):
+            return None
+        return {"version": expires_at,
+                "last_modified": self._to_datetime(last_modified)}
+
+    def peek(self, key_data) -> dict | None:
+        content, last_modified, _, digest = self._read_entry(key_data)
+        return self._to_response(content, last_modified, digest)
+
+    def peek_digest(self, key_data) -> dict | None:
+        key = self.generate_key(key_data)
+        digest, last_modified = self._client.mget(key + ":digest",
+                                                  key + ":last_modified")
+        if digest is None:
+            return None
+        return {"digest": digest,
+                "last_modified": self._to_datetime(last_modified)}
+
+    def set(self, key_data, response_data, last_modified=None, ex=3600):
+        key = self.generate_key(key_data)
+        content = self._to_content(response_data)
+
+        if ex is None:
+            expires_at = self.NO_EXPIRY
+            content_px = px = None
+        else:
+            expires_at = repr(datetime.now(timezone.utc).timestamp() + ex)
+            content_px = max(1, int(ex * 1000))
+            px = max(1, int((ex + self.STALE_RETENTION_SECONDS) * 1000))
+
+        pipe = self._client.pipeline()
+        pipe.set(key + ":content", content, px=content_px)
+        pipe.set(key + ":digest", self.content_digest(content), px=px)
+        pipe.set(key + ":expires_at", expires_at, px=px)
+        if last_modified is not None:
+            pipe.set(key + ":last_modified", int(last_modified.timestamp()),
+                     px=px)
+        pipe.execute()
+
+    def renew(self, key_data, ex=3600) -> dict | None:
+        # Redis drops the content itself at expiry, so there's rarely
+        # anything left to renew by the time it's needed.
+        response = self.peek(key_data)
+        if response is None:
+            return None
+        self.set(key_data, response["content"],
+                 last_modified=response["last_modified"], ex=ex)
+        return response
+
+    def get_object(self, key_data, model) -> dict | None:
+        # Another worker may have replaced the entry since, so objects
+        # can't be kept around between calls here; decode every time.
+        response = self.get(key_data)
+        if response is None or response["json"] is None:
+            return None
+        return {
+            "items": tuple(model.from_json(response["json"])),
+            "last_modified": response["last_modified"]
+        }
+
+    def set_object(self, key_data, items, model, last_modified=None,
+                   ex=3600, digest=None):
+        # Serialized right away, so set() works the digest out itself.
+        self.set(key_data, model.to_json(list(items)),
+                 last_modified=last_modified, ex=ex)
+
+    def add(self, key_data, response_data, ex=3600) -> bool:
+        """Atomic via SET NX. The key then expires outright after ex, so
+        don't also write key_data with set()."""
+        key = self.generate_key(key_data)
+        stored = self._client.set(key + ":content",
+                                  self._to_content(response_data),
+                                  nx=True, px=int(ex * 1000))
+        if stored:
+            expires_at = repr(datetime.now(timezone.utc).timestamp() + ex)
+            self._client.set(key + ":expires_at", expires_at,
+                             px=int(ex * 1000))
+        return bool(stored)
+
+    def delete(self, key_data):
+        key = self.generate_key(key_data)
+        self._client.delete(*(key + suffix for suffix in (
+            ":content", ":last_modified", ":digest", ":expires_at")))
+
+    def ttl(self, key_data) -> float | None:
+        expires_at = self._client.get(self.generate_key(key_data)
+                                      + ":expires_at")
+        if expires_at is None:
+            return None
+        if expires_at == self.NO_EXPIRY:
+            return math.inf
+        return float(expires_at) - datetime.now(timezone.utc).timestamp()
+
+    def take_request_token(self, rate: float, burst: int) -> float:
+        """The bucket is burst slot keys, each held for burst / rate
+        seconds once taken: at most burst requests in any such window, rate
+        per second on average. Each slot is claimed with SET NX, so it's
+        atomic across workers without a script."""
+        px = max(1, int(burst / rate * 1000))
+        date_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        keys = self._request_token_keys(burst)
+        for key in keys:
+            if self._client.set(key, date_str, nx=True, px=px):
+                return 0
+        pttls = [self._client.pttl(key) for key in keys]
+        # A slot may have freed up since its SET; retry shortly rather than
+        # reporting it as taken.
+        return min(pttl / 1000 if pttl > 0 else 0.01 for pttl in pttls)
+
+    def sweep(self) -> int:
+        # Redis expires stale keys on its own.
+        return 0
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+    def _read_entry(self, key_data):
+        key = self.generate_key(key_data)
+        # One MGET, and set() writes in one MULTI/EXEC pipeline, so the
+        # digest is always that of the content read with it.
+        return self._client.mget(key + ":content", key + ":last_modified",
+                                 key + ":expires_at", key + ":digest")
+
+    def _request_token_keys(self, burst) -> list:
+        # Shared by every cache on the same Redis, like the single
+        # process-wide bucket EventRequestCache keeps in memory.
+        return [f"request_token:{i}" for i in range(burst)]
@@ -0,0 +1,70 @@
+import math
+import random
+import threading
+import time
+
+
+class RefreshAheadScheduler:
+    """Decides when a cached get_events()/get_groups() entry is worth
+    refetching in the background, instead of refetching on every request.
+
+    Each entry is stored with a long hard expiry (`ex`, e.g. 72 hours) so
+    it can keep being served while a refresh is pending, but is only
+    considered fresh for a much shorter `refresh_interval` (the inner
+    provider cache_ttl). The entry's age is derived from the cache's own
+    remaining TTL (see EventRequestCache.ttl()), so its last refresh time
+    needs no bookkeeping of its own.
+
+    A refresh is due once the entry is older than refresh_interval. Inside
+    the last `window_ratio` of that interval, early_expiration refreshes
+    it early with a probability ramping up from 0 to 1, so entries warmed
+    at the same time don't all come due on the exact same request.
+
+    A claim (see try_begin()) lapses after claim_ttl seconds even if
+    finish() is never called, e.g. because the request that queued the
+    refresh failed and its background tasks were dropped with it;
+    otherwise that key would never refresh again."""
+
+    def __init__(self, window_ratio=0.1, early_expiration=True,
+                 claim_ttl=60):
+        self.window_ratio = window_ratio
+        self.early_expiration = early_expiration
+        self.claim_ttl = claim_ttl
+        # Key -> time.monotonic() when it was claimed.
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def should_refresh(self, ttl, ex, refresh_interval) -> bool:
+        """ttl is the entry's remaining TTL as returned by
+        EventRequestCache.ttl(): None if missing, math.inf if pinned."""
+        if ttl is None:
+            return True
+        if ttl == math.inf:
+            return False
+
+        # Seconds since the entry was last stored with lifetime ex.
+        age = ex - ttl
+        due_in = refresh_interval - age
+        if due_in <= 0:
+            return True
+
+        window = refresh_interval * self.window_ratio
+        if due_in > window or not self.early_expiration:
+            return False
+
+        return random.random() < 1 - due_in / window
+
+    def try_begin(self, key: str) -> bool:
+        """Claim the refresh for a cache key; False if one is already
+        queued or running, so the same params never refresh twice at once."""
+        now = time.monotonic()
+        with self._lock:
+            claimed_at = self._in_flight.get(key)
+            if claimed_at is not None and now - claimed_at < self.claim_ttl:
+                return False
+            self._in_flight[key] = now
+            return True
+
+    def finish(self, key: str):
+        with self._lock:
+            self._in_flight.pop(key, None)
@@ -0,0 +1,220 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from fastapi.responses import Response
+from .encoder import normalize_fields
+
+try:
+    # Optional: without it, responses are only offered gzipped.
+    import brotli
+except ImportError:
+    brotli = None
+
+# The content codings responses are stored in besides identity, most
+# preferred first (when the client weighs them equally).
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def content_etag(body: bytes) -> str:
+    """A strong ETag derived from body alone, so every process (and every
+    page or fields= variant) agrees on it without sharing anything."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=6)
+    # No timestamp, so the same body always compresses to the same bytes.
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def negotiate_encoding(accept_encoding: str | None, available) -> str | None:
+    """The encoding among available that accept_encoding (an
+    Accept-Encoding header value) weighs highest, ties going to the one
+    listed first in available; None for identity."""
+    if not accept_encoding or not available:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding:
+            weights[coding] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in available:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class RenderedResponse:
+    """A response body as sent, plus what's needed to answer for it again
+    without rendering: its version (see ResponseCache.get()), its ETag
+    (computed here, once), the Last-Modified it was rendered under, and
+    any headers of its own (e.g. X-Total-Count).
+
+    A body of at least compress_min_bytes is also offered in each of
+    ENCODINGS (see encodings), each variant with an ETag of its own, as a
+    strong validator must differ between content codings. A variant is
+    only compressed once a request asks for it (see variant()), or up
+    front for every encoding once the response is stored (see
+    ResponseCache.put()), so a one-off response costs at most the one
+    compression its client negotiated."""
+
+    def __init__(self, body: bytes, version, last_modified=None,
+                 headers: dict = None, compress_min_bytes: int = None):
+        self.body = body
+        self.version = version
+        self.etag = content_etag(body)
+        self.last_modified = last_modified
+        self.headers = headers or {}
+        self.encodings = ENCODINGS \
+            if compress_min_bytes is not None \
+            and len(body) >= compress_min_bytes else ()
+        # Encoding -> compressed body, as made so far.
+        self._variants = {}
+
+    def variant(self, encoding: str) -> bytes:
+        """The body compressed in encoding (one of encodings)."""
+        compressed = self._variants.get(encoding)
+        if compressed is None:
+            compressed = compress(self.body, encoding)
+            self._variants[encoding] = compressed
+        return compressed
+
+    def variant_etag(self, encoding: str) -> str:
+        return f'{self.etag[:-1]}-{encoding}"'
+
+    def compress_all(self):
+        for encoding in self.encodings:
+            self.variant(encoding)
+
+    def etags(self) -> list:
+        return [self.etag] + [self.variant_etag(encoding)
+                              for encoding in self.encodings]
+
+    def size(self) -> int:
+        return (len(self.body)
+                + sum(len(body) for body in self._variants.values())
+                + sum(len(k) + len(v) for k, v in self.headers.items()))
+
+
+class RenderedJSONResponse(Response):
+    """Sends a RenderedResponse (or, with status_code 304, just its
+    validators) in the variant the request's Accept-Encoding prefers,
+    chosen when it's sent, so route handlers needn't look at the header."""
+
+    media_type = "application/json"
+
+    def __init__(self, rendered: RenderedResponse, headers: dict,
+                 status_code: int = 200):
+        self.rendered = rendered
+        super().__init__(content=rendered.body if status_code != 304 else None,
+                         status_code=status_code,
+                         headers={**headers, "ETag": rendered.etag})
+
+    async def __call__(self, scope, receive, send):
+        accept_encoding = None
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = negotiate_encoding(accept_encoding,
+                                      self.rendered.encodings)
+        if encoding is not None:
+            self.headers["ETag"] = self.rendered.variant_etag(encoding)
+            if self.status_code != 304:
+                self.body = self.rendered.variant(encoding)
+                self.headers["Content-Length"] = str(len(self.body))
+                self.headers["Content-Encoding"] = encoding
+        await super().__call__(scope, receive, send)
+
+
+class ResponseCache:
+    """Rendered list/summary responses, keyed by route and normalized
+    request (see generate_key()), so a warm request is answered with the
+    stored bytes instead of being rebuilt, validated and encoded again.
+
+    Each entry carries the version of the data it was rendered from, as
+    reported by the service layer's *_version() functions; get() only
+    returns an entry whose version is still the current one, so nothing
+    here ever needs invalidating. Per process, like the event store."""
+
+    def __init__(self, max_bytes=None):
+        """max_bytes caps the total size of stored bodies; the least
+        recently used are evicted to fit. None means unbounded."""
+        self.max_bytes = max_bytes
+        # Key -> RenderedResponse, least recently used first.
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str, version) -> RenderedResponse | None:
+        """The entry stored for key, if it was rendered from version."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry
+
+    def put(self, key: str, entry: RenderedResponse):
+        """Stores entry with every compressed variant made up front, so
+        its size stays what it's accounted as."""
+        entry.compress_all()
+        size = entry.size()
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += size
+            while self.max_bytes is not None and self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+    @staticmethod
+    def generate_key(route: str, params: dict, fields: str = None) -> str:
+        """params as they select the data (so equivalent requests share an
+        entry) and fields as the set of names it projects to."""
+        return json.dumps([route, params, normalize_fields(fields)],
+                          sort_keys=True, ensure_ascii=False)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size()
@@ -1,12 +1,15 @@
 from typing import List, Literal
 from fastapi import BackgroundTasks, Path, Query, HTTPException, Depends, Header
-from fastapi.responses import RedirectResponse, Response, JSONResponse
+from fastapi.responses import RedirectResponse, Response
 from fastapi_mcp import FastApiMCP
-from . import service
+from . import service, timing
+from .encoder import encode_json, normalize_fields, project
+from .responses import RenderedResponse, RenderedJSONResponse
 from .models import Event, Group
 from .models import GroupActivity, YearSummary, HeatmapBucket, EventsSummary
 from .models import GroupYearlyActivity, GroupSummary, GroupsSummary
 import hmac
+import re
 from datetime import datetime, timedelta, timezone
 from email.utils import format_datetime, parsedate_to_datetime
 
@@ -24,38 +27,39 @@ def docs_redirect():
          operation_id="list_events",
          summary="List recent events")
 async def read_events(
-    response: Response,
     background_tasks: BackgroundTasks,
     keyword: str = None,
     uid: str = None,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
     days = service.config["recent_days"] if "recent_days" in service.config else 90
     now = datetime.now()
     dt_from = now - timedelta(days=days)
     dt_to = now + timedelta(days=days)
-    return await read_events_range(response, background_tasks,
+    return await read_events_range(background_tasks,
                                    dt_from.year, dt_from.month,
                                    dt_to.year, dt_to.month,
-                                   keyword, uid, fields, if_modified_since)
+                                   keyword, uid, fields, if_modified_since,
+                                   if_none_match)
 
 
 @app.get("/events/day/today", response_model=List[Event],
          operation_id="list_events_today",
          summary="List today's events")
 async def read_events_day_today(
-    response: Response,
     background_tasks: BackgroundTasks,
     keyword: str = None,
     uid: str = None,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
     today = datetime.now().date()
-    return await read_events_for_days(response, background_tasks,
+    return await read_events_for_days(background_tasks,
                                       today, 1, keyword, uid, fields,
-                                      if_modified_since)
+                                      if_modified_since, if_none_match)
 
 
 @app.get("/events/today", response_model=List[Event],
@@ -64,68 +68,70 @@ async def read_events_day_today(
          description="Deprecated. Use GET /events/day/today instead.",
          deprecated=True)
 async def read_events_today_legacy(
-    response: Response,
     background_tasks: BackgroundTasks,
     keyword: str = None,
     uid: str = None,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
-    return await read_events_day_today(response, background_tasks,
-                                       keyword, uid, fields, if_modified_since)
+    return await read_events_day_today(background_tasks,
+                                       keyword, uid, fields, if_modified_since,
+                                       if_none_match)
 
 
 @app.get("/events/week/this", response_model=List[Event],
          operation_id="list_events_this_week",
          summary="List this week's events")
 async def read_events_this_week(
-    response: Response,
     background_tasks: BackgroundTasks,
     keyword: str = None,
     uid: str = None,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
     today = datetime.now().date()
     monday = today - timedelta(days=today.weekday())
-    return await read_events_for_days(response, background_tasks,
+    return await read_events_for_days(background_tasks,
                                       monday, 7, keyword, uid, fields,
-                                      if_modified_since)
+                                      if_modified_since, if_none_match)
 
 
 @app.get("/events/week/next", response_model=List[Event],
          operation_id="list_events_next_week",
          summary="List next week's events")
 async def read_events_next_week(
-    response: Response,
     background_tasks: BackgroundTasks,
     keyword: str = None,
     uid: str = None,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
     today = datetime.now().date()
     next_monday = today - timedelta(days=today.weekday()) + timedelta(days=7)
-    return await read_events_for_days(response, background_tasks,
+    return await read_events_for_days(background_tasks,
                                       next_monday, 7, keyword, uid, fields,
-                                      if_modified_since)
+                                      if_modified_since, if_none_match)
 
 
 @app.get("/events/year/{year}", response_model=List[Event],
          operation_id="list_events_by_year",
          summary="List events in a specific year")
 async def read_events_year(
-    response: Response,
     background_tasks: BackgroundTasks,
     year: int = Path(ge=service.MIN_EVENT_YEAR, le=service.MAX_EVENT_YEAR),
     keyword: str = None,
     uid: str = None,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
-    return await read_events_range(response, background_tasks,
+    return await read_events_range(background_tasks,
                                    year, 1, year, 12,
-                                   keyword, uid, fields, if_modified_since)
+                                   keyword, uid, fields, if_modified_since,
+                                   if_none_match)
 
 
 @app.get("/events/in/{year}", response_model=List[Event],
@@ -134,34 +140,36 @@ async def read_events_year(
          description="Deprecated. Use GET /events/year/{year} instead.",
          deprecated=True)
 async def read_events_in_year_legacy(
-    response: Response,
     background_tasks: BackgroundTasks,
     year: int = Path(ge=service.MIN_EVENT_YEAR, le=service.MAX_EVENT_YEAR),
     keyword: str = None,
     uid: str = None,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
-    return await read_events_year(response, background_tasks, year,
-                                  keyword, uid, fields, if_modified_since)
+    return await read_events_year(background_tasks, year,
+                                  keyword, uid, fields, if_modified_since,
+                                  if_none_match)
 
 
 @app.get("/events/month/{year}/{month}", response_model=List[Event],
          operation_id="list_events_by_month",
          summary="List events in a specific year and month")
 async def read_events_month(
-    response: Response,
     background_tasks: BackgroundTasks,
     year: int = Path(ge=service.MIN_EVENT_YEAR, le=service.MAX_EVENT_YEAR),
     month: int = Path(ge=1, le=12),
     keyword: str = None,
     uid: str = None,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
-    return await read_events_range(response, background_tasks,
+    return await read_events_range(background_tasks,
                                    year, month, year, month,
-                                   keyword, uid, fields, if_modified_since)
+                                   keyword, uid, fields, if_modified_since,
+                                   if_none_match)
 
 
 @app.get("/events/in/{year}/{month}", response_model=List[Event],
@@ -170,24 +178,24 @@ async def read_events_month(
          description="Deprecated. Use GET /events/month/{year}/{month} instead.",
          deprecated=True)
 async def read_events_in_year_month_legacy(
-    response: Response,
     background_tasks: BackgroundTasks,
     year: int = Path(ge=service.MIN_EVENT_YEAR, le=service.MAX_EVENT_YEAR),
     month: int = Path(ge=1, le=12),
     keyword: str = None,
     uid: str = None,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
-    return await read_events_month(response, background_tasks, year, month,
-                                   keyword, uid, fields, if_modified_since)
+    return await read_events_month(background_tasks, year, month,
+                                   keyword, uid, fields, if_modified_since,
+                                   if_none_match)
 
 
 @app.get("/events/day/{year}/{month}/{day}", response_model=List[Event],
          operation_id="list_events_by_day",
          summary="List events on a specific day")
 async def read_events_day(
-    response: Response,
     background_tasks: BackgroundTasks,
     year: int = Path(ge=service.MIN_EVENT_YEAR, le=service.MAX_EVENT_YEAR),
     month: int = Path(ge=1, le=12),
@@ -195,14 +203,13 @@ async def read_events_day(
     keyword: str = None,
     uid: str = None,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
     ymd = [f"{year:04}{month:02}{day:02}"]
-    events, last_modified = service.get_events(
-        {"ymd": ymd, "keyword": keyword, "uid": uid}, background_tasks)
-
-    return build_list_response(response, events, Event, last_modified,
-                               fields, if_modified_since)
+    return await respond_with_events({"ymd": ymd, "keyword": keyword, "uid": uid},
+                                     background_tasks, fields,
+                                     if_modified_since, if_none_match)
 
 
 @app.get("/events/in/{year}/{month}/{day}", response_model=List[Event],
@@ -211,7 +218,6 @@ async def read_events_day(
          description="Deprecated. Use GET /events/day/{year}/{month}/{day} instead.",
          deprecated=True)
 async def read_events_in_year_month_day_legacy(
-    response: Response,
     background_tasks: BackgroundTasks,
     year: int = Path(ge=service.MIN_EVENT_YEAR, le=service.MAX_EVENT_YEAR),
     month: int = Path(ge=1, le=12),
@@ -219,10 +225,12 @@ async def read_events_in_year_month_day_legacy(
     keyword: str = None,
     uid: str = None,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
-    return await read_events_day(response, background_tasks, year, month, day,
-                                 keyword, uid, fields, if_modified_since)
+    return await read_events_day(background_tasks, year, month, day,
+                                 keyword, uid, fields, if_modified_since,
+                                 if_none_match)
 
 
 @app.get("/events/range/from/{from_year}/{from_month}/to/{to_year}/{to_month}",
@@ -230,7 +238,6 @@ async def read_events_in_year_month_day_legacy(
          operation_id="list_events_by_range",
          summary="List events within a date range")
 async def read_events_range(
-    response: Response,
     background_tasks: BackgroundTasks,
     from_year: int = Path(ge=service.MIN_EVENT_YEAR, le=service.MAX_EVENT_YEAR),
     from_month: int = Path(ge=1, le=12),
@@ -239,18 +246,16 @@ async def read_events_range(
     keyword: str = None,
     uid: str = None,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
     if from_year > to_year or (from_year == to_year and from_month > to_month):
         raise HTTPException(status_code=400, detail="Invalid date range")
 
     ym = year_month_range(from_year, from_month, to_year, to_month)
-
-    events, last_modified = service.get_events(
-        {"ym": ym, "keyword": keyword, "uid": uid}, background_tasks)
-
-    return build_list_response(response, events, Event, last_modified,
-                               fields, if_modified_since)
+    return await respond_with_events({"ym": ym, "keyword": keyword, "uid": uid},
+                                     background_tasks, fields,
+                                     if_modified_since, if_none_match)
 
 
 @app.get("/events/from/{from_year}/{from_month}/to/{to_year}/{to_month}",
@@ -262,7 +267,6 @@ async def read_events_range(
                      "instead.",
          deprecated=True)
 async def read_events_fromto_year_month_legacy(
-    response: Response,
     background_tasks: BackgroundTasks,
     from_year: int = Path(ge=service.MIN_EVENT_YEAR, le=service.MAX_EVENT_YEAR),
     from_month: int = Path(ge=1, le=12),
@@ -271,11 +275,13 @@ async def read_events_fromto_year_month_legacy(
     keyword: str = None,
     uid: str = None,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
-    return await read_events_range(response, background_tasks,
+    return await read_events_range(background_tasks,
                                    from_year, from_month, to_year, to_month,
-                                   keyword, uid, fields, if_modified_since)
+                                   keyword, uid, fields, if_modified_since,
+                                   if_none_match)
 
 
 def year_month_range(from_year: int, from_month: int,
@@ -295,21 +301,43 @@ def year_month_range(from_year: int, from_month: int,
 
 
 async def read_events_for_days(
-    response: Response,
     background_tasks: BackgroundTasks,
     base_date,
     days: int,
     keyword: str = None,
     uid: str = None,
     fields: str = None,
-    if_modified_since: str = None
+    if_modified_since: str = None,
+    if_none_match: str = None
 ):
     ymd = [(base_date + timedelta(days=i)).strftime("%Y%m%d") for i in range(days)]
-    events, last_modified = service.get_events(
-        {"ymd": ymd, "keyword": keyword, "uid": uid}, background_tasks)
-
-    return build_list_response(response, events, Event, last_modified,
-                               fields, if_modified_since)
+    return await respond_with_events({"ymd": ymd, "keyword": keyword, "uid": uid},
+                                     background_tasks, fields,
+                                     if_modified_since, if_none_match)
+
+
+async def respond_with_events(params: dict,
+                              background_tasks: BackgroundTasks,
+                              fields: str = None,
+                              if_modified_since: str = None,
+                              if_none_match: str = None) -> Response:
+    """The response listing get_events(params), from the stored rendering
+    while it's current (see respond_from_version())."""
+    key = service.responses.generate_key(
+        "events", service.normalize_event_params(params), fields)
+    version = await service.service_executor.run(
+        service.get_events_version, params, background_tasks)
+    cached = respond_from_version(key, version, if_modified_since,
+                                  if_none_match)
+    if cached is not None:
+        return cached
+
+    events, last_modified = await service.service_executor.run(
+        service.get_events, params, background_tasks)
+
+    return build_list_response(events, Event, last_modified,
+                               fields, if_modified_since, if_none_match,
+                               key=key, version=version)
 
 
 def format_last_modified(last_modified: datetime) -> str:
@@ -334,34 +362,129 @@ def is_not_modified(if_modified_since: str, last_modified) -> bool:
     return last_modified.replace(microsecond=0) <= since
 
 
+def is_etag_matched(if_none_match: str, etags) -> bool:
+    """Weak comparison, as If-None-Match calls for: a W/ prefix is
+    ignored, and "*" matches any current representation. etags are those
+    of every variant of the same content (see RenderedResponse), any of
+    which the client may hold."""
+    if if_none_match is None or not etags:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    requested = {tag.strip().removeprefix("W/")
+                 for tag in if_none_match.split(",")}
+    return any(etag in requested for etag in etags)
+
+
+def is_unchanged_since(if_modified_since: str, if_none_match: str,
+                       last_modified) -> bool:
+    """is_not_modified(), unless the request has If-None-Match: that then
+    decides alone, and needs the ETag of the rendered response."""
+    return if_none_match is None and \
+        is_not_modified(if_modified_since, last_modified)
+
+
 def filter_model_fields(items, model, fields: str = None):
     """Return items pruned to the requested comma-separated field names,
     or None if no filtering should be applied (fields is absent/empty).
-    model must provide a to_json() static method, e.g. Event or Group."""
-    if fields is None:
+    model is the items' dataclass, e.g. Event or Group."""
+    field_names = normalize_fields(fields)
+    if field_names is None:
         return None
+    return project(items, model, field_names)
 
-    field_names = {f.strip() for f in fields.split(",") if f.strip()}
-    if not field_names:
+
+def list_headers(last_modified) -> dict:
+    # Vary even where nothing is compressed, since a response of the same
+    # URL may be (see RenderedJSONResponse).
+    headers = {"Cache-Control": LIST_CACHE_CONTROL,
+               "Vary": "Accept-Encoding"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_last_modified(last_modified)
+    return headers
+
+
+def not_modified_response(last_modified,
+                          rendered: RenderedResponse = None) -> Response:
+    """304, with rendered's ETag (of the variant the client would get) if
+    the rendering is at hand."""
+    if rendered is not None:
+        return RenderedJSONResponse(rendered, list_headers(last_modified),
+                                    status_code=304)
+    return Response(status_code=304, headers=list_headers(last_modified))
+
+
+def respond_from_version(key: str, version: dict | None,
+                         if_modified_since: str = None,
+                         if_none_match: str = None,
+                         stored_only: bool = False) -> Response | None:
+    """Answer without reading the data, given its version (from one of the
+    service layer's *_version() functions): 304 from its last_modified
+    alone, or 200 (or a 304 for If-None-Match) from the rendering stored
+    under key if it was made from that same version. None if the data has
+    to be read after all.
+
+    stored_only also leaves the 304 to the data path unless a rendering
+    is stored, for routes that 404 depending on the data (only a found
+    one is ever stored)."""
+    if version is None:
         return None
 
-    return [{k: v for k, v in d.items() if k in field_names}
-            for d in model.to_json(items)]
+    rendered = service.responses.get(key, version["version"])
+    if rendered is None and (stored_only or if_none_match is not None):
+        return None
 
+    if is_unchanged_since(if_modified_since, if_none_match,
+                          version["last_modified"]):
+        return not_modified_response(version["last_modified"], rendered)
 
-def build_list_response(response: Response, items, model, last_modified,
+    if rendered is None:
+        return None
+    timing.count("response-hit")
+    return rendered_response(rendered, if_none_match)
+
+
+def rendered_response(rendered: RenderedResponse,
+                      if_none_match: str = None) -> Response:
+    if is_etag_matched(if_none_match, rendered.etags()):
+        return not_modified_response(rendered.last_modified, rendered)
+    headers = list_headers(rendered.last_modified)
+    headers.update(rendered.headers)
+    return RenderedJSONResponse(rendered, headers)
+
+
+def respond_rendered(content, response_type, last_modified,
+                     key: str = None, version: dict = None,
+                     headers: dict = None,
+                     if_none_match: str = None) -> Response:
+    """Render content and, if the version of the data it was built from
+    was known before reading it, store it under key for
+    respond_from_version(). A version read only afterwards could already
+    belong to newer data than content, so none is stored then."""
+    # From here on it's only encoding; see timing.ServerTimingMiddleware.
+    timing.mark("respond")
+    rendered = RenderedResponse(encode_json(content, response_type),
+                                version["version"] if version else None,
+                                last_modified, headers,
+                                compress_min_bytes=service.compress_min_bytes)
+    if key is not None and version is not None:
+        service.responses.put(key, rendered)
+    return rendered_response(rendered, if_none_match)
+
+
+def build_list_response(items, model, last_modified,
                         fields: str = None, if_modified_since: str = None,
+                        if_none_match: str = None,
                         total: int = None, page: int = None,
-                        per_page: int = None):
+                        per_page: int = None,
+                        key: str = None, version: dict = None) -> Response:
     """items must already be the exact page to return; this only adds
-    the X-Total-* headers, it doesn't slice anything itself."""
-    headers = {"Cache-Control": LIST_CACHE_CONTROL}
-    if last_modified is not None:
-        headers["Last-Modified"] = format_last_modified(last_modified)
-
-    if is_not_modified(if_modified_since, last_modified):
-        return Response(status_code=304, headers=headers)
+    the X-Total-* headers, it doesn't slice anything itself. key and
+    version as for respond_rendered()."""
+    if is_unchanged_since(if_modified_since, if_none_match, last_modified):
+        return not_modified_response(last_modified)
 
+    headers = {}
     if total is not None and page is not None and per_page is not None:
         total_pages = (total + per_page - 1) // per_page if total > 0 else 0
         headers["X-Total-Count"] = str(total)
@@ -369,70 +492,80 @@ def build_list_response(response: Response, items, model, last_modified,
         headers["X-Per-Page"] = str(per_page)
         headers["X-Total-Pages"] = str(total_pages)
 
-    filtered = filter_model_fields(items, model, fields)
+    with timing.measure("fields"):
+        filtered = filter_model_fields(items, model, fields)
     if filtered is None:
-        for key, value in headers.items():
-            response.headers[key] = value
-        return items
-
-    # Returning a JSONResponse here deliberately bypasses response_model
-    # validation/serialization, since the shape is a client-chosen subset
-    # of the model's fields rather than the full declared schema.
-    return JSONResponse(content=filtered, headers=headers)
+        return respond_rendered(items, List[model], last_modified,
+                                key, version, headers, if_none_match)
+    return respond_rendered(filtered, None, last_modified,
+                            key, version, headers, if_none_match)
 
 
 @app.get("/groups", response_model=List[Group],
          operation_id="list_groups",
          summary="List community groups")
 async def read_groups(
-    response: Response,
     background_tasks: BackgroundTasks,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
-    groups, last_modified = service.get_groups({}, background_tasks)
+    key = service.responses.generate_key("groups", {}, fields)
+    version = await service.service_executor.run(
+        service.get_groups_version, {}, background_tasks)
+    cached = respond_from_version(key, version, if_modified_since,
+                                  if_none_match)
+    if cached is not None:
+        return cached
 
-    return build_list_response(response, groups, Group, last_modified,
-                               fields, if_modified_since)
+    groups, last_modified = await service.get_groups_async(
+        {}, background_tasks)
+
+    return build_list_response(groups, Group, last_modified,
+                               fields, if_modified_since, if_none_match,
+                               key=key, version=version)
 
 
 @app.get("/groups/{group_key}", response_model=Group,
          operation_id="get_group",
          summary="Get a single community group")
 async def read_group(
-    response: Response,
     background_tasks: BackgroundTasks,
     group_key: str,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
-    groups, last_modified = service.get_groups({}, background_tasks)
+    key = service.responses.generate_key("group", {"key": group_key}, fields)
+    version = await service.service_executor.run(
+        service.get_groups_version, {}, background_tasks)
+    cached = respond_from_version(key, version, if_modified_since,
+                                  if_none_match, stored_only=True)
+    if cached is not None:
+        return cached
+
+    groups, last_modified = await service.get_groups_async(
+        {}, background_tasks)
     group = next((g for g in groups if g.key == group_key), None)
     if group is None:
         raise HTTPException(status_code=404,
                             detail=f"Group '{group_key}' not found")
 
-    headers = {"Cache-Control": LIST_CACHE_CONTROL}
-    if last_modified is not None:
-        headers["Last-Modified"] = format_last_modified(last_modified)
-
-    if is_not_modified(if_modified_since, last_modified):
-        return Response(status_code=304, headers=headers)
+    if is_unchanged_since(if_modified_since, if_none_match, last_modified):
+        return not_modified_response(last_modified)
 
     filtered = filter_model_fields([group], Group, fields)
     if filtered is None:
-        for key, value in headers.items():
-            response.headers[key] = value
-        return group
-
-    return JSONResponse(content=filtered[0], headers=headers)
+        return respond_rendered(group, Group, last_modified, key, version,
+                                if_none_match=if_none_match)
+    return respond_rendered(filtered[0], None, last_modified, key, version,
+                            if_none_match=if_none_match)
 
 
 @app.get("/groups/{group_key}/events", response_model=List[Event],
          operation_id="list_group_events",
          summary="List events for a specific group")
 async def read_group_events(
-    response: Response,
     background_tasks: BackgroundTasks,
     group_key: str,
     keyword: str = None,
@@ -441,42 +574,61 @@ async def read_group_events(
     page: int = Query(1, ge=1),
     per_page: int = Query(50, ge=1, le=200),
     order: Literal["asc", "desc"] = "desc",
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
     source = service.find_group_source(group_key)
     if source is None:
         raise HTTPException(status_code=404,
                             detail=f"Group '{group_key}' not found")
 
+    key = service.responses.generate_key(
+        "group_events", {"group_key": group_key, "keyword": keyword,
+                         "uid": uid, "page": page, "per_page": per_page,
+                         "order": order}, fields)
+    version = await service.service_executor.run(
+        service.get_group_events_version, group_key, keyword, uid,
+        background_tasks, source=source)
+    cached = respond_from_version(key, version, if_modified_since,
+                                  if_none_match)
+    if cached is not None:
+        return cached
+
     # No date scope here (unlike /events/*), so this targets the group's
     # full history, paginated (default 50/page, order defaults to "desc").
-    events, total, last_modified = service.get_group_events_page(
+    events, total, last_modified = await service.get_group_events_page_async(
         group_key, keyword, uid, page, per_page, order, background_tasks,
         source=source)
 
-    return build_list_response(response, events, Event, last_modified,
-                               fields, if_modified_since,
-                               total=total, page=page, per_page=per_page)
+    return build_list_response(events, Event, last_modified,
+                               fields, if_modified_since, if_none_match,
+                               total=total, page=page, per_page=per_page,
+                               key=key, version=version)
 
 
 @app.get("/summary/events", response_model=EventsSummary,
          operation_id="summary_events",
          summary="Get yearly event summary with group highlights and activity heatmap")
 async def read_events_summary(
-    response: Response,
     background_tasks: BackgroundTasks,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
+    key = service.responses.generate_key("summary_events", {})
+    version = await service.service_executor.run(
+        service.get_full_history_version, background_tasks)
+    cached = respond_from_version(key, version, if_modified_since,
+                                  if_none_match)
+    if cached is not None:
+        return cached
+
     events, groups, from_year, to_year, last_modified = \
-        service.get_full_history(background_tasks)
+        await service.service_executor.run(service.get_full_history,
+                                           background_tasks)
     group_by_key = {g.key: g for g in groups}
 
-    headers = {"Cache-Control": LIST_CACHE_CONTROL}
-    if last_modified is not None:
-        headers["Last-Modified"] = format_last_modified(last_modified)
-
-    if is_not_modified(if_modified_since, last_modified):
-        return Response(status_code=304, headers=headers)
+    if is_unchanged_since(if_modified_since, if_none_match, last_modified):
+        return not_modified_response(last_modified)
 
     year_stats = {
         y: {"event_count": 0, "group_counts": {}}
@@ -524,9 +676,8 @@ async def read_events_summary(
     summary = EventsSummary(from_year=from_year, to_year=to_year,
                             granularity="month", years=years, heatmap=heatmap)
 
-    for key, value in headers.items():
-        response.headers[key] = value
-    return summary
+    return respond_rendered(summary, EventsSummary, last_modified,
+                            key, version, if_none_match=if_none_match)
 
 
 @app.get("/events/summary", response_model=EventsSummary,
@@ -535,11 +686,12 @@ async def read_events_summary(
          description="Deprecated. Use GET /summary/events instead.",
          deprecated=True)
 async def read_events_summary_legacy(
-    response: Response,
     background_tasks: BackgroundTasks,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
-    return await read_events_summary(response, background_tasks, if_modified_since)
+    return await read_events_summary(background_tasks, if_modified_since,
+                                     if_none_match)
 
 
 def build_year_counts_by_group(events: List) -> dict:
@@ -579,20 +731,25 @@ def build_group_summary(group: Group, events: List, to_year: int) -> GroupSummar
          operation_id="summary_groups",
          summary="Get per-group activity summary (start year and yearly event counts)")
 async def read_groups_summary(
-    response: Response,
     background_tasks: BackgroundTasks,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
-    events, groups, from_year, to_year, last_modified = \
-        service.get_full_history(background_tasks)
+    key = service.responses.generate_key("summary_groups", {}, fields)
+    version = await service.service_executor.run(
+        service.get_full_history_version, background_tasks)
+    cached = respond_from_version(key, version, if_modified_since,
+                                  if_none_match)
+    if cached is not None:
+        return cached
 
-    headers = {"Cache-Control": LIST_CACHE_CONTROL}
-    if last_modified is not None:
-        headers["Last-Modified"] = format_last_modified(last_modified)
+    events, groups, from_year, to_year, last_modified = \
+        await service.service_executor.run(service.get_full_history,
+                                           background_tasks)
 
-    if is_not_modified(if_modified_since, last_modified):
-        return Response(status_code=304, headers=headers)
+    if is_unchanged_since(if_modified_since, if_none_match, last_modified):
+        return not_modified_response(last_modified)
 
     counts_by_group = build_year_counts_by_group(events)
     group_summaries = [
@@ -604,53 +761,60 @@ async def read_groups_summary(
 
     filtered = filter_model_fields(group_summaries, GroupSummary, fields)
     if filtered is None:
-        for key, value in headers.items():
-            response.headers[key] = value
-        return GroupsSummary(from_year=from_year, to_year=to_year, groups=group_summaries)
+        return respond_rendered(
+            GroupsSummary(from_year=from_year, to_year=to_year,
+                          groups=group_summaries),
+            GroupsSummary, last_modified, key, version,
+            if_none_match=if_none_match)
 
-    return JSONResponse(
-        content={"from_year": from_year, "to_year": to_year, "groups": filtered},
-        headers=headers)
+    return respond_rendered(
+        {"from_year": from_year, "to_year": to_year, "groups": filtered},
+        None, last_modified, key, version, if_none_match=if_none_match)
 
 
 @app.get("/summary/groups/{group_key}", response_model=GroupSummary,
          operation_id="summary_group",
          summary="Get a single group's activity summary (start year and yearly event counts)")
 async def read_group_summary(
-    response: Response,
     background_tasks: BackgroundTasks,
     group_key: str,
     fields: str = None,
-    if_modified_since: str = Header(None)
+    if_modified_since: str = Header(None),
+    if_none_match: str = Header(None)
 ):
+    key = service.responses.generate_key("summary_group", {"key": group_key},
+                                         fields)
+    version = await service.service_executor.run(
+        service.get_full_history_version, background_tasks)
+    cached = respond_from_version(key, version, if_modified_since,
+                                  if_none_match, stored_only=True)
+    if cached is not None:
+        return cached
+
     events, groups, from_year, to_year, last_modified = \
-        service.get_full_history(background_tasks)
+        await service.service_executor.run(service.get_full_history,
+                                           background_tasks)
 
     group = next((g for g in groups if g.key == group_key), None)
     if group is None:
         raise HTTPException(status_code=404,
                             detail=f"Group '{group_key}' not found")
 
-    headers = {"Cache-Control": LIST_CACHE_CONTROL}
-    if last_modified is not None:
-        headers["Last-Modified"] = format_last_modified(last_modified)
-
-    if is_not_modified(if_modified_since, last_modified):
-        return Response(status_code=304, headers=headers)
+    if is_unchanged_since(if_modified_since, if_none_match, last_modified):
+        return not_modified_response(last_modified)
 
     group_summary = build_group_summary(group, events, to_year)
 
     filtered = filter_model_fields([group_summary], GroupSummary, fields)
     if filtered is None:
-        for key, value in headers.items():
-            response.headers[key] = value
-        return group_summary
-
-    return JSONResponse(content=filtered[0], headers=headers)
+        return respond_rendered(group_summary, GroupSummary, last_modified,
+                                key, version, if_none_match=if_none_match)
+    return respond_rendered(filtered[0], None, last_modified, key, version,
+                            if_none_match=if_none_match)
 
 
 def verify_refresh_token(x_refresh_token: str = Header(None)):
-    """Auth guard for POST /events/refresh. Fails closed (503) if no secret
+    """Auth guard for POST /events/refresh and /events/invalidate. Fails closed (503) if no secret
     is configured, so the endpoint can never be reached by matching an empty
     token, and uses a constant-time comparison to avoid timing attacks."""
     if not service.events_refresh_token:
@@ -664,13 +828,21 @@ def verify_refresh_token(x_refresh_token: str = Header(None)):
 
 
 def try_acquire_refresh_lock() -> bool:
-    """Process-local minimum-interval lock, acquired before the upstream
-    fetch so concurrent calls within the window are also rejected."""
+    """Minimum-interval lock, acquired before the upstream fetch so
+    concurrent calls within the window are also rejected. Shared across
+    workers when the cache is (see RedisEventRequestCache)."""
     lock_key = "events-refresh-lock"
-    if service.cache.get(lock_key) is not None:
-        return False
-    service.cache.set(lock_key, "1", ex=service.events_refresh_min_interval)
-    return True
+    return service.cache.add(lock_key, "1",
+                             ex=service.events_refresh_min_interval)
+
+
+def refresh_recent_events(params: dict):
+    units = service.get_store_units(params)
+    service.store_requested_units(units,
+                                  ex=3600*72,  # 72 hours, matches GET /events' store TTL
+                                  deadline=service.upstream_deadline,
+                                  force_refresh=True)
+    return service.store.query(units)
 
 
 @app.post("/events/refresh", response_model=List[Event],
@@ -693,10 +865,8 @@ async def refresh_events(
 
     params = service.normalize_event_params(
         {"ym": ym, "keyword": None, "uid": None})
-    events, last_modified = service.request_events(params, force_refresh=True)
-
-    service.cache.set(params, Event.to_json(events), last_modified=last_modified,
-                      ex=3600*72)  # 72 hours, matches GET /events' outer cache TTL
+    events, last_modified = await service.service_executor.run(
+        refresh_recent_events, params)
 
     response.headers["Cache-Control"] = "no-store"
     if last_modified is not None:
@@ -704,6 +874,30 @@ async def refresh_events(
     return events
 
 
+@app.post("/events/invalidate",
+          operation_id="invalidate_events",
+          summary="Make closed months be fetched again",
+          include_in_schema=False)
+async def invalidate_events(
+    response: Response,
+    ym: List[str] = Query(...),
+    _: None = Depends(verify_refresh_token)
+):
+    """For months (YYYYMM) changed upstream long after they closed, which
+    would otherwise be served as cached for weeks; see
+    service.invalidate_months()."""
+    months = list(dict.fromkeys(ym))
+    for month in months:
+        if not re.fullmatch(r"\d{4}(0[1-9]|1[0-2])", month):
+            raise HTTPException(status_code=400,
+                                detail=f"Invalid month '{month}'")
+
+    await service.service_executor.run(service.invalidate_months, months)
+
+    response.headers["Cache-Control"] = "no-store"
+    return {"invalidated": months}
+
+
 mcp = FastApiMCP(app, include_operations=[
     "list_events",
     "list_events_today",
@@ -1,13 +1,29 @@
 from typing import List, Optional, Tuple
 from fastapi import BackgroundTasks, HTTPException
 from .providers.connpass import ConnpassEventRequest, ConnpassGroupRequest, ConnpassException
-from .providers.icalendar import IcalEventRequest, IcalException
-from .providers.archive import ArchiveIndexRequest, ArchiveException
+from .providers.connpass import AsyncConnpassEventRequest, AsyncConnpassGroupRequest
+from .providers.connpass import request_limiter
+from .providers.icalendar import IcalEventRequest, AsyncIcalEventRequest, IcalException
+from .providers.archive import ArchiveIndexRequest, AsyncArchiveIndexRequest
+from .providers.archive import ArchiveException
+from . import timing
 from .models import Event, Group
 from .cache import EventRequestCache
+from .redis_cache import RedisEventRequestCache
+from .sqlite_cache import SqliteEventRequestCache
 from .keywords import KeywordExtractor
+from .refresh import RefreshAheadScheduler
+from .responses import ResponseCache
+from .fanout import FanOutExecutor, FanOutTimeout
+from .offload import ServiceExecutor
+from .ratelimit import background_priority
+from .singleflight import SingleFlight
+from .store import EventStore
+from .shards import MonthShardedRequest, MonthTtlPolicy
+import asyncio
 import dataclasses
 import os
+import uuid
 from datetime import datetime, timezone
 import yaml
 from dotenv import load_dotenv
@@ -21,7 +37,10 @@ MIN_EVENT_YEAR = 2010
 # Generous sanity ceiling for year path params; no real-world meaning.
 MAX_EVENT_YEAR = 2040
 
-cache = EventRequestCache()
+# Coalesces concurrent get_events()/get_groups() fetches of one cache key.
+inflight = SingleFlight()
+# Backs every date-windowed get_events(); see get_events_from_store().
+store = EventStore()
 keyword_extractor = KeywordExtractor()
 
 _archive_group_keys = None  # see get_archive_group_keys()
@@ -29,6 +48,66 @@ _archive_group_keys = None  # see get_archive_group_keys()
 with open(config_file, "r", encoding="utf-8") as yml:
     config = yaml.safe_load(yml)
 
+cache_config = config.get("cache") or {}
+cache_max_megabytes = cache_config.get("max_megabytes", 256)
+cache_max_bytes = cache_max_megabytes * 1024 * 1024 \
+    if cache_max_megabytes is not None else None
+cache_redis_url = os.getenv("CACHE_REDIS_URL")
+cache_sqlite_path = os.getenv("CACHE_SQLITE_PATH")
+if cache_redis_url:
+    # Shared by every worker/container; see RedisEventRequestCache.
+    cache = RedisEventRequestCache.from_url(cache_redis_url)
+elif cache_sqlite_path:
+    # Survives restarts; see SqliteEventRequestCache.
+    cache = SqliteEventRequestCache(cache_sqlite_path,
+                                    max_bytes=cache_max_bytes)
+else:
+    cache = EventRequestCache(max_bytes=cache_max_bytes)
+cache_sweep_interval = cache_config.get("sweep_interval_seconds", 600)
+# Rendered responses, checked against the *_version() functions below;
+# see ResponseCache.
+response_max_megabytes = cache_config.get("response_max_megabytes", 32)
+responses = ResponseCache(
+    max_bytes=response_max_megabytes * 1024 * 1024
+    if response_max_megabytes is not None else None)
+closed_months_config = cache_config.get("closed_months") or {}
+month_ttl_policy = MonthTtlPolicy(
+    closed_after_months=closed_months_config.get("after_months", 2),
+    closed_ttl=closed_months_config.get("ttl_seconds", 3600*24*30))
+refresh_ahead_config = cache_config.get("refresh_ahead") or {}
+refresh_scheduler = RefreshAheadScheduler(
+    window_ratio=refresh_ahead_config.get("window_ratio", 0.1),
+    early_expiration=refresh_ahead_config.get("early_expiration", True),
+    claim_ttl=refresh_ahead_config.get("claim_ttl_seconds", 60))
+
+upstream_config = config.get("upstream") or {}
+fanout = FanOutExecutor(max_workers=upstream_config.get("max_workers", 8))
+# Bounds a foreground fetch; background refreshes run without one.
+upstream_deadline = upstream_config.get("deadline_seconds", 25)
+# Cache month lists per (source, month); see MonthShardedRequest.
+upstream_month_shards = upstream_config.get("month_shards", True)
+# Keep connpass shards up to date by update time; see MonthShardedRequest.
+incremental_sync_config = upstream_config.get("incremental_sync") or {}
+upstream_incremental_sync = incremental_sync_config.get("enabled", True)
+incremental_sync_max_pages = incremental_sync_config.get("max_pages", 2)
+incremental_sync_retention = incremental_sync_config.get(
+    "retention_seconds", 3600*24*3)
+# Shared by every connpass request; see TokenBucketLimiter.
+connpass_rate_config = upstream_config.get("connpass_rate") or {}
+request_limiter.configure(
+    rate=connpass_rate_config.get("requests_per_second", 1.0),
+    burst=connpass_rate_config.get("burst", 1))
+
+server_config = config.get("server") or {}
+# See timing.ServerTimingMiddleware, added in main.py when enabled.
+server_timing_enabled = server_config.get("server_timing", False)
+# Rendered responses at least this large are also stored compressed; see
+# RenderedResponse.
+compress_min_bytes = server_config.get("compress_min_bytes", 1024)
+# Route handlers await the sync functions below through this.
+service_executor = ServiceExecutor(
+    max_threads=server_config.get("service_threads", 16))
+
 connpass_api_key = os.getenv("CONNPASS_API_KEY")
 events_refresh_token = os.getenv("EVENTS_REFRESH_TOKEN")
 try:
@@ -72,48 +151,261 @@ def get_events(params,
 
     params = normalize_event_params(params)
 
+    if is_store_query(params):
+        return get_events_from_store(params, background_tasks, ex, cache_ttl)
+
+    params = with_history_generation(params)
     events, last_modified = get_events_from_cache(cache, params)
 
     if events is None:
-        events, last_modified = request_events(params, cache_ttl=cache_ttl)
+        events, last_modified = inflight.do(
+            cache.generate_key(params), load_events, params, ex, cache_ttl)
 
-    if background_tasks is not None:
-        background_tasks.add_task(fetch_events, params, ex, cache_ttl)
+    else:
+        schedule_events_refresh(background_tasks, params, ex, cache_ttl)
 
     return events, last_modified
 
 
+def get_events_version(params,
+                       background_tasks: BackgroundTasks = None,
+                       ex: int = 3600*72,
+                       cache_ttl: int = None) -> Optional[dict]:
+    """The "version" and "last_modified" of what get_events() would
+    return for params (see EventRequestCache.get_version()), without
+    collecting the events; None if get_events() would have to load them
+    first. Schedules the same refresh-ahead as get_events(), so requests
+    answered from this alone (a 304, or a stored response) still keep the
+    events fresh."""
+    global cache, store
+
+    params = normalize_event_params(params)
+
+    if is_store_query(params):
+        units = get_store_units(params)
+        version = store.get_version(units)
+        if version is not None:
+            schedule_store_refresh(background_tasks, units, ex, cache_ttl)
+        return version
+
+    params = with_history_generation(params)
+    version = cache.get_version(params)
+    if version is not None:
+        schedule_events_refresh(background_tasks, params, ex, cache_ttl)
+    return version
+
+
+def schedule_events_refresh(background_tasks: BackgroundTasks, params,
+                            ex: int, cache_ttl: int = None):
+    if background_tasks is None:
+        return
+    refresh_interval = cache_ttl if cache_ttl is not None else 3600
+    schedule_refresh(background_tasks, params, ex, refresh_interval,
+                     fetch_events, params, ex, cache_ttl)
+
+
+def is_store_query(params) -> bool:
+    """Whether get_events() answers params from the store: a plain date
+    window (ym or ymd) over the configured scope. Group and full-history
+    queries fetch different event sets and keep their own cache entries."""
+    return (params.get("group_key") is None
+            and params.get("include_prefecture", True)
+            and bool(params.get("ym") or params.get("ymd")))
+
+
+def get_store_units(params) -> List[str]:
+    return list(params.get("ym") or []) + list(params.get("ymd") or [])
+
+
+def get_events_from_store(params,
+                          background_tasks: BackgroundTasks = None,
+                          ex: int = 3600*72,
+                          cache_ttl: int = None
+                          ) -> Tuple[List[Event], datetime]:
+    """get_events() for a date window: any units not loaded yet are
+    fetched (once, however many callers are waiting on them), and the
+    window is then answered from the store, with keyword and uid applied
+    there rather than being part of what's fetched."""
+    global store
+
+    units = get_store_units(params)
+    missing = store.missing(units)
+    if missing:
+        inflight.do("store:" + ",".join(missing), load_store_units,
+                    missing, ex, cache_ttl)
+
+    else:
+        schedule_store_refresh(background_tasks, units, ex, cache_ttl)
+
+    return store.query(units, keyword=params.get("keyword"),
+                       uid=params.get("uid"))
+
+
+def schedule_store_refresh(background_tasks: BackgroundTasks, units,
+                           ex: int, cache_ttl: int = None):
+    """Queue a refetch of the loaded units covering units that are due
+    per refresh_scheduler."""
+    global store
+
+    if background_tasks is None:
+        return
+    refresh_interval = cache_ttl if cache_ttl is not None else 3600
+    due = [unit for unit in store.covering(units)
+           if refresh_scheduler.should_refresh(store.ttl(unit), ex,
+                                               refresh_interval)
+           and refresh_scheduler.try_begin("store:" + unit)]
+    if due:
+        background_tasks.add_task(fetch_store_units, due, ex, cache_ttl)
+
+
+def load_store_units(units, ex: int, cache_ttl: int = None):
+    """Cache miss path of get_events_from_store(), run once per set of
+    units by inflight; like load_events(), rechecks what's missing first."""
+    global store
+
+    missing = store.missing(units)
+    if missing:
+        store_requested_units(missing, ex, cache_ttl, upstream_deadline)
+
+
+def store_requested_units(units, ex: int, cache_ttl: int = None,
+                          deadline: float = None,
+                          force_refresh: bool = False):
+    """Fetch units (months and/or days) from every source and load them
+    into the store."""
+    global store
+
+    months = [unit for unit in units if len(unit) == 6]
+    days = [unit for unit in units if len(unit) == 8]
+    for name, values in (("ym", months), ("ymd", days)):
+        if not values:
+            continue
+        events, last_modified = request_events(
+            {name: values, "keyword": None, "uid": None},
+            cache_ttl=cache_ttl, force_refresh=force_refresh,
+            deadline=deadline)
+        store.load(values, events, last_modified=last_modified, ex=ex)
+
+
+# Part of the cache key of every get_events() entry the store doesn't
+# answer (the full history, group events), so that invalidate_months() can
+# retire them all at once. Pinned: evicting it would bring back the
+# entries of an older generation.
+HISTORY_GENERATION_KEY = "history-generation"
+
+
+def with_history_generation(params):
+    """params as keyed in the cache: tagged with the generation
+    invalidate_months() last started, if it ever has."""
+    global cache
+
+    response = cache.get(HISTORY_GENERATION_KEY)
+    if response is None:
+        return params
+    return {**params, "history_generation": response["content"]}
+
+
+def invalidate_months(months):
+    """Explicit invalidation hook for when months known to be closed have
+    changed upstream after all (e.g. an event was corrected long after
+    the fact): every source refetches them on their next request, the
+    store reloads them instead of answering from what it holds, and the
+    full history and group event lists are fetched again rather than
+    served from entries that still hold the old events. Exposed as POST
+    /events/invalidate."""
+    global cache, store
+
+    MonthShardedRequest.invalidate(cache, months)
+    store.invalidate(months)
+    cache.set(HISTORY_GENERATION_KEY, uuid.uuid4().hex, ex=None)
+
+
+def fetch_store_units(units, ex: int = 3600*72, cache_ttl: int = None):
+    try:
+        with background_priority():
+            inflight.do("store:" + ",".join(units), store_requested_units,
+                        units, ex, cache_ttl)
+
+    except HTTPException:
+        return
+
+    finally:
+        for unit in units:
+            refresh_scheduler.finish("store:" + unit)
+
+
+def schedule_refresh(background_tasks: BackgroundTasks, params, ex: int,
+                     refresh_interval: int, func, *args):
+    """Queue func(*args) to refetch the cached entry for params, but only
+    once it's due per refresh_scheduler and no refresh for the same params
+    is already pending. func must call refresh_scheduler.finish()."""
+    global cache
+
+    ttl = cache.ttl(params)
+    if not refresh_scheduler.should_refresh(ttl, ex, refresh_interval):
+        return
+    if refresh_scheduler.try_begin(cache.generate_key(params)):
+        background_tasks.add_task(func, *args)
+
+
 def get_events_from_cache(
     cache, params
 ) -> Tuple[Optional[List[Event]], Optional[datetime]]:
-    response = cache.get(params)
+    """The list is the caller's own, but the Event objects in it are
+    shared with every other caller (see EventRequestCache.get_object());
+    don't modify them."""
+    response = cache.get_object(params, Event)
     if response is None:
         return None, None
-    json = response["json"]
-    last_modified = response["last_modified"]
-    if json is not None:
-        return Event.from_json(json), last_modified
-    return None, None
+    return list(response["items"]), response["last_modified"]
+
+
+def load_events(params, ex: int, cache_ttl: int = None):
+    """Cache miss path of get_events(), run once per key by inflight. The
+    cache is checked again first, since a flight for the same key may have
+    stored the entry just after this caller's own lookup missed."""
+    global cache
+
+    events, last_modified = get_events_from_cache(cache, params)
+    if events is not None:
+        return events, last_modified
+
+    return store_requested_events(params, ex, cache_ttl, upstream_deadline)
+
+
+def store_requested_events(params, ex: int, cache_ttl: int = None,
+                           deadline: float = None):
+    global cache
+
+    events, last_modified = request_events(params, cache_ttl=cache_ttl,
+                                           deadline=deadline)
+    cache.set_object(params, events, Event, last_modified=last_modified,
+                     ex=ex)
+    return events, last_modified
 
 
 def fetch_events(params, ex: int = 3600*72, cache_ttl: int = None):  # 72 hours
     global cache
 
-    events = None
-    last_modified = None
+    key = cache.generate_key(params)
     try:
-        events, last_modified = request_events(params, cache_ttl=cache_ttl)
+        # Shares the flight with any concurrent cache miss for these params.
+        with background_priority():
+            inflight.do(key, store_requested_events, params, ex, cache_ttl)
 
     except HTTPException:
         return
 
-    if events is not None:
-        json = Event.to_json(events)
-        cache.set(params, json, last_modified=last_modified, ex=ex)
+    finally:
+        refresh_scheduler.finish(key)
 
 
 def request_events(params, cache_ttl: int = None,
-                   force_refresh: bool = False) -> Tuple[List[Event], datetime]:
+                   force_refresh: bool = False,
+                   deadline: float = None) -> Tuple[List[Event], datetime]:
+    """Fetch events for params from every configured source. Sources are
+    fetched concurrently (see fetch_sources()); deadline bounds the whole
+    fan-out in seconds, or None to wait however long it takes."""
     global cache
 
     ym = params["ym"] if "ym" in params else None
@@ -127,6 +419,22 @@ def request_events(params, cache_ttl: int = None,
 
     user_agent = get_user_agent(config)
 
+    def month_sharded(source: dict, make_request, incremental=False):
+        """make_request(ym), sharded per month when that applies. With
+        incremental (connpass only), stale shards are synced through
+        get_updated_events() rather than refetched."""
+        if upstream_month_shards and ym and not ymd:
+            sync = None
+            if incremental and upstream_incremental_sync:
+                def sync(since):
+                    return make_request(None).get_updated_events(
+                        since, max_pages=incremental_sync_max_pages)
+            return MonthShardedRequest(
+                cache, source, ym, make_request, ex=connpass_cache_ttl,
+                skip_cache=force_refresh, ttl_policy=month_ttl_policy,
+                sync=sync, sync_retention=incremental_sync_retention)
+        return make_request(ym)
+
     events = []
     last_modified = datetime.fromtimestamp(0, timezone.utc)
     try:
@@ -134,33 +442,40 @@ def request_events(params, cache_ttl: int = None,
             source = find_group_source(group_key)
             if source is not None:
                 events, last_modified = request_events_for_group(
-                    source, group_key, ym, ymd, connpass_cache_ttl, force_refresh)
+                    source, group_key, ym, ymd, connpass_cache_ttl,
+                    force_refresh, deadline)
 
         else:
+            sources = []
+
             if include_prefecture and "scope" in config and "prefecture" in config["scope"]:
                 prefecture = config["scope"]["prefecture"]
-                r = ConnpassEventRequest(prefecture=prefecture,
-                                         ym=ym, ymd=ymd, cache=cache,
-                                         api_key=connpass_api_key,
-                                         user_agent=user_agent,
-                                         cache_ttl=connpass_cache_ttl,
-                                         skip_cache=force_refresh
-                                         )
-                events += r.get_events()
-                last_modified = max(last_modified, r.get_last_modified())
+                r = month_sharded(
+                    {"source": "connpass", "prefecture": prefecture},
+                    lambda ym: ConnpassEventRequest(
+                        prefecture=prefecture,
+                        ym=ym, ymd=ymd, cache=cache,
+                        api_key=connpass_api_key,
+                        user_agent=user_agent,
+                        cache_ttl=connpass_cache_ttl,
+                        skip_cache=force_refresh),
+                    incremental=True)
+                sources.append((r, None))
 
             plain_subdomains, chapters = split_connpass_scope(config)
 
             if len(plain_subdomains) > 0:
-                r = ConnpassEventRequest(subdomain=plain_subdomains,
-                                         ym=ym, ymd=ymd, cache=cache,
-                                         api_key=connpass_api_key,
-                                         user_agent=user_agent,
-                                         cache_ttl=connpass_cache_ttl,
-                                         skip_cache=force_refresh
-                                         )
-                events += r.get_events()
-                last_modified = max(last_modified, r.get_last_modified())
+                r = month_sharded(
+                    {"source": "connpass", "subdomain": plain_subdomains},
+                    lambda ym: ConnpassEventRequest(
+                        subdomain=plain_subdomains,
+                        ym=ym, ymd=ymd, cache=cache,
+                        api_key=connpass_api_key,
+                        user_agent=user_agent,
+                        cache_ttl=connpass_cache_ttl,
+                        skip_cache=force_refresh),
+                    incremental=True)
+                sources.append((r, None))
 
             # Chapters are fetched separately, per shared subdomain, with
             # title_keyword(s) sent upstream as connpass's `keyword` filter
@@ -169,18 +484,22 @@ def request_events(params, cache_ttl: int = None,
             for chapter_subdomain, entries in chapters_by_subdomain.items():
                 keywords = list(dict.fromkeys(
                     entry["title_keyword"] for entry in entries))
-                r = ConnpassEventRequest(
-                    subdomain=[chapter_subdomain],
-                    keyword=keywords,
-                    ym=ym, ymd=ymd, cache=cache,
-                    api_key=connpass_api_key,
-                    user_agent=user_agent,
-                    cache_ttl=connpass_cache_ttl,
-                    skip_cache=force_refresh
-                )
-                events += partition_and_relabel_chapter_events(
-                    r.get_events(), entries)
-                last_modified = max(last_modified, r.get_last_modified())
+                r = month_sharded(
+                    {"source": "connpass", "subdomain": [chapter_subdomain],
+                     "keyword": keywords},
+                    lambda ym, chapter_subdomain=chapter_subdomain,
+                    keywords=keywords: ConnpassEventRequest(
+                        subdomain=[chapter_subdomain],
+                        keyword=keywords,
+                        ym=ym, ymd=ymd, cache=cache,
+                        api_key=connpass_api_key,
+                        user_agent=user_agent,
+                        cache_ttl=connpass_cache_ttl,
+                        skip_cache=force_refresh),
+                    incremental=True)
+                sources.append(
+                    (r, lambda fetched, entries=entries:
+                        partition_and_relabel_chapter_events(fetched, entries)))
 
             if "scope" in config and "icalendar" in config["scope"]:
                 icalendar = config["scope"]["icalendar"]
@@ -190,19 +509,26 @@ def request_events(params, cache_ttl: int = None,
                     image_url = group.get("image_url")
                     group_url = group.get("group_url")
                     ical_url = group["ical_url"]
-                    r = IcalEventRequest(url=ical_url,
+                    r = month_sharded(
+                        {"source": "icalendar", "url": ical_url, "key": key},
+                        lambda ym, key=key, name=name, image_url=image_url,
+                        group_url=group_url, ical_url=ical_url:
+                        IcalEventRequest(url=ical_url,
                                          key=key, name=name,
-                                         image_url=image_url, group_url=group_url,
-                                         ym=ym, ymd=ymd, cache=cache)
-                    events += r.get_events()
-                    last_modified = max(last_modified, r.get_last_modified())
+                                         image_url=image_url,
+                                         group_url=group_url,
+                                         ym=ym, ymd=ymd, cache=cache))
+                    sources.append((r, None))
 
             if "scope" in config and "archives" in config["scope"]:
                 for url in get_archive_urls(config):
-                    r = ArchiveIndexRequest(url=url,
-                                            ym=ym, ymd=ymd, cache=cache)
-                    events += r.get_events()
-                    last_modified = max(last_modified, r.get_last_modified())
+                    r = month_sharded(
+                        {"source": "archive", "url": url},
+                        lambda ym, url=url: ArchiveIndexRequest(
+                            url=url, ym=ym, ymd=ymd, cache=cache))
+                    sources.append((r, None))
+
+            events, last_modified = fetch_sources(sources, deadline)
 
     except ConnpassException as e:
         raise HTTPException(status_code=e.status_code, detail=e.message)
@@ -213,13 +539,24 @@ def request_events(params, cache_ttl: int = None,
     except ArchiveException as e:
         raise HTTPException(status_code=e.status_code, detail=e.message)
 
-    events = Event.distinct_by_uid(events)
-    events.sort(key=lambda x: x.started_at, reverse=False)
+    except FanOutTimeout as e:
+        raise HTTPException(status_code=504, detail=e.message)
+
+    return finish_requested_events(events, keyword, uid), last_modified
+
+
+def finish_requested_events(events: List[Event], keyword, uid) -> List[Event]:
+    """Dedupe and sort what the sources returned, fill in keywords and
+    apply the keyword/uid filters."""
+    with timing.measure("sort"):
+        events = Event.distinct_by_uid(events)
+        events.sort(key=lambda x: x.started_at, reverse=False)
 
     # Archive events inherit their own keywords; extract for the rest
-    for event in events:
-        if event.keywords is None:
-            event.keywords = keyword_extractor.extract(event)
+    with timing.measure("keywords"):
+        for event in events:
+            if event.keywords is None:
+                event.keywords = keyword_extractor.extract(event)
 
     if keyword is not None:
         events = [ev for ev in events if ev.contains_keyword(keyword)]
@@ -227,6 +564,42 @@ def request_events(params, cache_ttl: int = None,
     if uid is not None:
         events = [ev for ev in events if ev.uid == uid]
 
+    return events
+
+
+def fetch_sources(sources, deadline: float = None
+                  ) -> Tuple[List[Event], datetime]:
+    """Call get_events() on every (request, transform) pair in sources
+    concurrently, then merge them in list order -- not completion order --
+    so distinct_by_uid() and last_modified come out the same every time.
+    transform, if not None, post-processes that source's events.
+
+    Connpass requests are still paced by the shared request_limiter,
+    across threads and workers alike."""
+    results = fanout.run([r.get_events for r, _ in sources], timeout=deadline)
+    return merge_source_results(sources, results)
+
+
+async def fetch_sources_async(sources, deadline: float = None
+                              ) -> Tuple[List[Event], datetime]:
+    """fetch_sources() for async requests, awaited together on the event
+    loop instead of taking a fan-out thread each."""
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(*(r.get_events() for r, _ in sources)),
+            timeout=deadline)
+    except asyncio.TimeoutError:
+        raise FanOutTimeout(deadline)
+    return merge_source_results(sources, results)
+
+
+def merge_source_results(sources, results) -> Tuple[List[Event], datetime]:
+    events = []
+    last_modified = datetime.fromtimestamp(0, timezone.utc)
+    for (r, transform), fetched in zip(sources, results):
+        events += transform(fetched) if transform is not None else fetched
+        last_modified = max(last_modified, r.get_last_modified())
+
     return events, last_modified
 
 
@@ -286,44 +659,72 @@ def find_group_source(group_key) -> Optional[dict]:
 
 
 def request_events_for_group(source: dict, group_key, ym, ymd, cache_ttl: int,
-                             force_refresh: bool = False
+                             force_refresh: bool = False,
+                             deadline: float = None
                              ) -> Tuple[List[Event], datetime]:
     """Fetch events for a group whose source was resolved by find_group_source()."""
+    return fetch_sources(
+        group_sources(source, group_key, ym, ymd, cache_ttl, force_refresh),
+        deadline)
+
+
+async def request_events_for_group_async(source: dict, group_key, ym, ymd,
+                                         cache_ttl: int,
+                                         deadline: float = None
+                                         ) -> Tuple[List[Event], datetime]:
+    """request_events_for_group() on the async provider variants."""
+    return await fetch_sources_async(
+        group_sources(source, group_key, ym, ymd, cache_ttl,
+                      use_async=True),
+        deadline)
+
+
+def group_sources(source: dict, group_key, ym, ymd, cache_ttl: int,
+                  force_refresh: bool = False, use_async: bool = False):
+    """(request, transform) pairs for fetch_sources() covering a group's
+    source; with use_async, requests of the async variants, for
+    fetch_sources_async()."""
     global cache
 
     user_agent = get_user_agent(config)
-    events = []
-    last_modified = datetime.fromtimestamp(0, timezone.utc)
+    sources = []
 
     if source["type"] == "connpass":
-        r = ConnpassEventRequest(subdomain=[source["subdomain"]],
-                                 keyword=source["keyword"],
-                                 ym=ym, ymd=ymd, cache=cache,
-                                 api_key=connpass_api_key, user_agent=user_agent,
-                                 cache_ttl=cache_ttl, skip_cache=force_refresh)
-        fetched = r.get_events()
+        request_class = AsyncConnpassEventRequest if use_async \
+            else ConnpassEventRequest
+        r = request_class(subdomain=[source["subdomain"]],
+                          keyword=source["keyword"],
+                          ym=ym, ymd=ymd, cache=cache,
+                          api_key=connpass_api_key, user_agent=user_agent,
+                          cache_ttl=cache_ttl, skip_cache=force_refresh)
         # keyword only narrows the upstream fetch; the exact title match
         # below still runs since connpass's keyword search is broader.
-        events += (partition_and_relabel_chapter_events(fetched, [source["chapter_entry"]])
-                   if source["chapter_entry"] is not None else fetched)
-        last_modified = max(last_modified, r.get_last_modified())
+        if source["chapter_entry"] is not None:
+            sources.append(
+                (r, lambda fetched: partition_and_relabel_chapter_events(
+                    fetched, [source["chapter_entry"]])))
+        else:
+            sources.append((r, None))
 
     elif source["type"] == "icalendar":
-        r = IcalEventRequest(url=source["ical_url"], key=group_key,
-                             name=source["name"], group_url=source["group_url"],
-                             ym=ym, ymd=ymd, cache=cache)
-        events += r.get_events()
-        last_modified = max(last_modified, r.get_last_modified())
+        request_class = AsyncIcalEventRequest if use_async \
+            else IcalEventRequest
+        r = request_class(url=source["ical_url"], key=group_key,
+                          name=source["name"], group_url=source["group_url"],
+                          ym=ym, ymd=ymd, cache=cache)
+        sources.append((r, None))
 
     # Not "elif": a primary source and an archive can both contribute events.
     if source["type"] == "archive" or source.get("also_archive"):
-        # Archive indexes have no per-group query -- filter client-side.
+        request_class = AsyncArchiveIndexRequest if use_async \
+            else ArchiveIndexRequest
+        # Served from the index's per-group_key index; see ArchiveIndex.
         for url in get_archive_urls(config):
-            r = ArchiveIndexRequest(url=url, ym=ym, ymd=ymd, cache=cache)
-            events += [ev for ev in r.get_events() if ev.group_key == group_key]
-            last_modified = max(last_modified, r.get_last_modified())
+            r = request_class(url=url, ym=ym, ymd=ymd, cache=cache,
+                              group_key=group_key)
+            sources.append((r, None))
 
-    return events, last_modified
+    return sources
 
 
 def get_group_events_page(group_key, keyword, uid, page: int, per_page: int,
@@ -349,15 +750,7 @@ def get_group_events_page(group_key, keyword, uid, page: int, per_page: int,
     keyword = (keyword.strip() or None) if keyword is not None else None
     uid = (uid.strip() or None) if uid is not None else None
 
-    can_paginate_upstream = (
-        source["type"] == "connpass"
-        and source["chapter_entry"] is None
-        and not source.get("also_archive")
-        and keyword is None
-        and uid is None
-    )
-
-    if can_paginate_upstream:
+    if can_paginate_upstream(source, keyword, uid):
         user_agent = get_user_agent(config)
         r = ConnpassEventRequest(subdomain=[source["subdomain"]],
                                  cache=cache, api_key=connpass_api_key,
@@ -378,6 +771,152 @@ def get_group_events_page(group_key, keyword, uid, page: int, per_page: int,
     return events[start:start + per_page], len(events), last_modified
 
 
+async def get_group_events_page_async(group_key, keyword, uid, page: int,
+                                      per_page: int, order: str = "desc",
+                                      background_tasks: BackgroundTasks = None,
+                                      source: Optional[dict] = None
+                                      ) -> Tuple[List[Event], int,
+                                                 Optional[datetime]]:
+    """get_group_events_page() for the async routes: upstream fetches are
+    awaited on the async provider variants (see providers.http) rather
+    than holding a service thread for the whole round trip."""
+    global cache
+
+    source = source or find_group_source(group_key)
+    if source is None:
+        return [], 0, None
+
+    keyword = (keyword.strip() or None) if keyword is not None else None
+    uid = (uid.strip() or None) if uid is not None else None
+
+    if can_paginate_upstream(source, keyword, uid):
+        user_agent = get_user_agent(config)
+        r = AsyncConnpassEventRequest(subdomain=[source["subdomain"]],
+                                      cache=cache, api_key=connpass_api_key,
+                                      user_agent=user_agent)
+        item_start = (page - 1) * per_page + 1
+        try:
+            events = await r.get_events_page(item_start, per_page,
+                                             order=order)
+        except ConnpassException as e:
+            raise HTTPException(status_code=e.status_code, detail=e.message)
+        for event in events:
+            if event.keywords is None:
+                event.keywords = keyword_extractor.extract(event)
+        return events, r.get_total_available() or 0, r.get_last_modified()
+
+    events, last_modified = await get_group_events_async(
+        {"keyword": keyword, "uid": uid, "group_key": group_key},
+        background_tasks)
+    if order == "desc":
+        events = list(reversed(events))
+    start = (page - 1) * per_page
+    return events[start:start + per_page], len(events), last_modified
+
+
+async def get_group_events_async(params,
+                                 background_tasks: BackgroundTasks = None,
+                                 ex: int = 3600*72,  # 72 hours
+                                 cache_ttl: int = None
+                                 ) -> Tuple[List[Event], datetime]:
+    """get_events() for a group's params (which never go to the store),
+    a cache miss being fetched on the async provider variants. Shares
+    cache entries and flights with get_events()."""
+    global cache
+
+    params = with_history_generation(normalize_event_params(params))
+
+    events, last_modified = get_events_from_cache(cache, params)
+
+    if events is None:
+        events, last_modified = await inflight.do_async(
+            cache.generate_key(params), load_group_events_async, params,
+            ex, cache_ttl)
+
+    else:
+        schedule_events_refresh(background_tasks, params, ex, cache_ttl)
+
+    return events, last_modified
+
+
+async def load_group_events_async(params, ex: int, cache_ttl: int = None):
+    """Cache miss path of get_group_events_async(); see load_events()."""
+    global cache
+
+    events, last_modified = get_events_from_cache(cache, params)
+    if events is not None:
+        return events, last_modified
+
+    events, last_modified = await request_group_events_async(
+        params, cache_ttl=cache_ttl, deadline=upstream_deadline)
+    cache.set_object(params, events, Event, last_modified=last_modified,
+                     ex=ex)
+    return events, last_modified
+
+
+async def request_group_events_async(params, cache_ttl: int = None,
+                                     deadline: float = None
+                                     ) -> Tuple[List[Event], datetime]:
+    """request_events() for a group's params, on the async provider
+    variants."""
+    group_key = params["group_key"]
+    connpass_cache_ttl = cache_ttl if cache_ttl is not None else 3600
+
+    events = []
+    last_modified = datetime.fromtimestamp(0, timezone.utc)
+    try:
+        source = find_group_source(group_key)
+        if source is not None:
+            events, last_modified = await request_events_for_group_async(
+                source, group_key, None, None, connpass_cache_ttl, deadline)
+
+    except ConnpassException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+    except IcalException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+    except ArchiveException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+    except FanOutTimeout as e:
+        raise HTTPException(status_code=504, detail=e.message)
+
+    return (finish_requested_events(events, params.get("keyword"),
+                                    params.get("uid")),
+            last_modified)
+
+
+def can_paginate_upstream(source: dict, keyword, uid) -> bool:
+    return (
+        source["type"] == "connpass"
+        and source["chapter_entry"] is None
+        and not source.get("also_archive")
+        and keyword is None
+        and uid is None
+    )
+
+
+def get_group_events_version(group_key, keyword, uid,
+                             background_tasks: BackgroundTasks = None,
+                             source: Optional[dict] = None
+                             ) -> Optional[dict]:
+    """Like get_events_version(), for get_group_events_page(): None when
+    pages come straight from connpass, which this can't tell about."""
+    source = source or find_group_source(group_key)
+    if source is None:
+        return None
+
+    keyword = (keyword.strip() or None) if keyword is not None else None
+    uid = (uid.strip() or None) if uid is not None else None
+    if can_paginate_upstream(source, keyword, uid):
+        return None
+
+    return get_events_version(
+        {"keyword": keyword, "uid": uid, "group_key": group_key},
+        background_tasks)
+
+
 def get_groups(params,
                background_tasks: BackgroundTasks = None
                ) -> Tuple[List[Group], datetime]:
@@ -388,14 +927,53 @@ def get_groups(params,
     groups, last_modified = get_groups_from_cache(cache, params)
 
     if groups is None:
-        groups, last_modified = request_groups(params)
+        groups, last_modified = inflight.do(
+            cache.generate_key(params), load_groups, params)
+
+    else:
+        schedule_groups_refresh(background_tasks, params)
+
+    return groups, last_modified
 
-    if background_tasks is not None:
-        background_tasks.add_task(fetch_groups, params)
+
+async def get_groups_async(params,
+                           background_tasks: BackgroundTasks = None
+                           ) -> Tuple[List[Group], datetime]:
+    """get_groups() for the async routes, a cache miss being fetched on
+    the async provider variants (see request_groups_async()). Shares
+    cache entries and flights with get_groups()."""
+    global cache
+
+    groups, last_modified = get_groups_from_cache(cache, params)
+
+    if groups is None:
+        groups, last_modified = await inflight.do_async(
+            cache.generate_key(params), load_groups_async, params)
+
+    else:
+        schedule_groups_refresh(background_tasks, params)
 
     return groups, last_modified
 
 
+def get_groups_version(params,
+                       background_tasks: BackgroundTasks = None
+                       ) -> Optional[dict]:
+    """Like get_events_version(), for get_groups()."""
+    global cache
+
+    version = cache.get_version(params)
+    if version is not None:
+        schedule_groups_refresh(background_tasks, params)
+    return version
+
+
+def schedule_groups_refresh(background_tasks: BackgroundTasks, params):
+    if background_tasks is not None:
+        schedule_refresh(background_tasks, params, 3600*72, 3600,
+                         fetch_groups, params)
+
+
 def get_full_history(
     background_tasks: BackgroundTasks = None
 ) -> Tuple[List[Event], List[Group], int, int, Optional[datetime]]:
@@ -406,14 +984,11 @@ def get_full_history(
     activity only.
 
     Returns (events, groups, from_year, to_year, last_modified)."""
-    from_year = MIN_EVENT_YEAR
-    to_year = datetime.now().year
-    ym = [f"{y:04}{m:02}" for y in range(from_year, to_year + 1) for m in range(1, 13)]
+    params, from_year, to_year = get_full_history_params()
 
     events, last_modified = get_events(
-        {"ym": ym, "keyword": None, "include_prefecture": False}, background_tasks,
-        ex=3600*24*7,  # 7 days
-        cache_ttl=3600*24)  # 24 hours
+        params, background_tasks,
+        ex=FULL_HISTORY_EX, cache_ttl=FULL_HISTORY_CACHE_TTL)
     groups, groups_last_modified = get_groups({}, background_tasks)
 
     if groups_last_modified is not None:
@@ -423,70 +998,136 @@ def get_full_history(
     return events, groups, from_year, to_year, last_modified
 
 
+FULL_HISTORY_EX = 3600*24*7  # 7 days
+FULL_HISTORY_CACHE_TTL = 3600*24  # 24 hours
+
+
+def get_full_history_params() -> Tuple[dict, int, int]:
+    """(get_events() params, from_year, to_year) of get_full_history()."""
+    from_year = MIN_EVENT_YEAR
+    to_year = datetime.now().year
+    ym = [f"{y:04}{m:02}" for y in range(from_year, to_year + 1) for m in range(1, 13)]
+    return ({"ym": ym, "keyword": None, "include_prefecture": False},
+            from_year, to_year)
+
+
+def get_full_history_version(background_tasks: BackgroundTasks = None
+                             ) -> Optional[dict]:
+    """Like get_events_version(), for get_full_history()."""
+    params, _, _ = get_full_history_params()
+    events_version = get_events_version(
+        params, background_tasks,
+        ex=FULL_HISTORY_EX, cache_ttl=FULL_HISTORY_CACHE_TTL)
+    groups_version = get_groups_version({}, background_tasks)
+    if events_version is None or groups_version is None:
+        return None
+
+    last_modified = events_version["last_modified"]
+    if groups_version["last_modified"] is not None:
+        last_modified = (groups_version["last_modified"]
+                         if last_modified is None
+                         else max(last_modified,
+                                  groups_version["last_modified"]))
+    return {"version": (events_version["version"],
+                        groups_version["version"]),
+            "last_modified": last_modified}
+
+
 def get_groups_from_cache(
     cache, params
 ) -> Tuple[Optional[List[Group]], Optional[datetime]]:
-    response = cache.get(params)
+    """The list is the caller's own, but the Group objects in it are
+    shared with every other caller (see EventRequestCache.get_object());
+    don't modify them."""
+    response = cache.get_object(params, Group)
     if response is None:
         return None, None
-    json = response["json"]
-    last_modified = response["last_modified"]
-    if json is not None:
-        return Group.from_json(json), last_modified
-    return None, None
+    return list(response["items"]), response["last_modified"]
+
+
+def load_groups(params):
+    """Cache miss path of get_groups(); see load_events()."""
+    global cache
+
+    groups, last_modified = get_groups_from_cache(cache, params)
+    if groups is not None:
+        return groups, last_modified
+
+    return store_requested_groups(params)
+
+
+def store_requested_groups(params):
+    global cache
+
+    groups, last_modified = request_groups(params)
+    cache.set_object(params, groups, Group, last_modified=last_modified,
+                     ex=3600*72)  # 72 hours
+    return groups, last_modified
+
+
+async def load_groups_async(params):
+    """Cache miss path of get_groups_async(); see load_groups()."""
+    global cache
+
+    groups, last_modified = get_groups_from_cache(cache, params)
+    if groups is not None:
+        return groups, last_modified
+
+    groups, last_modified = await request_groups_async(params)
+    cache.set_object(params, groups, Group, last_modified=last_modified,
+                     ex=3600*72)  # 72 hours
+    return groups, last_modified
 
 
 def fetch_groups(params):
     global cache
 
-    groups = None
-    last_modified = None
+    key = cache.generate_key(params)
     try:
-        groups, last_modified = request_groups(params)
+        with background_priority():
+            inflight.do(key, store_requested_groups, params)
 
     except HTTPException:
         return
 
-    if groups is not None:
-        json = Group.to_json(groups)
-        cache.set(params, json, last_modified=last_modified,
-                  ex=3600*72)  # 72 hours
+    finally:
+        refresh_scheduler.finish(key)
 
 
 def request_groups(params) -> Tuple[List[Group], datetime]:
     global cache
 
-    user_agent = get_user_agent(config)
+    connpass_request = make_connpass_group_request(ConnpassGroupRequest)
+    archive_requests = [ArchiveIndexRequest(url=url, cache=cache)
+                        for url in get_archive_urls(config)]
+    try:
+        fetched = connpass_request.get_groups() \
+            if connpass_request is not None else []
+        archive_groups = [r.get_groups() for r in archive_requests]
 
-    groups = []
-    last_modified = datetime.fromtimestamp(0, timezone.utc)
+    except ConnpassException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+    except ArchiveException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+    return assemble_groups(connpass_request, fetched,
+                           archive_requests, archive_groups)
+
+
+async def request_groups_async(params) -> Tuple[List[Group], datetime]:
+    """request_groups() on the async provider variants, with the archive
+    indexes read concurrently."""
+    global cache
+
+    connpass_request = make_connpass_group_request(AsyncConnpassGroupRequest)
+    archive_requests = [AsyncArchiveIndexRequest(url=url, cache=cache)
+                        for url in get_archive_urls(config)]
     try:
-        plain_subdomains, chapters = split_connpass_scope(config)
-        chapter_subdomains = {c["subdomain"] for c in chapters}
-        subdomain = merged_connpass_subdomains(plain_subdomains, chapters)
-
-        real_groups_by_key = {}
-        if len(subdomain) > 0:
-            r = ConnpassGroupRequest(subdomain=subdomain,
-                                     cache=cache, api_key=connpass_api_key,
-                                     user_agent=user_agent)
-            fetched = r.get_groups()
-            last_modified = max(last_modified, r.get_last_modified())
-            real_groups_by_key = {g.key: g for g in fetched
-                                  if g.key in chapter_subdomains}
-            groups += [g for g in fetched if g.key not in chapter_subdomains]
-
-        groups += get_groups_from_connpass_chapters(
-            chapters, real_groups_by_key)
-
-        if "scope" in config and "icalendar" in config["scope"]:
-            groups += get_groups_from_icalendar(config)
-
-        if "scope" in config and "archives" in config["scope"]:
-            for url in get_archive_urls(config):
-                r = ArchiveIndexRequest(url=url, cache=cache)
-                groups += r.get_groups()
-                last_modified = max(last_modified, r.get_last_modified())
+        fetched = await connpass_request.get_groups() \
+            if connpass_request is not None else []
+        archive_groups = await asyncio.gather(
+            *(r.get_groups() for r in archive_requests))
 
     except ConnpassException as e:
         raise HTTPException(status_code=e.status_code, detail=e.message)
@@ -494,6 +1135,53 @@ def request_groups(params) -> Tuple[List[Group], datetime]:
     except ArchiveException as e:
         raise HTTPException(status_code=e.status_code, detail=e.message)
 
+    return assemble_groups(connpass_request, fetched,
+                           archive_requests, archive_groups)
+
+
+def make_connpass_group_request(request_class):
+    """request_class (ConnpassGroupRequest or its async variant) for every
+    configured connpass subdomain, chapters' shared ones included; None if
+    there are none."""
+    global cache
+
+    plain_subdomains, chapters = split_connpass_scope(config)
+    subdomain = merged_connpass_subdomains(plain_subdomains, chapters)
+    if len(subdomain) == 0:
+        return None
+    return request_class(subdomain=subdomain, cache=cache,
+                         api_key=connpass_api_key,
+                         user_agent=get_user_agent(config))
+
+
+def assemble_groups(connpass_request, fetched: List[Group],
+                    archive_requests, archive_groups: List[List[Group]]
+                    ) -> Tuple[List[Group], datetime]:
+    """The group directory from what request_groups() fetched: fetched
+    (from connpass_request) and archive_groups (one list per request in
+    archive_requests), plus chapters and iCalendar groups from config."""
+    groups = []
+    last_modified = datetime.fromtimestamp(0, timezone.utc)
+
+    plain_subdomains, chapters = split_connpass_scope(config)
+    chapter_subdomains = {c["subdomain"] for c in chapters}
+
+    real_groups_by_key = {g.key: g for g in fetched
+                          if g.key in chapter_subdomains}
+    groups += [g for g in fetched if g.key not in chapter_subdomains]
+    if connpass_request is not None:
+        last_modified = max(last_modified,
+                            connpass_request.get_last_modified())
+
+    groups += get_groups_from_connpass_chapters(chapters, real_groups_by_key)
+
+    if "scope" in config and "icalendar" in config["scope"]:
+        groups += get_groups_from_icalendar(config)
+
+    for r, archive_group in zip(archive_requests, archive_groups):
+        groups += archive_group
+        last_modified = max(last_modified, r.get_last_modified())
+
     groups = merge_duplicate_groups(groups)
 
     return groups, last_modified
@@ -667,11 +1355,28 @@ def get_groups_from_archives(config):
     return groups
 
 
-def preload_archive_indexes():
-    for url in get_archive_urls(config):
+async def sweep_cache_periodically():
+    """Runs for the app's lifetime (see main.lifespan), reclaiming entries
+    that have been stale past their retention and nobody has asked for.
+    Also logs connpass pacing (queue depth per priority, waits) every
+    interval, whether or not anything was reclaimed."""
+    while True:
+        await asyncio.sleep(cache_sweep_interval)
+        reclaimed = cache.sweep() + store.sweep()
+        if reclaimed > 0:
+            print({"message": "Swept stale cache entries",
+                   "reclaimed": reclaimed, **cache.stats(),
+                   "store": store.stats()})
+        print({"message": "connpass request pacing",
+               **request_limiter.stats()})
+
+
+async def preload_archive_indexes():
+    """Fetch every archive index concurrently on the shared async client."""
+    async def preload(url):
         try:
-            r = ArchiveIndexRequest(url=url, cache=cache)
-            r.preload()
+            r = AsyncArchiveIndexRequest(url=url, cache=cache)
+            await r.preload()
         except ArchiveException as e:
             print({
                 "message": "Failed to preload archive index",
@@ -680,6 +1385,8 @@ def preload_archive_indexes():
                 "detail": e.message
             })
 
+    await asyncio.gather(*(preload(url) for url in get_archive_urls(config)))
+
 
 def get_archive_urls(config):
     if "scope" not in config or "archives" not in config["scope"]:
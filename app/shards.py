@@ -0,0 +1,300 @@
+import dataclasses
+import time
+from datetime import datetime, timezone
+from .models import Event
+
+
+class MonthTtlPolicy:
+    """How long a month's shard stays fresh, by its age. Events in a month
+    that ended long ago almost never change, so once a month is more than
+    closed_after_months behind the current one it's kept for closed_ttl
+    seconds (None: until invalidated) instead of the short TTL recent and
+    upcoming months get."""
+
+    def __init__(self, closed_after_months=2, closed_ttl=3600*24*30):
+        self.closed_after_months = closed_after_months
+        self.closed_ttl = closed_ttl
+
+    def is_closed(self, month, today=None) -> bool:
+        today = today or datetime.now()
+        age = (today.year * 12 + today.month) \
+            - (int(month[:4]) * 12 + int(month[4:6]))
+        return age > self.closed_after_months
+
+    def ttl(self, month, recent_ttl):
+        return self.closed_ttl if self.is_closed(month) else recent_ttl
+
+
+def parse_updated_at(value) -> datetime | None:
+    """value (an event's updated_at) as an aware datetime; None if it
+    isn't one, as iCalendar and archive data may well have (or, before
+    Python 3.11, anything ending in "Z")."""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo is not None else None
+
+
+def newest_updated_at(events) -> str | None:
+    """The latest updated_at among events, skipping any that don't parse
+    (see parse_updated_at()); None if none does."""
+    newest = None
+    for ev in events:
+        parsed = parse_updated_at(ev.updated_at)
+        if parsed is not None and (newest is None or parsed > newest[0]):
+            newest = (parsed, ev.updated_at)
+    return newest[1] if newest is not None else None
+
+
+class MonthShardedRequest:
+    """Wraps one source's event request for a list of months so its
+    result is cached per (source, month) rather than per month list. A
+    9-month /events window, a single month and get_full_history() then
+    share the months they have in common, and only months that are
+    missing or expired are fetched -- in one upstream request, whose
+    events are then split back into their months.
+
+    source identifies the upstream query (e.g. {"source": "connpass",
+    "subdomain": [...]}) and becomes part of each shard's cache key.
+    Shards are kept for ex seconds, or per ttl_policy by the month's age
+    if given. invalidate() discards a month's shards for every source.
+    make_request(ym) builds the underlying provider request for a list of
+    months; its events are expected to carry started_at in local time, as
+    the providers' own ym filtering does.
+
+    With sync given, a shard that's no longer fresh is brought up to date
+    rather than refetched: sync(since) returns the source's events updated
+    at or after since (an updated_at watermark) as {uid: event}, None
+    marking one that no longer belongs to the source, or None if it can't
+    reach back that far. Only those events are replaced in the shard, so a
+    refresh costs one or two upstream requests for every month at once.
+    Shards are then kept sync_retention seconds past their freshness, and
+    are refetched in full once that runs out or a sync fails -- which also
+    drops events deleted upstream, which sync can't see. skip_cache
+    refetches every month in full regardless (resetting its watermark), so
+    a forced refresh drops those too.
+
+    Quacks like the provider requests (get_events()/get_last_modified()),
+    so fetch_sources() can take it in their place."""
+
+    def __init__(self, cache, source: dict, ym, make_request, ex=3600,
+                 skip_cache=False, ttl_policy: MonthTtlPolicy = None,
+                 sync=None, sync_retention=3600*24*3):
+        self.cache = cache
+        self.source = source
+        self.ym = ym
+        self.make_request = make_request
+        self.ex = ex
+        self.skip_cache = skip_cache
+        self.ttl_policy = ttl_policy
+        self.sync = sync
+        self.sync_retention = sync_retention
+        self.last_modified = datetime.fromtimestamp(0, timezone.utc)
+        self._generations = None
+        # Month -> its sync state, as read by this request.
+        self._sync_state = {}
+
+    # Month -> how many times it's been invalidated; one small pinned entry
+    # read once per request, rather than a lookup per month.
+    GENERATIONS_KEY = "shard-generations"
+    # Held (see EventRequestCache.add()) while GENERATIONS_KEY is updated,
+    # so concurrent invalidate() calls can't lose each other's bumps. Only
+    # lapses on its own if its holder died.
+    GENERATIONS_LOCK_KEY = "shard-generations-lock"
+    GENERATIONS_LOCK_TTL = 10
+
+    @classmethod
+    def invalidate(cls, cache, months):
+        """Make every source refetch months on its next request, however
+        long their shards were meant to be kept. Goes through the cache,
+        so it applies to every worker sharing it. The shards superseded
+        are deleted by each source's next fetch of them."""
+        while not cache.add(cls.GENERATIONS_LOCK_KEY, "1",
+                            ex=cls.GENERATIONS_LOCK_TTL):
+            time.sleep(0.01)
+        try:
+            generations = cls._load_generations(cache)
+            for month in months:
+                generations[month] = generations.get(month, 0) + 1
+            cache.set(cls.GENERATIONS_KEY, generations, ex=None)
+        finally:
+            cache.delete(cls.GENERATIONS_LOCK_KEY)
+
+    def get_events(self):
+        shards = {}
+        missing = []
+        stale = []
+        for month in self.ym:
+            shard = None
+            if not self.skip_cache:
+                shard = self.cache.get_object(self._shard_key(month), Event)
+            if shard is None:
+                missing.append(month)
+            else:
+                shards[month] = shard
+                if self.sync is not None and not self._is_fresh(month):
+                    stale.append(month)
+
+        if len(stale) > 0:
+            synced = self._sync(stale, shards)
+            if synced is None:
+                missing += stale
+            else:
+                shards.update(synced)
+
+        if len(missing) > 0:
+            shards.update(self._fetch(missing))
+
+        events = []
+        for month in self.ym:
+            shard = shards[month]
+            # Copies: callers relabel and annotate events in place, which
+            # must not leak into the cached shard.
+            events += [dataclasses.replace(ev) for ev in shard["items"]]
+            if shard["last_modified"] is not None:
+                self.last_modified = max(self.last_modified,
+                                         shard["last_modified"])
+        return events
+
+    def get_last_modified(self):
+        return self.last_modified
+
+    def _fetch(self, months) -> dict:
+        r = self.make_request(months)
+        fetched = r.get_events()
+        last_modified = r.get_last_modified()
+
+        by_month = {month: [] for month in months}
+        for ev in fetched:
+            month = ev.started_at[:7].replace("-", "")
+            if month in by_month:
+                by_month[month].append(ev)
+
+        # Nothing updated later than the newest event fetched can be in
+        # these shards yet; without one, the next sync can't tell how far
+        # back to look and the months are fetched in full again. Only
+        # synced sources need it.
+        watermark = newest_updated_at(fetched) \
+            if self.sync is not None else None
+        shards = self._store(by_month,
+                             {month: last_modified for month in months},
+                             {month: watermark for month in months})
+        self._drop_superseded(months)
+        return shards
+
+    def _drop_superseded(self, months):
+        """Delete this source's shards of months from before their last
+        invalidate(), which nothing reads anymore; a closed month's would
+        otherwise be held for as long as it was meant to be kept, or for
+        good when pinned."""
+        for month in months:
+            for generation in range(self._generations.get(month, 0)):
+                self.cache.delete(self._shard_key(month, generation))
+
+    def _sync(self, months, shards) -> dict | None:
+        """Apply sync()'s updates to the cached shards of months; None if
+        they have to be fetched in full instead."""
+        watermarks = {month: self._load_sync_state(month).get("watermark")
+                      for month in months}
+        if any(parse_updated_at(watermark) is None
+               for watermark in watermarks.values()):
+            return None
+        updated = self.sync(min(watermarks.values(), key=parse_updated_at))
+        if updated is None:
+            return None
+
+        newest = newest_updated_at(ev for ev in updated.values()
+                                   if ev is not None)
+        now = datetime.now(timezone.utc)
+        by_month = {}
+        last_modified = {}
+        for month in months:
+            items = shards[month]["items"]
+            arrived = [ev for ev in updated.values() if ev is not None
+                       and ev.started_at[:7].replace("-", "") == month]
+            events = [ev for ev in items if ev.uid not in updated] + arrived
+            events.sort(key=lambda ev: ev.started_at)
+            by_month[month] = events
+            # Updates at the watermark itself are seen again every time.
+            uids = {ev.uid for ev in items}
+            changed = any(ev.uid in updated and updated[ev.uid] != ev
+                          for ev in items) \
+                or any(ev.uid not in uids for ev in arrived)
+            last_modified[month] = now if changed \
+                else shards[month]["last_modified"]
+            if newest is not None and parse_updated_at(newest) \
+                    > parse_updated_at(watermarks[month]):
+                watermarks[month] = newest
+        return self._store(by_month, last_modified, watermarks)
+
+    def _store(self, by_month, last_modified, watermarks) -> dict:
+        """Cache by_month's shards, each with its own last_modified and,
+        with sync, the updated_at watermark to sync it from next time."""
+        shards = {}
+        now = datetime.now(timezone.utc).timestamp()
+        for month, events in by_month.items():
+            ex = self._fresh_ttl(month)
+            if self.sync is not None and ex is not None:
+                ex += self.sync_retention
+            self.cache.set_object(self._shard_key(month), events, Event,
+                                  last_modified=last_modified[month], ex=ex)
+            shards[month] = {"items": tuple(events),
+                             "last_modified": last_modified[month]}
+
+            if self.sync is not None:
+                state = {"watermark": watermarks[month], "synced_at": now}
+                # Kept as long as the shard it describes.
+                self.cache.set(self._sync_state_key(month), state, ex=ex)
+                self._sync_state[month] = state
+        return shards
+
+    def _fresh_ttl(self, month):
+        return self.ex if self.ttl_policy is None \
+            else self.ttl_policy.ttl(month, self.ex)
+
+    def _is_fresh(self, month) -> bool:
+        """Whether month's shard was fetched or synced within its TTL; only
+        tracked with sync, whose shards outlive it by sync_retention."""
+        entry = self._load_sync_state(month)
+        if len(entry) == 0:
+            return False
+        ex = self._fresh_ttl(month)
+        if ex is None:
+            return True
+        return datetime.now(timezone.utc).timestamp() \
+            < entry["synced_at"] + ex
+
+    def _shard_key(self, month, generation=None) -> dict:
+        """month's shard key at generation, by default the current one."""
+        if self._generations is None:
+            self._generations = self._load_generations(self.cache)
+        key = {"shard": self.source, "ym": month}
+        if generation is None:
+            generation = self._generations.get(month, 0)
+        if generation > 0:
+            key["generation"] = generation
+        return key
+
+    def _sync_state_key(self, month) -> dict:
+        """{"watermark", "synced_at"} of this source's shard for month.
+        One entry per shard, written whole by whichever request stored the
+        shard, so concurrent requests syncing other months can't lose each
+        other's updates as they could read-modify-writing a shared one."""
+        return {"shard-sync": self.source, "ym": month}
+
+    def _load_sync_state(self, month) -> dict:
+        """month's sync state; empty if it has none."""
+        if month not in self._sync_state:
+            response = self.cache.get(self._sync_state_key(month))
+            self._sync_state[month] = {}
+            if response is not None and isinstance(response["json"], dict):
+                self._sync_state[month] = response["json"]
+        return self._sync_state[month]
+
+    @classmethod
+    def _load_generations(cls, cache) -> dict:
+        response = cache.get(cls.GENERATIONS_KEY)
+        if response is None or not isinstance(response["json"], dict):
+            return {}
+        return response["json"]
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one: the first
+    caller (the leader) runs the function, and callers arriving while it's
+    still running wait for it and share its result, or its exception,
+    instead of repeating the same upstream fetch.
+
+    Nothing is remembered once the call returns; caching the result is
+    left to the caller. Every caller gets the same result object, so it
+    must be treated as read-only."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: str, func, *args, **kwargs):
+        """do() for a coroutine function, sharing flights with do(): a
+        thread and a task wanting the same key still make one call. A
+        waiting task awaits the flight on a worker thread, so the event
+        loop (which may be running the leader) is never blocked."""
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not is_leader:
+            await asyncio.to_thread(call.done.wait)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = await func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self, key: str) -> bool:
+        with self._lock:
+            return key in self._calls
@@ -0,0 +1,235 @@
+import queue
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from .cache import CachedObjects, EventRequestCache
+
+
+# Queued in place of an entry's content to delete its row instead.
+_DELETED = object()
+
+
+class SqliteEventRequestCache(EventRequestCache):
+    """EventRequestCache backed by a SQLite file, so a restarted process
+    or a new Lambda container (with path under /tmp) starts warm instead of
+    refetching everything from upstream.
+
+    The in-memory store stays in front as L1, with the same LRU budget.
+    Reads go through to SQLite when an entry isn't in memory, loading it
+    with its original expiry and last_modified, so get(), peek() and ttl()
+    behave exactly as if it had never left memory. Writes land in memory
+    immediately and are written to SQLite behind the caller's back by a
+    background thread; flush() waits for them.
+
+    Only set()/set_object() entries are persisted: add() locks and the pacing
+    slot stay per process. Like in memory, sweep() drops the content of
+    expired rows and keeps just their digest for peek_digest()."""
+
+    WRITE_BATCH_SIZE = 100
+    # Bumped whenever the table layout changes; older tables are simply
+    # dropped, since everything in them can be refetched.
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path, prefix="event-request:", max_bytes=None):
+        super().__init__(prefix=prefix, max_bytes=max_bytes)
+        self._path = path
+        self._local = threading.local()
+        self._writes = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != self.SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS entries")
+                conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " content TEXT,"
+                " digest TEXT NOT NULL,"
+                " last_modified INTEGER,"
+                " expires_at REAL)")
+
+    def get(self, key_data) -> dict | None:
+        self._load(key_data)
+        return super().get(key_data)
+
+    def get_version(self, key_data) -> dict | None:
+        self._load(key_data)
+        return super().get_version(key_data)
+
+    def peek(self, key_data) -> dict | None:
+        self._load(key_data)
+        return super().peek(key_data)
+
+    def peek_digest(self, key_data) -> dict | None:
+        self._load(key_data)
+        return super().peek_digest(key_data)
+
+    def ttl(self, key_data) -> float | None:
+        self._load(key_data)
+        return super().ttl(key_data)
+
+    def get_object(self, key_data, model) -> dict | None:
+        self._load(key_data)
+        return super().get_object(key_data, model)
+
+    def set(self, key_data, response_data, last_modified=None, ex=3600):
+        super().set(key_data, response_data, last_modified=last_modified,
+                    ex=ex)
+        self._write_behind_later(key_data, last_modified)
+
+    def set_object(self, key_data, items, model, last_modified=None,
+                   ex=3600, digest=None):
+        super().set_object(key_data, items, model,
+                           last_modified=last_modified, ex=ex, digest=digest)
+        self._write_behind_later(key_data, last_modified)
+
+    def renew(self, key_data, ex=3600) -> dict | None:
+        self._load(key_data)
+        response = super().renew(key_data, ex=ex)
+        if response is not None:
+            self._write_behind_later(key_data, None)
+        return response
+
+    def delete(self, key_data):
+        super().delete(key_data)
+        # Through the writer, so a write still queued for the entry can't
+        # bring its row back.
+        self._writes.put((self.generate_key(key_data), _DELETED, None, None))
+        self._start_writer()
+
+    def _write_behind_later(self, key_data, last_modified):
+        key = self.generate_key(key_data)
+        # Queued as stored in memory: a CachedObjects entry is only
+        # serialized by the writer thread. Read together, as _put() writes
+        # them.
+        with self._lock:
+            content = self._store.get(key + ":content")
+            expires_at = self._expiry.get(key + ":content")
+        if content is None:
+            # Evicted or swept since it was stored; nothing to persist.
+            return
+        last_modified_ts = None
+        if last_modified is not None:
+            last_modified_ts = int(last_modified.timestamp())
+        self._writes.put((key, content, last_modified_ts, expires_at))
+        self._start_writer()
+
+    def sweep(self) -> int:
+        """Also trims expired rows and deletes rows stale beyond retention
+        in SQLite; the count covers both tiers."""
+        reclaimed = super().sweep()
+        now = datetime.now(timezone.utc).timestamp()
+        with self._connect() as conn:
+            deleted = conn.execute(
+                "DELETE FROM entries"
+                " WHERE expires_at IS NOT NULL AND expires_at < ?",
+                (now - self.STALE_RETENTION_SECONDS,)).rowcount
+            trimmed = conn.execute(
+                "UPDATE entries SET content = NULL"
+                " WHERE content IS NOT NULL"
+                " AND expires_at IS NOT NULL AND expires_at < ?",
+                (now,)).rowcount
+        return reclaimed + deleted + trimmed
+
+    def stats(self) -> dict:
+        return {**super().stats(), "backend": "sqlite",
+                "pending_writes": self._writes.unfinished_tasks}
+
+    def flush(self):
+        """Block until every set() so far has been written to SQLite."""
+        self._writes.join()
+
+    def close(self):
+        self.flush()
+
+    def _load(self, key_data):
+        key = self.generate_key(key_data)
+        if key + ":content" in self._store or key + ":digest" in self._store:
+            return
+
+        row = self._connect().execute(
+            "SELECT content, digest, last_modified, expires_at FROM entries"
+            " WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return
+
+        content, digest, last_modified_ts, expires_at = row
+        # Straight into L1; it's already in SQLite.
+        if content is None:
+            self._put_digest(key, digest, last_modified_ts, expires_at)
+            return
+        last_modified = None
+        if last_modified_ts is not None:
+            last_modified = datetime.fromtimestamp(last_modified_ts,
+                                                   timezone.utc)
+        ex = None
+        if expires_at is not None:
+            ex = expires_at - datetime.now(timezone.utc).timestamp()
+        super().set(key_data, content, last_modified=last_modified, ex=ex)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, and each
+        # service/fan-out thread may read through.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=10)
+            self._local.conn = conn
+        return conn
+
+    def _start_writer(self):
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_behind, name="sqlite-cache-writer",
+                    daemon=True)
+                self._writer.start()
+
+    def _write_behind(self):
+        while True:
+            batch = [self._writes.get()]
+            while len(batch) < self.WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._connect() as conn:
+                    rows = []
+                    for key, content, last_modified_ts, expires_at in batch:
+                        if content is _DELETED:
+                            # In order with the writes queued around it.
+                            self._upsert(conn, rows)
+                            rows = []
+                            conn.execute("DELETE FROM entries WHERE key = ?",
+                                         (key,))
+                            continue
+                        if isinstance(content, CachedObjects):
+                            content = content.to_content()
+                        rows.append((key, content,
+                                     self.content_digest(content),
+                                     last_modified_ts, expires_at))
+                    self._upsert(conn, rows)
+            except sqlite3.Error as e:
+                print({"message": "Failed to write cache entries",
+                       "count": len(batch), "detail": str(e)})
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+
+    def _upsert(self, conn, rows):
+        # Like EventRequestCache.set(), keeps the previous last_modified
+        # when none is given.
+        conn.executemany(
+            "INSERT INTO entries"
+            " (key, content, digest, last_modified, expires_at)"
+            " VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET"
+            " content = excluded.content,"
+            " digest = excluded.digest,"
+            " last_modified = COALESCE(excluded.last_modified,"
+            " entries.last_modified),"
+            " expires_at = excluded.expires_at",
+            rows)
@@ -0,0 +1,252 @@
+import bisect
+import itertools
+import math
+import threading
+from datetime import datetime, timezone
+
+# Shared by every EventStore, so load stamps are never repeated between
+# them.
+_stamps = itertools.count(1)
+
+
+class EventStore:
+    """Holds every event fetched for a date window once, keyed by uid, so
+    overlapping windows (/events, /events/month/.., /events/week/this, ...)
+    share one copy instead of each caching its own.
+
+    Windows are loaded and answered in units: a month ("YYYYMM") or a day
+    ("YYYYMMDD"), as passed to the providers' ym/ymd. load() replaces
+    everything held for its units with the complete result of fetching
+    them, and query() answers any list of units by bisecting a started_at
+    index. A day is also covered by a loaded month containing it, so once
+    /events has loaded the recent months, /events/day/today needs no fetch
+    of its own.
+
+    Events are additionally indexed by group_key and source. They're
+    shared with every caller and must be treated as read-only."""
+
+    def __init__(self):
+        self._events = {}
+        # (started_at, uid), sorted; started_at is ISO 8601 local time, so
+        # string order is date order and a unit is a contiguous prefix.
+        self._index = []
+        self._by_group = {}
+        self._by_source = {}
+        # Unit -> (expires_at, last_modified, stamp); expires_at None never
+        # expires. stamp is renewed whenever the unit's events change; see
+        # get_version().
+        self._units = {}
+        self._lock = threading.RLock()
+
+    def load(self, units, events, last_modified=None, ex=3600):
+        """Replace the events held for units with events, the complete
+        result of fetching them, valid for ex seconds (None: forever).
+        Events outside units are ignored."""
+        expires_at = None
+        if ex is not None:
+            expires_at = datetime.now(timezone.utc).timestamp() + ex
+        prefixes = [self._prefix(unit) for unit in units]
+
+        with self._lock:
+            for prefix in prefixes:
+                for uid in self._uids_in(prefix):
+                    self._remove(uid)
+
+            added = []
+            for event in events:
+                if not event.started_at.startswith(tuple(prefixes)):
+                    continue
+                if event.uid in self._events:
+                    # Moved here from a date outside units, which no
+                    # longer holds it.
+                    moved_from = self._events[event.uid].started_at
+                    self._remove(event.uid)
+                    self._restamp(moved_from[:10].replace("-", ""))
+                self._events[event.uid] = event
+                self._by_group.setdefault(event.group_key, set()) \
+                    .add(event.uid)
+                self._by_source.setdefault(event.source, set()) \
+                    .add(event.uid)
+                added.append((event.started_at, event.uid))
+            # Nearly sorted already; cheaper than an insort per event.
+            self._index.extend(added)
+            self._index.sort()
+
+            for unit in units:
+                if len(unit) == 6:
+                    # Superseded by the month just loaded.
+                    for day in [u for u in self._units
+                                if len(u) == 8 and u.startswith(unit)]:
+                        del self._units[day]
+                self._units[unit] = (expires_at, last_modified,
+                                     next(_stamps))
+
+    def invalidate(self, units):
+        """Forget that units (and any days inside a month among them) are
+        loaded, so they're fetched again; their events are kept until
+        then and replaced by that load()."""
+        with self._lock:
+            for unit in units:
+                self._units.pop(unit, None)
+                if len(unit) == 6:
+                    for day in [u for u in self._units
+                                if len(u) == 8 and u.startswith(unit)]:
+                        del self._units[day]
+
+    def missing(self, units) -> list:
+        """The units not covered by an unexpired load(), in order."""
+        with self._lock:
+            return [unit for unit in units if self._covering(unit) is None]
+
+    def covering(self, units) -> list:
+        """The distinct loaded units currently answering for units, e.g. a
+        month for a day inside it; what to refetch to refresh them."""
+        with self._lock:
+            found = [self._covering(unit) for unit in units]
+        return list(dict.fromkeys(u for u in found if u is not None))
+
+    def ttl(self, unit) -> float | None:
+        """Seconds until a loaded unit expires, math.inf if it never does,
+        or None if it isn't loaded; like EventRequestCache.ttl()."""
+        with self._lock:
+            entry = self._units.get(unit)
+        if entry is None:
+            return None
+        expires_at, _, _ = entry
+        if expires_at is None:
+            return math.inf
+        return expires_at - datetime.now(timezone.utc).timestamp()
+
+    def query(self, units, keyword=None, uid=None, group_key=None,
+              source=None):
+        """Events within units, sorted by started_at, narrowed down by any
+        of the other filters given. Returns (events, last_modified), the
+        latter being the latest across the loaded units answering for
+        units (None if none of them has one)."""
+        # A day inside a month also asked for would be listed twice.
+        months = {unit for unit in units if len(unit) == 6}
+        prefixes = [self._prefix(unit) for unit in sorted(set(units))
+                    if len(unit) == 6 or unit[:6] not in months]
+
+        with self._lock:
+            candidates = None
+            if group_key is not None:
+                candidates = self._by_group.get(group_key, set())
+            if source is not None:
+                by_source = self._by_source.get(source, set())
+                candidates = by_source if candidates is None \
+                    else candidates & by_source
+
+            events = []
+            for prefix in prefixes:
+                events += [self._events[u] for u in self._uids_in(prefix)
+                           if candidates is None or u in candidates]
+
+            last_modified = self._last_modified(units)
+
+        if keyword is not None:
+            events = [ev for ev in events if ev.contains_keyword(keyword)]
+        if uid is not None:
+            events = [ev for ev in events if ev.uid == uid]
+        return events, last_modified
+
+    def get_version(self, units) -> dict | None:
+        """The last_modified query(units) would return, with an opaque
+        "version" that changes whenever what query(units) returns may
+        have, without collecting the events: it's made of the load stamps
+        of just the units covering units, so loading any other window
+        leaves it as it is. None if some of units aren't loaded, like
+        missing()."""
+        with self._lock:
+            covering = [self._covering(unit) for unit in units]
+            if any(unit is None for unit in covering):
+                return None
+            version = tuple((unit, self._units[unit][2])
+                            for unit in sorted(set(covering)))
+            return {"version": version,
+                    "last_modified": self._last_modified(units)}
+
+    def sweep(self) -> int:
+        """Drop expired units along with their events, except where another
+        unexpired unit still covers them. Returns how many units were
+        dropped."""
+        now = datetime.now(timezone.utc).timestamp()
+        with self._lock:
+            expired = [unit for unit, (expires_at, _, _)
+                       in self._units.items()
+                       if expires_at is not None and now > expires_at]
+            for unit in expired:
+                del self._units[unit]
+            for unit in expired:
+                for uid in self._uids_in(self._prefix(unit)):
+                    day = self._events[uid].started_at[:10].replace("-", "")
+                    if self._covering(day) is None:
+                        self._remove(uid)
+        return len(expired)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "events": len(self._events),
+                "units": len(self._units),
+                "groups": len(self._by_group),
+            }
+
+    def _last_modified(self, units):
+        last_modified = None
+        for unit in units:
+            covering = self._covering(unit)
+            if covering is None:
+                continue
+            _, unit_last_modified, _ = self._units[covering]
+            if unit_last_modified is not None and (
+                    last_modified is None
+                    or unit_last_modified > last_modified):
+                last_modified = unit_last_modified
+        return last_modified
+
+    def _covering(self, unit):
+        now = datetime.now(timezone.utc).timestamp()
+        for candidate in (unit, unit[:6]) if len(unit) == 8 else (unit,):
+            entry = self._units.get(candidate)
+            if entry is None:
+                continue
+            expires_at, _, _ = entry
+            if expires_at is None or now <= expires_at:
+                return candidate
+        return None
+
+    def _restamp(self, day):
+        """Renew the stamp of the loaded unit covering day, if any, after
+        its events changed outside a load() of its own."""
+        unit = self._covering(day)
+        if unit is not None:
+            expires_at, last_modified, _ = self._units[unit]
+            self._units[unit] = (expires_at, last_modified, next(_stamps))
+
+    def _uids_in(self, prefix) -> list:
+        i = bisect.bisect_left(self._index, (prefix,))
+        uids = []
+        while i < len(self._index) and self._index[i][0].startswith(prefix):
+            uids.append(self._index[i][1])
+            i += 1
+        return uids
+
+    def _remove(self, uid):
+        event = self._events.pop(uid)
+        i = bisect.bisect_left(self._index, (event.started_at, uid))
+        del self._index[i]
+        for index, key in ((self._by_group, event.group_key),
+                           (self._by_source, event.source)):
+            uids = index.get(key)
+            uids.discard(uid)
+            if not uids:
+                del index[key]
+
+    @staticmethod
+    def _prefix(unit) -> str:
+        """started_at prefix of a "YYYYMM" or "YYYYMMDD" unit."""
+        prefix = f"{unit[:4]}-{unit[4:6]}"
+        if len(unit) == 8:
+            prefix += f"-{unit[6:8]}"
+        return prefix
@@ -0,0 +1,123 @@
+import contextlib
+import contextvars
+import threading
+import time
+
+_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Where one request's time went: the total time spent in each named
+    step (and how often it ran), plus plain counters such as cache hits.
+
+    Steps running concurrently on fan-out threads each add their own
+    time, so a step's total can exceed the request's wall time."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # name -> [seconds, or None for a plain counter; count]
+        self._metrics = {}
+        self._marks = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds=None, count=1):
+        with self._lock:
+            metric = self._metrics.setdefault(name, [None, 0])
+            if seconds is not None:
+                metric[0] = (metric[0] or 0.0) + seconds
+            metric[1] += count
+
+    def mark(self, name):
+        """Note when name happened, for the middleware to measure from."""
+        self._marks[name] = time.perf_counter()
+
+    def since(self, name) -> float | None:
+        marked = self._marks.get(name)
+        if marked is None:
+            return None
+        return time.perf_counter() - marked
+
+    def header_value(self) -> str:
+        """The metrics as a Server-Timing header value, in the order they
+        were first recorded."""
+        with self._lock:
+            metrics = list(self._metrics.items())
+        parts = []
+        for name, (seconds, count) in metrics:
+            if seconds is None:
+                parts.append(f'{name};desc="{count}"')
+            elif count > 1:
+                parts.append(f'{name};dur={seconds * 1000:.1f};'
+                             f'desc="{count} calls"')
+            else:
+                parts.append(f'{name};dur={seconds * 1000:.1f}')
+        return ", ".join(parts)
+
+
+def current() -> RequestTimings | None:
+    """The RequestTimings of the request being served, or None when
+    timings aren't being collected (see ServerTimingMiddleware)."""
+    return _timings.get()
+
+
+@contextlib.contextmanager
+def measure(name):
+    """Add the time spent inside to step name of the current request."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def count(name, n=1):
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(name, count=n)
+
+
+def mark(name):
+    timings = _timings.get()
+    if timings is not None:
+        timings.mark(name)
+
+
+class ServerTimingMiddleware:
+    """Collects a RequestTimings for each HTTP request and reports it in
+    a Server-Timing header. Besides what the handler recorded, adds
+    "serialize" (from the handler's "respond" mark, see
+    routes.respond_rendered(), to the response being sent, i.e. JSON
+    encoding) and "total".
+
+    The timings object is shared, not copied, with the worker threads the
+    service layer runs on, since they copy the request's context."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _timings.set(timings)
+
+        async def send_with_timings(message):
+            if message["type"] == "http.response.start":
+                serialize = timings.since("respond")
+                if serialize is not None:
+                    timings.add("serialize", serialize)
+                timings.add("total", time.perf_counter() - timings.started)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timings.header_value().encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            _timings.reset(token)
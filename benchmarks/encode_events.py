@@ -0,0 +1,119 @@
+"""Compares ways of encoding a large /events response body.
+
+    python -m benchmarks.encode_events [--events N] [--repeat N] [--fields F]
+
+- response_model: what FastAPI does with response_model=List[Event]
+  (dataclasses.asdict(), validation, dump_python() and json.dumps()),
+  which every 200 went through before responses were rendered up front.
+- type_adapter: TypeAdapter(List[Event]).dump_json(), the pydantic-based
+  rendering encode_json() falls back on without orjson.
+- encode_json: app.encoder.encode_json() as installed.
+
+Then the same for a fields= projection (--fields):
+
+- to_json_prune: Event.to_json() on every event, then a pruned copy of
+  each dict, as fields= was applied before projectors.
+- project: app.encoder.project(), then encode_json().
+"""
+import argparse
+import dataclasses
+import json
+import time
+from typing import List
+from pydantic import TypeAdapter
+from app import encoder
+from app.encoder import encode_json, normalize_fields, project
+from app.models import Event
+
+
+def make_events(n: int) -> List[Event]:
+    # Roughly an archive event: a few KB of HTML description, mostly
+    # non-ASCII.
+    description = "<p>山梨で開催する勉強会です。Python と Web の話をします。</p>" * 40
+    return Event.from_json([{
+        "uid": f"uid{i}", "event_id": i, "title": f"山梨 勉強会 #{i}",
+        "catch": "みんなで学ぼう", "hash_tag": "yamanashi",
+        "event_url": f"https://example.connpass.com/event/{i}/",
+        "image_url": None,
+        "started_at": "2024-01-01T19:00:00+09:00",
+        "ended_at": "2024-01-01T21:00:00+09:00",
+        "updated_at": "2023-12-01T00:00:00+09:00",
+        "open_status": "open", "limit": 30, "accepted": 12, "waiting": 0,
+        "owner_name": "owner", "place": "甲府市", "address": "山梨県甲府市",
+        "group_key": "group", "group_name": "グループ",
+        "group_url": "https://example.connpass.com/",
+        "description": description, "lat": "35.66", "lon": "138.57",
+        "keywords": ["python", "web"], "source": "connpass",
+    } for i in range(n)])
+
+
+def response_model(events: List[Event]) -> bytes:
+    adapter = TypeAdapter(List[Event])
+    validated = adapter.validate_python(
+        [dataclasses.asdict(event) for event in events])
+    return json.dumps(adapter.dump_python(validated, mode="json"),
+                      ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def type_adapter(events: List[Event]) -> bytes:
+    return TypeAdapter(List[Event]).dump_json(events)
+
+
+def to_json_prune(events: List[Event], fields: str) -> bytes:
+    field_names = {f.strip() for f in fields.split(",") if f.strip()}
+    return encode_json([{k: v for k, v in d.items() if k in field_names}
+                        for d in Event.to_json(events)])
+
+
+def projected(events: List[Event], fields: str) -> bytes:
+    return encode_json(project(events, Event, normalize_fields(fields)))
+
+
+def measure(encode, events, repeat: int) -> float:
+    encode(events)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        encode(events)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--fields", default="uid,title,started_at")
+    args = parser.parse_args()
+
+    events = make_events(args.events)
+    body = encode_json(events, List[Event])
+    assert body == response_model(events)
+    print(f"{args.events} events, {len(body) / 1024 / 1024:.1f} MiB, "
+          f"orjson {'installed' if encoder.orjson else 'not installed'}")
+
+    report([
+        ("response_model", response_model),
+        ("type_adapter", type_adapter),
+        ("encode_json", lambda events: encode_json(events, List[Event])),
+    ], events, args.repeat)
+
+    assert projected(events, args.fields) == \
+        to_json_prune(events, args.fields)
+    print(f"fields={args.fields}")
+    report([
+        ("to_json_prune", lambda events: to_json_prune(events, args.fields)),
+        ("project", lambda events: projected(events, args.fields)),
+    ], events, args.repeat)
+
+
+def report(encoders, events, repeat: int):
+    baseline = None
+    for name, encode in encoders:
+        seconds = measure(encode, events, repeat)
+        baseline = baseline or seconds
+        print(f"{name:>15}: {seconds * 1000:8.1f} ms "
+              f"({baseline / seconds:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,22 @@
+import asyncio
+import contextlib
+import json
 import unittest
 from unittest.mock import MagicMock, patch
 from datetime import datetime, timezone
+import httpx
 from app.providers.archive import ArchiveIndexRequest, ArchiveException
-from app.cache import EventRequestCache
+from app.providers.archive import ArchiveIndex, archive_indexes
+from app.providers.archive import AsyncArchiveIndexRequest
+from app.cache import CachedObjects, EventRequestCache
+
+
+def stream_response(response):
+    """A stand-in for async_client.stream() that answers with response."""
+    @contextlib.asynccontextmanager
+    async def stream(url, **kwargs):
+        yield response
+    return MagicMock(side_effect=stream)
 
 
 class TestArchiveIndexRequest(unittest.TestCase):
@@ -10,8 +24,8 @@ class TestArchiveIndexRequest(unittest.TestCase):
         archive_request = ArchiveIndexRequest(
             url="https://example.com/archive/index.json"
         )
-        archive_request._ArchiveIndexRequest__get_json = MagicMock(
-            return_value=self.__archive_index()
+        archive_request._ArchiveIndexRequest__get_index = MagicMock(
+            return_value=ArchiveIndex.from_json(self.__archive_index())
         )
 
         events = archive_request.get_events()
@@ -31,8 +45,8 @@ class TestArchiveIndexRequest(unittest.TestCase):
             url="https://example.com/archive/index.json",
             ym=["201205"]
         )
-        archive_request._ArchiveIndexRequest__get_json = MagicMock(
-            return_value=self.__archive_index()
+        archive_request._ArchiveIndexRequest__get_index = MagicMock(
+            return_value=ArchiveIndex.from_json(self.__archive_index())
         )
 
         events = archive_request.get_events()
@@ -48,8 +62,8 @@ class TestArchiveIndexRequest(unittest.TestCase):
             url="https://example.com/archive/index.json",
             ymd=["20140308"]
         )
-        archive_request._ArchiveIndexRequest__get_json = MagicMock(
-            return_value=self.__archive_index()
+        archive_request._ArchiveIndexRequest__get_index = MagicMock(
+            return_value=ArchiveIndex.from_json(self.__archive_index())
         )
 
         events = archive_request.get_events()
@@ -64,8 +78,8 @@ class TestArchiveIndexRequest(unittest.TestCase):
         archive_request = ArchiveIndexRequest(
             url="https://example.com/archive/index.json"
         )
-        archive_request._ArchiveIndexRequest__get_json = MagicMock(
-            return_value=self.__archive_index()
+        archive_request._ArchiveIndexRequest__get_index = MagicMock(
+            return_value=ArchiveIndex.from_json(self.__archive_index())
         )
 
         groups = archive_request.get_groups()
@@ -82,11 +96,109 @@ class TestArchiveIndexRequest(unittest.TestCase):
             "https://github.com/yuukis/yamanashi-event-archive"
         )
 
-    @patch("app.providers.archive.requests.get")
+    def test_get_events_by_group_key(self):
+        archive_request = ArchiveIndexRequest(
+            url="https://example.com/archive/index.json",
+            group_key="houtoupm"
+        )
+        archive_request._ArchiveIndexRequest__get_index = MagicMock(
+            return_value=ArchiveIndex.from_json(self.__archive_index())
+        )
+
+        events = archive_request.get_events()
+
+        self.assertEqual([e.group_key for e in events], ["houtoupm"])
+
+    def test_get_events_by_group_key_and_ym(self):
+        archive_request = ArchiveIndexRequest(
+            url="https://example.com/archive/index.json",
+            ym=["201205"], ymd=["20140308"], group_key="houtoupm"
+        )
+        archive_request._ArchiveIndexRequest__get_index = MagicMock(
+            return_value=ArchiveIndex.from_json(self.__archive_index())
+        )
+
+        events = archive_request.get_events()
+
+        self.assertEqual([e.started_at[:10] for e in events], ["2014-03-08"])
+
+    def test_get_events_does_not_repeat_day_inside_requested_month(self):
+        archive_request = ArchiveIndexRequest(
+            url="https://example.com/archive/index.json",
+            ym=["201205", "201403"], ymd=["20140308"]
+        )
+        archive_request._ArchiveIndexRequest__get_index = MagicMock(
+            return_value=ArchiveIndex.from_json(self.__archive_index())
+        )
+
+        events = archive_request.get_events()
+
+        self.assertEqual([e.started_at[:10] for e in events],
+                         ["2012-05-19", "2014-03-08"])
+
+    def test_cached_index_is_built_once_per_version(self):
+        cache = EventRequestCache(prefix="test_archive_memo_")
+        url = "https://example.com/archive/memo/index.json"
+        first = ArchiveIndexRequest(url=url, cache=cache)
+        first._ArchiveIndexRequest__get_index = MagicMock(
+            return_value=ArchiveIndex.from_json(self.__archive_index()))
+        first.get_events()[0].group_key = "relabeled"
+
+        second = ArchiveIndexRequest(url=url, ym=["201205"], cache=cache)
+        with patch("app.providers.archive.Event.from_json") as from_json, \
+                patch.object(cache, "get") as cache_get:
+            events = second.get_events()
+            groups = second.get_groups()
+
+        from_json.assert_not_called()
+        cache_get.assert_not_called()
+        self.assertEqual([e.group_key for e in events], ["yamanashi-web"])
+        self.assertEqual(len(groups), 2)
+        self.assertEqual(second.get_last_modified(),
+                         cache.peek({"archive_index_url": url})
+                         ["last_modified"])
+
+    def test_in_process_cache_keeps_index_unserialized(self):
+        cache = EventRequestCache(prefix="test_archive_objects_")
+        url = "https://example.com/archive/objects/index.json"
+        index = ArchiveIndex.from_json(self.__archive_index())
+        request = ArchiveIndexRequest(url=url, cache=cache)
+        request._ArchiveIndexRequest__get_index = MagicMock(
+            return_value=index)
+
+        with patch.object(ArchiveIndex, "to_content") as to_content:
+            request.get_events()
+
+        to_content.assert_not_called()
+        key = cache.generate_key({"archive_index_url": url})
+        content = cache._store[key + ":content"]
+        self.assertIsInstance(content, CachedObjects)
+        self.assertIs(content.items[0], index)
+        self.assertEqual(cache.peek_digest({"archive_index_url": url})
+                         ["digest"], index.content_digest())
+
+        # Rebuilt from the cache's JSON once the memo no longer has it.
+        archive_indexes.clear()
+        events = ArchiveIndexRequest(url=url, cache=cache).get_events()
+        self.assertEqual([e.uid for e in events],
+                         [e.uid for e in index.select([], [])])
+
+    def test_index_serializations_agree(self):
+        index = ArchiveIndex.from_json(self.__archive_index())
+        content = index.to_content()
+
+        self.assertEqual(json.dumps(ArchiveIndex.to_json([index]),
+                                    sort_keys=True), content)
+        self.assertEqual(index.content_digest(),
+                         EventRequestCache().content_digest(content))
+
+    @patch("app.providers.archive.session.get")
     def test_preload_keeps_archive_index_in_cache(self, mock_get):
         response = MagicMock()
         response.status_code = 200
-        response.json.return_value = self.__archive_index()
+        response.headers = {}
+        response.iter_content.return_value = [
+            json.dumps(self.__archive_index()).encode()]
         mock_get.return_value = response
 
         cache = EventRequestCache(prefix="test_archive_")
@@ -103,7 +215,96 @@ class TestArchiveIndexRequest(unittest.TestCase):
         self.assertEqual(len(groups), 2)
         self.assertEqual(mock_get.call_count, 1)
 
-    @patch("app.providers.archive.requests.get")
+    @patch("app.providers.archive.session.get")
+    def test_refetch_sends_validators_and_keeps_index_on_304(self, mock_get):
+        response = MagicMock()
+        response.status_code = 200
+        response.headers = {"ETag": '"v1"',
+                            "Last-Modified": "Tue, 30 Jun 2026 00:00:00 GMT"}
+        response.iter_content.return_value = [
+            json.dumps(self.__archive_index()).encode()]
+        mock_get.return_value = response
+        cache = EventRequestCache(prefix="test_archive_etag_")
+        url = "https://example.com/archive/index.json"
+        cache_key = {"archive_index_url": url}
+        ArchiveIndexRequest(url=url, cache=cache).get_events()
+        stored_last_modified = cache.peek(cache_key)["last_modified"]
+
+        key = cache.generate_key(cache_key) + ":content"
+        cache._expiry[key] = datetime.now(timezone.utc).timestamp() - 1
+        mock_get.return_value = MagicMock(status_code=304, headers={})
+        second = ArchiveIndexRequest(url=url, cache=cache)
+        events = second.get_events()
+
+        self.assertEqual(len(events), 2)
+        mock_get.assert_called_with(
+            url, headers={"If-None-Match": '"v1"',
+                          "If-Modified-Since": "Tue, 30 Jun 2026 00:00:00 GMT"},
+            stream=True, timeout=10)
+        self.assertEqual(second.get_last_modified(), stored_last_modified)
+        self.assertEqual(cache.ttl(cache_key), float("inf"))
+
+    @patch("app.providers.archive.session.get")
+    def test_index_is_parsed_from_the_response_stream(self, mock_get):
+        body = json.dumps(self.__archive_index(),
+                          ensure_ascii=False).encode()
+        response = MagicMock(status_code=200, headers={})
+        response.iter_content.return_value = [body[i:i + 7]
+                                              for i in range(0, len(body), 7)]
+        mock_get.return_value = response
+        cache = EventRequestCache(prefix="test_archive_stream_")
+        url = "https://example.com/archive/stream/index.json"
+
+        events = ArchiveIndexRequest(url=url, cache=cache).get_events()
+
+        response.json.assert_not_called()
+        response.close.assert_called_once()
+        self.assertEqual([e.group_name for e in events],
+                         ["山梨Web勉強会", "Houtou.pm"])
+        # Cached in compact form, and read back the same.
+        archive_indexes.clear()
+        cached = ArchiveIndexRequest(url=url, cache=cache)
+        self.assertEqual(cached.get_events(), events)
+        self.assertEqual(cached.get_groups()[0].archive_source,
+                         "yamanashi-event-archive")
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch("app.providers.archive.session.get")
+    def test_sharded_index_loads_only_the_years_requested(self, mock_get):
+        archive_index = self.__archive_index()
+        shards = {}
+        for event in archive_index.pop("events"):
+            year = event["started_at"][:4]
+            shards.setdefault(year, {"events": []})["events"].append(event)
+        archive_index["shards"] = [{"year": year, "url": f"{year}.json"}
+                                   for year in shards]
+        documents = {"https://example.com/archive/sharded/index.json":
+                     archive_index}
+        for year, shard in shards.items():
+            documents[f"https://example.com/archive/sharded/{year}.json"] = \
+                shard
+
+        def get(url, **kwargs):
+            response = MagicMock(status_code=200, headers={})
+            response.iter_content.return_value = [
+                json.dumps(documents[url]).encode()]
+            return response
+        mock_get.side_effect = get
+        cache = EventRequestCache(prefix="test_archive_sharded_")
+        url = "https://example.com/archive/sharded/index.json"
+
+        events = ArchiveIndexRequest(url=url, ym=["201403"],
+                                     cache=cache).get_events()
+
+        self.assertEqual([e.uid for e in events],
+                         ["houtoupm-2014-03-08-001@yamanashi-event-archive"])
+        self.assertEqual([c.args[0] for c in mock_get.call_args_list],
+                         [url, "https://example.com/archive/sharded/2014.json"])
+        self.assertEqual(len(ArchiveIndexRequest(url=url, cache=cache)
+                             .get_events()), 2)
+        self.assertEqual(mock_get.call_count, 3)
+
+    @patch("app.providers.archive.session.get")
     def test_get_events_http_error(self, mock_get):
         response = MagicMock()
         response.status_code = 404
@@ -120,9 +321,41 @@ class TestArchiveIndexRequest(unittest.TestCase):
         self.assertEqual(context.exception.message, "Failed to fetch archive index")
         mock_get.assert_called_once_with(
             "https://example.com/archive/index.json",
+            headers={},
+            stream=True,
             timeout=10
         )
 
+    def test_async_preload_keeps_archive_index_in_cache(self):
+        mock_stream = stream_response(httpx.Response(
+            200, json=self.__archive_index()))
+
+        cache = EventRequestCache(prefix="test_async_archive_")
+        url = "https://example.com/archive/index.json"
+
+        with patch("app.providers.archive.async_client.stream", mock_stream):
+            asyncio.run(
+                AsyncArchiveIndexRequest(url=url, cache=cache).preload())
+        archive_request = ArchiveIndexRequest(url=url, cache=cache)
+        events = archive_request.get_events()
+        groups = archive_request.get_groups()
+
+        self.assertEqual(len(events), 2)
+        self.assertEqual(len(groups), 2)
+        mock_stream.assert_called_once_with(url, headers={}, timeout=10)
+
+    def test_async_get_events_http_error(self):
+        archive_request = AsyncArchiveIndexRequest(
+            url="https://example.com/archive/index.json"
+        )
+
+        with self.assertRaises(ArchiveException) as context, \
+                patch("app.providers.archive.async_client.stream",
+                      stream_response(httpx.Response(404))):
+            asyncio.run(archive_request.get_events())
+
+        self.assertEqual(context.exception.status_code, 404)
+
     def test_get_events_preserves_last_modified_when_content_unchanged(self):
         # Archive caches never expire (ex=None), so the entry is
         # force-expired directly to simulate a refetch of the same index.
@@ -131,8 +364,8 @@ class TestArchiveIndexRequest(unittest.TestCase):
         cache_key = {"archive_index_url": url}
 
         first = ArchiveIndexRequest(url=url, cache=cache)
-        first._ArchiveIndexRequest__get_json = MagicMock(
-            return_value=self.__archive_index())
+        first._ArchiveIndexRequest__get_index = MagicMock(
+            return_value=ArchiveIndex.from_json(self.__archive_index()))
         first.get_events()
         # The cache truncates last_modified to whole seconds, so compare
         # against what was actually stored rather than the in-memory,
@@ -143,8 +376,8 @@ class TestArchiveIndexRequest(unittest.TestCase):
         cache._expiry[key] = datetime.now(timezone.utc).timestamp() - 1
 
         second = ArchiveIndexRequest(url=url, cache=cache)
-        second._ArchiveIndexRequest__get_json = MagicMock(
-            return_value=self.__archive_index())
+        second._ArchiveIndexRequest__get_index = MagicMock(
+            return_value=ArchiveIndex.from_json(self.__archive_index()))
         second.get_events()
 
         self.assertEqual(second.get_last_modified(), stored_last_modified)
@@ -155,8 +388,8 @@ class TestArchiveIndexRequest(unittest.TestCase):
         cache_key = {"archive_index_url": url}
 
         first = ArchiveIndexRequest(url=url, cache=cache)
-        first._ArchiveIndexRequest__get_json = MagicMock(
-            return_value=self.__archive_index())
+        first._ArchiveIndexRequest__get_index = MagicMock(
+            return_value=ArchiveIndex.from_json(self.__archive_index()))
         first.get_events()
         first_last_modified = first.get_last_modified()
 
@@ -179,8 +412,8 @@ class TestArchiveIndexRequest(unittest.TestCase):
         })
 
         second = ArchiveIndexRequest(url=url, cache=cache)
-        second._ArchiveIndexRequest__get_json = MagicMock(
-            return_value=changed_index)
+        second._ArchiveIndexRequest__get_index = MagicMock(
+            return_value=ArchiveIndex.from_json(changed_index))
         second.get_events()
         second_last_modified = second.get_last_modified()
 
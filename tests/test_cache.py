@@ -1,5 +1,8 @@
+import time
 import unittest
+from unittest.mock import patch
 from app.cache import EventRequestCache
+from app.models import Group
 from datetime import datetime, timezone
 
 
@@ -91,6 +94,15 @@ class TestEventRequestCache(unittest.TestCase):
         self.assertEqual(response["json"], {"key": "value"})
         self.assertEqual(response["last_modified"], dt)
 
+    def test_get_returns_digest_of_its_content(self):
+        self.cache.set({"param": "value"}, "first", ex=3600)
+        self.cache.set({"param": "value"}, "second", ex=3600)
+
+        response = self.cache.get({"param": "value"})
+        self.assertEqual(response["content"], "second")
+        self.assertEqual(response["digest"],
+                         self.cache.content_digest("second"))
+
     def test_get_returns_none_after_expiry(self):
         self.cache._store = {}
         self.cache._expiry = {}
@@ -148,6 +160,242 @@ class TestEventRequestCache(unittest.TestCase):
         response = self.cache.peek({"param": "value"})
         self.assertEqual(response["json"], {"key": "value"})
 
+    def test_ttl(self):
+        self.cache._store = {}
+        self.cache._expiry = {}
+
+        self.assertIsNone(self.cache.ttl({"param": "value"}))
+
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=3600)
+        self.assertTrue(3599 < self.cache.ttl({"param": "value"}) <= 3600)
+
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=-10)
+        self.assertLess(self.cache.ttl({"param": "value"}), 0)
+
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=None)
+        self.assertEqual(self.cache.ttl({"param": "value"}), float("inf"))
+
+    def test_renew_extends_stale_entry_as_is(self):
+        dt = datetime.fromtimestamp(123, timezone.utc)
+        self.cache.set({"param": "value"}, {"key": "value"}, last_modified=dt,
+                       ex=-1)
+
+        response = self.cache.renew({"param": "value"}, ex=3600)
+
+        self.assertEqual(response["json"], {"key": "value"})
+        self.assertEqual(response["last_modified"], dt)
+        self.assertTrue(3599 < self.cache.ttl({"param": "value"}) <= 3600)
+        self.assertEqual(self.cache.get({"param": "value"})["last_modified"],
+                         dt)
+
+    def test_renew_without_content_returns_none(self):
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=-1)
+        self.cache.sweep()
+
+        self.assertIsNone(self.cache.renew({"param": "value"}))
+        self.assertIsNone(self.cache.renew({"param": "other"}))
+
+    def test_set_evicts_least_recently_used_over_budget(self):
+        cache = EventRequestCache(prefix="request_")
+        cache.set({"param": 1}, {"key": "x" * 100}, ex=3600)
+        entry_size = cache.stats()["bytes"]
+        cache.max_bytes = entry_size * 2
+
+        cache.set({"param": 2}, {"key": "x" * 100}, ex=3600)
+        cache.get({"param": 1})  # now 2 is the least recently used
+        cache.set({"param": 3}, {"key": "x" * 100}, ex=3600)
+
+        self.assertIsNotNone(cache.get({"param": 1}))
+        self.assertIsNone(cache.peek({"param": 2}))
+        self.assertIsNotNone(cache.get({"param": 3}))
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertLessEqual(stats["bytes"], cache.max_bytes)
+
+    def test_set_never_evicts_pinned_entries(self):
+        cache = EventRequestCache(prefix="request_")
+        cache.set({"param": "pinned"}, {"key": "x" * 100}, ex=None)
+        cache.max_bytes = cache.stats()["bytes"] + 1
+
+        cache.set({"param": 1}, {"key": "x" * 100}, ex=3600)
+        cache.set({"param": 2}, {"key": "x" * 100}, ex=3600)
+
+        self.assertIsNotNone(cache.get({"param": "pinned"}))
+        self.assertIsNone(cache.peek({"param": 1}))
+        self.assertIsNotNone(cache.get({"param": 2}))
+
+    def test_set_replacing_entry_does_not_double_count(self):
+        cache = EventRequestCache(prefix="request_")
+        dt = datetime.fromtimestamp(123, timezone.utc)
+
+        cache.set({"param": "value"}, {"key": "value"}, last_modified=dt)
+        size = cache.stats()["bytes"]
+        cache.set({"param": "value"}, {"key": "value"}, last_modified=dt)
+
+        self.assertEqual(cache.stats()["bytes"], size)
+        self.assertEqual(cache.stats()["entries"], 1)
+
+    def test_sweep_reclaims_entries_stale_beyond_retention(self):
+        cache = EventRequestCache(prefix="request_")
+        already_stale_ex = -(EventRequestCache.STALE_RETENTION_SECONDS + 1)
+        cache.set({"param": "old"}, {"key": "value"}, ex=already_stale_ex)
+        cache.set({"param": "pinned"}, {"key": "value"}, ex=None)
+
+        self.assertEqual(cache.sweep(), 1)
+
+        key = cache.generate_key({"param": "old"})
+        self.assertNotIn(key + ":content", cache._store)
+        self.assertIsNone(cache.peek_digest({"param": "old"}))
+        self.assertIsNotNone(cache.get({"param": "pinned"}))
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertEqual(cache.stats()["reclaimed"], 1)
+
+    def test_sweep_drops_expired_content_but_keeps_digest(self):
+        cache = EventRequestCache(prefix="request_")
+        dt = datetime.fromtimestamp(123, timezone.utc)
+        cache.set({"param": "value"}, {"key": "value" * 100},
+                  last_modified=dt, ex=-1)
+        size = cache.stats()["bytes"]
+
+        self.assertEqual(cache.sweep(), 1)
+
+        self.assertIsNone(cache.peek({"param": "value"}))
+        self.assertEqual(cache.peek_digest({"param": "value"}), {
+            "digest": cache.content_digest({"key": "value" * 100}),
+            "last_modified": dt
+        })
+        self.assertLess(cache.stats()["bytes"], size)
+        self.assertEqual(cache.stats()["trimmed"], 1)
+
+    def test_peek_digest(self):
+        self.cache._store = {}
+        self.cache._expiry = {}
+
+        self.assertIsNone(self.cache.peek_digest({"param": "value"}))
+
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=3600)
+        self.assertEqual(self.cache.peek_digest({"param": "value"})["digest"],
+                         self.cache.content_digest({"key": "value"}))
+        self.assertNotEqual(self.cache.content_digest({"key": "value"}),
+                            self.cache.content_digest({"key": "other"}))
+
+    def test_peek_digest_purges_entry_stale_beyond_retention(self):
+        self.cache._store = {}
+        self.cache._expiry = {}
+
+        already_stale_ex = -(EventRequestCache.STALE_RETENTION_SECONDS + 1)
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=already_stale_ex)
+
+        self.assertIsNone(self.cache.peek_digest({"param": "value"}))
+
+    def test_add_only_stores_when_absent_or_expired(self):
+        self.assertTrue(self.cache.add("lock", "1", ex=60))
+        self.assertFalse(self.cache.add("lock", "1", ex=60))
+
+        self.assertTrue(self.cache.add("expired-lock", "1", ex=-1))
+        self.assertTrue(self.cache.add("expired-lock", "1", ex=60))
+
+    def test_delete_drops_entry_and_releases_add(self):
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=3600)
+        self.assertTrue(self.cache.add("lock", "1", ex=60))
+
+        self.cache.delete({"param": "value"})
+        self.cache.delete("lock")
+
+        self.assertIsNone(self.cache.peek({"param": "value"}))
+        self.assertIsNone(self.cache.peek_digest({"param": "value"}))
+        self.assertTrue(self.cache.add("lock", "1", ex=60))
+        self.assertEqual(self.cache.stats()["bytes"], 0)
+
+    def test_take_request_token(self):
+        self.assertEqual(self.cache.take_request_token(1.0, 1), 0)
+
+        wait_sec = self.cache.take_request_token(1.0, 1)
+        self.assertTrue(0 < wait_sec <= 1)
+
+    def test_take_request_token_refills_up_to_burst(self):
+        self.assertEqual(self.cache.take_request_token(10.0, 2), 0)
+        self.assertEqual(self.cache.take_request_token(10.0, 2), 0)
+        self.assertGreater(self.cache.take_request_token(10.0, 2), 0)
+
+        time.sleep(0.1)
+        self.assertEqual(self.cache.take_request_token(10.0, 2), 0)
+
+    def test_get_object_hands_out_same_objects(self):
+        groups = Group.from_json([{"key": "a", "title": "A"},
+                                  {"key": "b", "title": "B"}])
+        dt = datetime.fromtimestamp(123, timezone.utc)
+        self.cache.set_object({"param": "value"}, groups, Group,
+                              last_modified=dt, ex=3600)
+
+        first = self.cache.get_object({"param": "value"}, Group)
+        second = self.cache.get_object({"param": "value"}, Group)
+
+        self.assertIs(first["items"], second["items"])
+        self.assertEqual([g.key for g in first["items"]], ["a", "b"])
+        self.assertEqual(first["last_modified"], dt)
+
+    def test_get_object_decodes_json_entry_once(self):
+        self.cache.set({"param": "value"}, [{"key": "a", "title": "A"}],
+                       ex=3600)
+
+        first = self.cache.get_object({"param": "value"}, Group)
+        second = self.cache.get_object({"param": "value"}, Group)
+
+        self.assertEqual(first["items"][0].key, "a")
+        self.assertIs(first["items"], second["items"])
+
+    def test_get_object_returns_none_after_expiry(self):
+        groups = Group.from_json([{"key": "a", "title": "A"}])
+        self.cache.set_object({"param": "value"}, groups, Group, ex=-1)
+
+        self.assertIsNone(self.cache.get_object({"param": "value"}, Group))
+
+    def test_get_serializes_object_entry(self):
+        groups = Group.from_json([{"key": "a", "title": "A"}])
+        self.cache.set_object({"param": "value"}, groups, Group, ex=-1)
+
+        response = self.cache.peek({"param": "value"})
+
+        self.assertEqual(response["json"], Group.to_json(groups))
+
+    def test_get_version_changes_when_entry_is_stored_again(self):
+        dt = datetime.fromtimestamp(123, timezone.utc)
+        self.cache.set({"param": "value"}, {"key": "value"},
+                       last_modified=dt, ex=3600)
+
+        version = self.cache.get_version({"param": "value"})
+        self.assertEqual(version["last_modified"], dt)
+
+        time.sleep(0.01)
+        self.cache.set_object({"param": "value"}, [], Group,
+                              last_modified=dt, ex=3600)
+
+        self.assertNotEqual(
+            self.cache.get_version({"param": "value"})["version"],
+            version["version"])
+
+    def test_get_version_is_none_when_get_would_miss(self):
+        self.assertIsNone(self.cache.get_version({"param": "value"}))
+
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=-1)
+
+        self.assertIsNone(self.cache.get_version({"param": "value"}))
+
+    def test_get_version_is_none_when_entry_goes_concurrently(self):
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=3600)
+        key = self.cache.generate_key({"param": "value"})
+
+        def evicted_after_check(key_content):
+            # As if another thread evicted the entry right after the check.
+            self.cache._delete(key)
+            return True
+
+        with patch.object(self.cache, "_is_valid",
+                          side_effect=evicted_after_check):
+            self.assertIsNone(self.cache.get_version({"param": "value"}))
+
     def test_generate_key(self):
         params = {"param": "value"}
 
@@ -1,8 +1,16 @@
+import asyncio
+import time
 import unittest
-from unittest.mock import MagicMock
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import datetime, timezone
+import httpx
+import requests
 from app.cache import EventRequestCache
 from app.providers.connpass import ConnpassEventRequest, ConnpassGroupRequest
+from app.providers.connpass import AsyncConnpassEventRequest
+from app.providers.connpass import AsyncConnpassGroupRequest
+from app.providers.connpass import ConnpassException, CONNPASS_REQUEST_TIMEOUT
 
 
 class TestConnpassEventRequest(unittest.TestCase):
@@ -383,6 +391,79 @@ class TestConnpassEventRequest(unittest.TestCase):
         }
         return mock_response
 
+    def _make_updated_page_response(self, updated_ats, results_returned,
+                                    address=None):
+        response = self._make_page_response(
+            len(updated_ats), results_returned, results_returned)
+        items = response.json.return_value['events']
+        for item, updated_at in zip(items, updated_ats):
+            item['updated_at'] = updated_at
+            item['address'] = address
+        return response
+
+    def test_get_updated_events_stops_at_watermark(self):
+        connpass_request = ConnpassEventRequest(subdomain=['test'],
+                                                ym=['202401'])
+        mock_get = MagicMock(return_value=self._make_updated_page_response(
+            ['2024-03-02T00:00:00+09:00', '2024-03-01T00:00:00+09:00',
+             '2024-02-01T00:00:00+09:00'], 100))
+        connpass_request._ConnpassEventRequest__get = mock_get
+
+        updated = connpass_request.get_updated_events(
+            '2024-03-01T00:00:00+09:00')
+
+        self.assertEqual(sorted(updated), ['event_0@connpass.com',
+                                           'event_1@connpass.com'])
+        mock_get.assert_called_once()
+        sent_params = mock_get.call_args[0][0]
+        self.assertEqual(sent_params['order'], 1)
+        self.assertNotIn('ym', sent_params)
+
+    def test_get_updated_events_gives_up_after_max_pages(self):
+        connpass_request = ConnpassEventRequest(subdomain=['test'])
+        mock_get = MagicMock(return_value=self._make_updated_page_response(
+            ['2024-03-02T00:00:00+09:00'] * 100, 100))
+        connpass_request._ConnpassEventRequest__get = mock_get
+
+        updated = connpass_request.get_updated_events(
+            '2024-03-01T00:00:00+09:00', max_pages=2)
+
+        self.assertIsNone(updated)
+        self.assertEqual(mock_get.call_count, 2)
+
+    def test_get_updated_events_marks_events_leaving_prefecture(self):
+        connpass_request = ConnpassEventRequest(prefecture=['山梨県'])
+        connpass_request._ConnpassEventRequest__get = MagicMock(
+            return_value=self._make_updated_page_response(
+                ['2024-03-02T00:00:00+09:00'], 1, address='東京都'))
+
+        updated = connpass_request.get_updated_events(
+            '2024-03-01T00:00:00+09:00')
+
+        self.assertEqual(updated, {'event_0@connpass.com': None})
+
+    def test_get_events_coalesces_concurrent_page_fetches(self):
+        response = MagicMock()
+        response.json.return_value = {'events': [], 'results_returned': 0}
+
+        def slow_get(params):
+            time.sleep(0.1)
+            return response
+
+        cache = EventRequestCache(prefix="test_connpass_coalesce_")
+        requests = [ConnpassEventRequest(subdomain=['test'], cache=cache)
+                    for _ in range(3)]
+        for r in requests:
+            r._ConnpassEventRequest__get = MagicMock(side_effect=slow_get)
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            list(executor.map(lambda r: r.get_events(), requests))
+
+        calls = sum(r._ConnpassEventRequest__get.call_count for r in requests)
+        self.assertEqual(calls, 1)
+        # Every caller still picks up the page's last_modified.
+        self.assertEqual(len({r.get_last_modified() for r in requests}), 1)
+
     def test_get_events_preserves_last_modified_when_content_unchanged(self):
         # cache_ttl=-1 means the inner cache entry is already expired by the
         # time the next call checks it, simulating the normal 60-minute
@@ -423,6 +504,26 @@ class TestConnpassEventRequest(unittest.TestCase):
 
         self.assertNotEqual(first_last_modified, second_last_modified)
 
+    @patch("app.providers.connpass.session.get")
+    def test_get_events_requests_with_timeout(self, mock_get):
+        mock_get.return_value = MagicMock(status_code=200)
+        mock_get.return_value.json.return_value = {
+            'events': [], 'results_returned': 0}
+
+        ConnpassEventRequest().get_events()
+
+        self.assertEqual(mock_get.call_args.kwargs["timeout"],
+                         CONNPASS_REQUEST_TIMEOUT)
+
+    @patch("app.providers.connpass.session.get")
+    def test_get_events_timeout_raises_connpass_exception(self, mock_get):
+        mock_get.side_effect = requests.Timeout("read timed out")
+
+        with self.assertRaises(ConnpassException) as context:
+            ConnpassEventRequest().get_events()
+
+        self.assertEqual(context.exception.status_code, 500)
+
 
 class TestConnpassGroupRequest(unittest.TestCase):
 
@@ -604,5 +705,144 @@ class TestConnpassGroupRequest(unittest.TestCase):
         self.assertEqual(second.get_last_modified(), stored_last_modified)
 
 
+class TestAsyncConnpassRequest(unittest.IsolatedAsyncioTestCase):
+
+    def __event_json(self, event_id):
+        return {
+            'id': event_id,
+            'title': f'Event {event_id}',
+            'catch': '',
+            'hash_tag': '',
+            'image_url': None,
+            'limit': None,
+            'accepted': 0,
+            'waiting': 0,
+            'owner_id': 1,
+            'owner_nickname': 'test',
+            'owner_display_name': 'Test',
+            'lat': None,
+            'lon': None,
+            'description': '',
+            'event_type': 'participation',
+            'url': 'https://test.connpass.com',
+            'started_at': '2020-01-01T00:00:00+09:00',
+            'ended_at': '2020-01-01T00:00:00+09:00',
+            'updated_at': '2020-01-01T00:00:00+09:00',
+            'open_status': 'preopen',
+            'address': 'Yamanashi, Japan',
+            'place': 'Yamanashi, Japan',
+            'group': {
+                'id': 1234,
+                'subdomain': 'test',
+                'title': 'Test group',
+                'url': 'https://test.connpass.com'
+            }
+        }
+
+    @patch("app.providers.connpass.async_client.get", new_callable=AsyncMock)
+    async def test_get_events(self, mock_get):
+        mock_get.return_value = httpx.Response(200, json={
+            'events': [self.__event_json(1), self.__event_json(2)],
+            'results_returned': 2
+        })
+
+        cache = EventRequestCache(prefix="test_async_connpass_")
+        connpass_request = AsyncConnpassEventRequest(cache=cache)
+
+        events = await connpass_request.get_events()
+
+        self.assertEqual([e.event_id for e in events], [1, 2])
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(mock_get.call_args.kwargs["timeout"],
+                         CONNPASS_REQUEST_TIMEOUT)
+
+        # The second call is served from the cache shared with the sync class.
+        sync_events = ConnpassEventRequest(cache=cache).get_events()
+        self.assertEqual([e.event_id for e in sync_events], [1, 2])
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch("app.providers.connpass.async_client.get", new_callable=AsyncMock)
+    @patch("app.providers.connpass.request_limiter.acquire_async",
+           new_callable=AsyncMock)
+    async def test_get_events_paced_by_shared_limiter(self, mock_acquire,
+                                                       mock_get):
+        mock_get.return_value = httpx.Response(200, json={
+            'events': [], 'results_returned': 0
+        })
+
+        cache = EventRequestCache(prefix="test_async_connpass_paced_")
+        await AsyncConnpassEventRequest(cache=cache).get_events()
+
+        mock_acquire.assert_awaited_once_with(cache)
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch("app.providers.connpass.async_client.get", new_callable=AsyncMock)
+    async def test_get_events_page(self, mock_get):
+        mock_get.return_value = httpx.Response(200, json={
+            'events': [self.__event_json(i) for i in range(1, 4)],
+            'results_returned': 3,
+            'results_available': 3
+        })
+
+        connpass_request = AsyncConnpassEventRequest()
+        events = await connpass_request.get_events_page(2, 1)
+
+        self.assertEqual([e.event_id for e in events], [2])
+        self.assertEqual(connpass_request.get_total_available(), 3)
+
+    async def test_get_events_coalesces_concurrent_page_fetches(self):
+        async def slow_get(url, **kwargs):
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={'events': [],
+                                             'results_returned': 0})
+
+        cache = EventRequestCache(prefix="test_async_connpass_coalesce_")
+        requests = [AsyncConnpassEventRequest(subdomain=['test'], cache=cache)
+                    for _ in range(3)]
+        with patch("app.providers.connpass.async_client.get",
+                   new_callable=AsyncMock, side_effect=slow_get) as mock_get:
+            await asyncio.gather(*(r.get_events() for r in requests))
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(len({r.get_last_modified() for r in requests}), 1)
+
+    @patch("app.providers.connpass.async_client.get", new_callable=AsyncMock)
+    async def test_get_events_http_error(self, mock_get):
+        mock_get.side_effect = httpx.ConnectError("connection refused")
+
+        connpass_request = AsyncConnpassEventRequest()
+
+        with self.assertRaises(ConnpassException) as context:
+            await connpass_request.get_events()
+
+        self.assertEqual(context.exception.status_code, 500)
+
+    @patch("app.providers.connpass.async_client.get", new_callable=AsyncMock)
+    async def test_get_groups(self, mock_get):
+        mock_get.return_value = httpx.Response(200, json={
+            'groups': [{
+                'id': 1234,
+                'subdomain': 'test',
+                'title': 'Test group',
+                'sub_title': 'Test',
+                'url': 'https://test.connpass.com',
+                'description': '',
+                'owner_text': '',
+                'image_url': 'https://test.connpass.com/image.png',
+                'website_url': '',
+                'website_name': '',
+                'twitter_username': '',
+                'facebook_url': '',
+                'member_users_count': 1
+            }],
+            'results_returned': 1
+        })
+
+        groups = await AsyncConnpassGroupRequest().get_groups()
+
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0].key, 'test')
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,126 @@
+import dataclasses
+import json
+import unittest
+from typing import List
+from types import SimpleNamespace
+from unittest.mock import patch
+from pydantic import TypeAdapter
+from app.encoder import encode_json, normalize_fields, project
+from app.models import Event, Group, EventsSummary, YearSummary
+from app.models import GroupActivity, HeatmapBucket
+from app.models import GroupSummary, GroupYearlyActivity
+
+
+def response_model_json(content, response_type) -> bytes:
+    """What FastAPI sends for content under response_model=response_type."""
+    adapter = TypeAdapter(response_type)
+    if dataclasses.is_dataclass(content):
+        content = dataclasses.asdict(content)
+    elif isinstance(content, list):
+        content = [dataclasses.asdict(item) for item in content]
+    validated = adapter.validate_python(content)
+    return json.dumps(adapter.dump_python(validated, mode="json"),
+                      ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+EVENTS = Event.from_json([
+    {
+        "uid": "uid1", "event_id": 1, "title": "山梨 \"Tech\" 勉強会",
+        "event_url": "https://example.com/1",
+        "started_at": "2024-01-01T10:00:00+09:00",
+        "ended_at": "2024-01-01T12:00:00+09:00",
+        "updated_at": "2024-01-01T00:00:00+09:00", "open_status": "open",
+        "limit": 20, "description": "<p>説明\n </p>",
+        "keywords": ["python", "山梨"], "source": "connpass",
+    },
+    {
+        "uid": "uid2", "title": "Event", "event_url": "https://example.com/2",
+        "started_at": "2024-01-02T10:00:00+09:00",
+        "ended_at": "2024-01-02T12:00:00+09:00",
+        "updated_at": "2024-01-02T00:00:00+09:00", "open_status": "close",
+    },
+])
+
+
+class TestEncodeJson(unittest.TestCase):
+
+    def assert_encodes_like_response_model(self, content, response_type):
+        expected = response_model_json(content, response_type)
+        self.assertEqual(encode_json(content, response_type), expected)
+        with patch("app.encoder.orjson", None):
+            self.assertEqual(encode_json(content, response_type), expected)
+
+    def test_events(self):
+        self.assert_encodes_like_response_model(EVENTS, List[Event])
+
+    def test_groups(self):
+        groups = Group.from_json([{"key": "g", "title": "グループ",
+                                   "member_users_count": 3}])
+        self.assert_encodes_like_response_model(groups, List[Group])
+
+    def test_events_summary(self):
+        summary = EventsSummary(
+            from_year=2023, to_year=2024, granularity="month",
+            years=[YearSummary(year=2024, event_count=1, groups=[
+                GroupActivity(key="g", name="グループ", image_url=None,
+                              url=None, event_count=1)])],
+            heatmap=[HeatmapBucket(period="2024-01", count=1)])
+        self.assert_encodes_like_response_model(summary, EventsSummary)
+
+    def test_plain_json_data(self):
+        content = [{"uid": "uid1", "title": "山梨", "limit": None}]
+        expected = json.dumps(content, ensure_ascii=False,
+                              separators=(",", ":")).encode("utf-8")
+
+        self.assertEqual(encode_json(content), expected)
+        with patch("app.encoder.orjson", None):
+            self.assertEqual(encode_json(content), expected)
+
+
+
+class TestProject(unittest.TestCase):
+
+    def test_normalize_fields(self):
+        self.assertEqual(normalize_fields(" title,uid,,title"),
+                         ("title", "uid"))
+        self.assertIsNone(normalize_fields(" , "))
+        self.assertIsNone(normalize_fields(None))
+
+    def test_project_keeps_model_field_order_and_drops_unknown(self):
+        projected = project(EVENTS, Event,
+                            normalize_fields("title,unknown,uid"))
+
+        self.assertEqual(projected, [
+            {"uid": "uid1", "title": "山梨 \"Tech\" 勉強会"},
+            {"uid": "uid2", "title": "Event"}])
+        self.assertEqual(list(projected[0]), ["uid", "title"])
+        self.assertEqual(project(EVENTS, Event, ("unknown",)), [{}, {}])
+        self.assertEqual(project(EVENTS, Event, ("uid",)),
+                         [{"uid": "uid1"}, {"uid": "uid2"}])
+
+    def test_project_reads_only_requested_attributes(self):
+        # No description (or anything else) to read.
+        item = SimpleNamespace(uid="uid1", title="Event",
+                               started_at="2024-01-01T10:00:00+09:00")
+
+        projected = project([item], Event,
+                            normalize_fields("uid,title,started_at"))
+
+        self.assertEqual(projected, [vars(item)])
+
+    def test_encode_projected_nested_dataclasses(self):
+        summary = GroupSummary(key="g", name="グループ", image_url=None,
+                               url=None, start_year=2024,
+                               years=[GroupYearlyActivity(year=2024,
+                                                          event_count=2)])
+        projected = project([summary], GroupSummary, ("key", "years"))
+        expected = b'[{"key":"g","years":[{"year":2024,"event_count":2}]}]'
+
+        self.assertEqual(encode_json(projected), expected)
+        with patch("app.encoder.orjson", None):
+            self.assertEqual(encode_json(projected), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
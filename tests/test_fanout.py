@@ -0,0 +1,52 @@
+import threading
+import time
+import unittest
+from app.fanout import FanOutExecutor, FanOutTimeout
+
+
+class TestFanOutExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = FanOutExecutor(max_workers=4)
+
+    def test_run_returns_results_in_task_order(self):
+        def make_task(value, delay):
+            def task():
+                time.sleep(delay)
+                return value
+            return task
+
+        results = self.executor.run([make_task("slow", 0.05),
+                                     make_task("fast", 0)])
+
+        self.assertEqual(results, ["slow", "fast"])
+
+    def test_run_runs_tasks_concurrently(self):
+        barrier = threading.Barrier(3, timeout=1)
+
+        # Would time out on the barrier if the tasks ran one at a time.
+        results = self.executor.run([barrier.wait for _ in range(3)],
+                                    timeout=2)
+
+        self.assertEqual(len(results), 3)
+
+    def test_run_raises_earliest_exception_in_task_order(self):
+        def fail_late():
+            time.sleep(0.05)
+            raise ValueError("first")
+
+        def fail_early():
+            raise KeyError("second")
+
+        with self.assertRaises(ValueError):
+            self.executor.run([fail_late, fail_early])
+
+    def test_run_raises_timeout_past_deadline(self):
+        with self.assertRaises(FanOutTimeout) as context:
+            self.executor.run([lambda: time.sleep(0.5)], timeout=0.05)
+
+        self.assertEqual(context.exception.timeout, 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
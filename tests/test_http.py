@@ -0,0 +1,74 @@
+import asyncio
+import unittest
+import httpx
+from app.providers.http import AsyncHttpClient
+
+
+class TestAsyncHttpClient(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    def __use_transport(self, handler):
+        self.client._client = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler))
+
+    async def test_get_reuses_one_pooled_client(self):
+        self.client = AsyncHttpClient()
+
+        first = self.client._get_client()
+        second = self.client._get_client()
+
+        self.assertIs(first, second)
+
+    async def test_get_passes_params_and_headers(self):
+        self.client = AsyncHttpClient()
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(200, text="ok")
+
+        self.__use_transport(handler)
+
+        response = await self.client.get("https://example.com/path",
+                                         params={"q": "1"},
+                                         headers={"User-Agent": "test"})
+
+        self.assertEqual(response.text, "ok")
+        self.assertEqual(str(seen[0].url), "https://example.com/path?q=1")
+        self.assertEqual(seen[0].headers["User-Agent"], "test")
+
+    async def test_get_caps_concurrent_requests_per_host(self):
+        self.client = AsyncHttpClient(max_connections_per_host=2)
+        in_flight = {"example.com": 0, "example.org": 0}
+        peak = {"example.com": 0, "example.org": 0}
+
+        async def handler(request):
+            host = request.url.host
+            in_flight[host] += 1
+            peak[host] = max(peak[host], in_flight[host])
+            await asyncio.sleep(0.01)
+            in_flight[host] -= 1
+            return httpx.Response(200)
+
+        self.__use_transport(handler)
+
+        await asyncio.gather(
+            *(self.client.get("https://example.com/") for _ in range(6)),
+            *(self.client.get("https://example.org/") for _ in range(2)))
+
+        self.assertEqual(peak["example.com"], 2)
+        self.assertEqual(peak["example.org"], 2)
+
+    async def test_aclose_resets_client(self):
+        self.client = AsyncHttpClient()
+        self.client._get_client()
+
+        await self.client.aclose()
+
+        self.assertIsNone(self.client._client)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,13 @@
+import asyncio
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
+import httpx
+import requests
 from app.cache import EventRequestCache
-from app.providers.icalendar import IcalEventRequest
+from app.providers.icalendar import IcalEventRequest, AsyncIcalEventRequest
+from app.providers.icalendar import ICAL_REQUEST_TIMEOUT
+from app.providers.icalendar import IcalException, ParsedFeed
+from app.providers.icalendar import IcalCalendar
 from datetime import datetime, timezone
 
 
@@ -190,6 +196,89 @@ END:VEVENT
 END:VCALENDAR
 """.encode("utf-8")
 
+    def _request(self, content, **kwargs):
+        ical_request = IcalEventRequest(url="http://example.com/memo.ics",
+                                        key="test_key", **kwargs)
+        ical_request._IcalEventRequest__get_content = MagicMock(
+            return_value=content)
+        return ical_request
+
+    def test_get_events_parses_same_content_once(self):
+        content = self._make_ical_content("MEMO EVENT")
+
+        with patch("app.providers.icalendar.IcalCalendar.from_ical",
+                   wraps=IcalCalendar.from_ical) as from_ical:
+            first = self._request(content).get_events()
+            first[0].title = "relabeled"
+            second = self._request(content, ym=["202404"]).get_events()
+            other_key = IcalEventRequest(url="http://example.com/memo.ics",
+                                         key="other_key")
+            other_key._IcalEventRequest__get_content = MagicMock(
+                return_value=content)
+            third = other_key.get_events()
+
+        self.assertEqual(from_ical.call_count, 2)
+        self.assertEqual(second[0].title, "MEMO EVENT")
+        self.assertEqual(third[0].group_key, "other_key")
+
+    def test_cache_hit_is_memoized_by_stored_digest(self):
+        cache = EventRequestCache(prefix="test_ical_memo_digest_")
+        content = self._make_ical_content("DIGEST EVENT")
+        self._request(content, cache=cache).get_events()
+
+        with patch("app.providers.icalendar.hashlib") as hashlib, \
+                patch("app.providers.icalendar.IcalCalendar.from_ical") \
+                as from_ical:
+            events = self._request(content, cache=cache).get_events()
+
+        hashlib.sha256.assert_not_called()
+        from_ical.assert_not_called()
+        self.assertEqual([e.title for e in events], ["DIGEST EVENT"])
+
+    def test_cache_hit_is_memoized_by_digest_read_with_content(self):
+        cache = EventRequestCache(prefix="test_ical_memo_replaced_")
+        old_content = self._make_ical_content("OLD EVENT")
+        self._request(old_content, cache=cache).get_events()
+        stale = cache.peek_digest("http://example.com/memo.ics")
+
+        # Replaced upstream since; a digest read apart from the content
+        # would still name the old feed.
+        new_content = self._make_ical_content("NEW EVENT")
+        cache.set("http://example.com/memo.ics", new_content.decode("utf-8"))
+        with patch.object(cache, "peek_digest", return_value=stale):
+            events = self._request(new_content, cache=cache).get_events()
+
+        self.assertEqual([e.title for e in events], ["NEW EVENT"])
+
+    @patch("app.providers.icalendar.datetime")
+    def test_memoized_events_recompute_open_status(self, mock_datetime):
+        content = self._make_ical_content("STATUS EVENT")
+
+        mock_datetime.now.return_value = datetime(2024, 3, 1)
+        before = self._request(content).get_events()
+        mock_datetime.now.return_value = datetime(2024, 5, 1)
+        after = self._request(content).get_events()
+
+        self.assertEqual(before[0].open_status, "preopen")
+        self.assertEqual(after[0].open_status, "close")
+
+    def test_parsed_feed_select_uses_month_index(self):
+        def entry(uid, started_at):
+            start = datetime.fromisoformat(started_at)
+            return MagicMock(uid=uid, started_at=started_at), start, start
+
+        feed = ParsedFeed([entry("b", "2024-05-02T10:00:00"),
+                           entry("a", "2024-04-01T10:00:00"),
+                           entry("c", "2024-04-20T10:00:00")])
+
+        def uids(ym, ymd):
+            return [e[1].uid for e in feed.select(ym, ymd)]
+
+        self.assertEqual(uids([], []), ["b", "a", "c"])
+        self.assertEqual(uids(["202404"], []), ["a", "c"])
+        self.assertEqual(uids([], ["20240420", "20240502"]), ["b", "c"])
+        self.assertEqual(uids(["202406"], []), [])
+
     def test_get_events_preserves_last_modified_when_content_unchanged(self):
         # No configurable TTL here, so the cache entry is force-expired
         # directly to simulate the normal periodic refetch.
@@ -214,6 +303,29 @@ END:VCALENDAR
 
         self.assertEqual(second.get_last_modified(), stored_last_modified)
 
+    def test_get_events_preserves_last_modified_after_sweep(self):
+        cache = EventRequestCache()
+        url = "http://example.com/ical"
+        content = self._make_ical_content("EVENT 1")
+
+        first = IcalEventRequest(url=url, key="test_key", cache=cache)
+        first._IcalEventRequest__get_content = MagicMock(return_value=content)
+        first.get_events()
+        stored_last_modified = cache.peek(url)["last_modified"]
+
+        key = cache.generate_key(url)
+        expired = datetime.now(timezone.utc).timestamp() - 1
+        cache._expiry[key + ":content"] = expired
+        cache._expiry[key + ":digest"] = expired
+        cache.sweep()
+        self.assertIsNone(cache.peek(url))
+
+        second = IcalEventRequest(url=url, key="test_key", cache=cache)
+        second._IcalEventRequest__get_content = MagicMock(return_value=content)
+        second.get_events()
+
+        self.assertEqual(second.get_last_modified(), stored_last_modified)
+
     def test_get_events_updates_last_modified_when_content_changes(self):
         cache = EventRequestCache()
         url = "http://example.com/ical"
@@ -234,3 +346,89 @@ END:VCALENDAR
         second_last_modified = second.get_last_modified()
 
         self.assertNotEqual(first_last_modified, second_last_modified)
+
+    @patch("app.providers.icalendar.session.get")
+    def test_get_events_revalidates_with_etag(self, mock_get):
+        cache = EventRequestCache(prefix="test_ical_etag_")
+        url = "http://example.com/etag.ics"
+        mock_get.return_value = MagicMock(
+            status_code=200, headers={"ETag": '"v1"'},
+            content=self._make_ical_content("EVENT 1"))
+        first = IcalEventRequest(url=url, key="test_key", cache=cache)
+        first.get_events()
+        stored_last_modified = cache.peek(url)["last_modified"]
+
+        key = cache.generate_key(url) + ":content"
+        cache._expiry[key] = datetime.now(timezone.utc).timestamp() - 1
+        mock_get.return_value = MagicMock(status_code=304, headers={})
+        second = IcalEventRequest(url=url, key="test_key", cache=cache)
+        events = second.get_events()
+
+        self.assertEqual([e.title for e in events], ["EVENT 1"])
+        mock_get.assert_called_with(url, headers={"If-None-Match": '"v1"'},
+                                    timeout=ICAL_REQUEST_TIMEOUT)
+        self.assertEqual(second.get_last_modified(), stored_last_modified)
+        self.assertGreater(cache.ttl(url), 3500)
+
+    @patch("app.providers.icalendar.session.get")
+    def test_get_events_without_held_copy_fetches_unconditionally(
+            self, mock_get):
+        cache = EventRequestCache(prefix="test_ical_etag_swept_")
+        url = "http://example.com/etag.ics"
+        mock_get.return_value = MagicMock(
+            status_code=200,
+            headers={"Last-Modified": "Mon, 01 Apr 2024 00:00:00 GMT"},
+            content=self._make_ical_content("EVENT 1"))
+        IcalEventRequest(url=url, key="test_key", cache=cache).get_events()
+
+        key = cache.generate_key(url) + ":content"
+        cache._expiry[key] = datetime.now(timezone.utc).timestamp() - 1
+        cache.sweep()
+        IcalEventRequest(url=url, key="test_key", cache=cache).get_events()
+
+        mock_get.assert_called_with(url, headers={},
+                                    timeout=ICAL_REQUEST_TIMEOUT)
+
+    @patch("app.providers.icalendar.session.get")
+    def test_get_events_timeout_raises_ical_exception(self, mock_get):
+        mock_get.side_effect = requests.Timeout("read timed out")
+
+        ical_request = IcalEventRequest(url="http://example.com/slow.ics",
+                                        key="test_key")
+
+        with self.assertRaises(IcalException) as context:
+            ical_request.get_events()
+
+        self.assertEqual(context.exception.status_code, 500)
+
+    @patch("app.providers.icalendar.async_client.get", new_callable=AsyncMock)
+    def test_async_get_events_shares_cache_with_sync(self, mock_get):
+        url = "http://example.com/async.ics"
+        cache = EventRequestCache(prefix="test_async_ical_")
+        mock_get.return_value = httpx.Response(
+            200, content=self._make_ical_content("EVENT 1"))
+
+        ical_request = AsyncIcalEventRequest(url=url, key="test_key",
+                                             cache=cache)
+        events = asyncio.run(ical_request.get_events())
+
+        self.assertEqual([e.title for e in events], ["EVENT 1"])
+        mock_get.assert_called_once_with(url, headers={},
+                                         timeout=ICAL_REQUEST_TIMEOUT)
+
+        sync_events = IcalEventRequest(url=url, key="test_key",
+                                       cache=cache).get_events()
+        self.assertEqual([e.title for e in sync_events], ["EVENT 1"])
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch("app.providers.icalendar.async_client.get", new_callable=AsyncMock)
+    def test_async_get_events_http_error(self, mock_get):
+        mock_get.side_effect = httpx.ConnectError("connection refused")
+
+        ical_request = AsyncIcalEventRequest(url="http://example.com/error.ics",
+                                             key="test_key")
+
+        with self.assertRaises(IcalException) as context:
+            asyncio.run(ical_request.get_events())
+
+        self.assertEqual(context.exception.status_code, 500)
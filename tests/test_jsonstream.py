@@ -0,0 +1,57 @@
+import json
+import unittest
+from app.providers.jsonstream import JsonMembersParser
+
+
+def parse(text, streamed=(), piece=None):
+    data = text.encode()
+    piece = piece or len(data)
+    parser = JsonMembersParser(streamed)
+    members = []
+    for i in range(0, len(data), piece):
+        members += parser.feed(data[i:i + piece])
+    members += parser.close()
+    return members
+
+
+class TestJsonMembersParser(unittest.TestCase):
+
+    def test_yields_top_level_members(self):
+        members = parse('{"a": 1, "b": {"c": [1, 2]}, "d": "x"}')
+
+        self.assertEqual(members, [("a", 1), ("b", {"c": [1, 2]}),
+                                   ("d", "x")])
+
+    def test_streamed_array_is_yielded_per_element(self):
+        members = parse('{"items": [{"n": 1}, {"n": 2}], "empty": []}',
+                        streamed=("items", "empty"))
+
+        self.assertEqual(members, [("items", {"n": 1}), ("items", {"n": 2})])
+
+    def test_any_split_of_the_document_parses_the_same(self):
+        document = {"source": {"name": "山梨"},
+                    "events": [{"uid": str(i), "lat": 35.6 + i}
+                               for i in range(20)],
+                    "count": 12345}
+        text = json.dumps(document, ensure_ascii=False)
+
+        for piece in (1, 2, 5, 64):
+            members = parse(text, streamed=("events",), piece=piece)
+            self.assertEqual([v for k, v in members if k == "events"],
+                             document["events"])
+            self.assertIn(("count", 12345), members)
+
+    def test_empty_object(self):
+        self.assertEqual(parse("{}"), [])
+
+    def test_truncated_document_is_an_error(self):
+        with self.assertRaises(ValueError):
+            parse('{"items": [{"n": 1}', streamed=("items",))
+
+    def test_top_level_must_be_an_object(self):
+        with self.assertRaises(ValueError):
+            parse('[1, 2]')
+
+
+if __name__ == '__main__':
+    unittest.main()
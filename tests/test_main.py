@@ -1,7 +1,11 @@
 from fastapi import HTTPException
 from fastapi.testclient import TestClient
+import asyncio
+import httpx
 from unittest.mock import patch
 import pytest
+import time
+from concurrent.futures import ThreadPoolExecutor
 from app.main import app
 from app.service import get_user_agent, get_groups_from_icalendar
 from app.service import request_events, request_groups, get_groups_from_archives
@@ -14,6 +18,9 @@ from app.service import get_groups_from_connpass_chapters, merged_connpass_subdo
 from app.service import merge_duplicate_groups
 from app import service
 from app.cache import EventRequestCache
+from app.store import EventStore
+from app.refresh import RefreshAheadScheduler
+from app.responses import ResponseCache
 from app.providers.archive import ArchiveException
 from app.models import Event, Group
 from datetime import datetime, timedelta, timezone
@@ -21,15 +28,41 @@ from datetime import datetime, timedelta, timezone
 client = TestClient(app)
 
 
+def in_requested_window(json, kwargs):
+    """Like a real provider, only answer for the requested ym/ymd: the
+    fixtures below are dated in January 2022, so when that isn't asked for
+    they're moved into the first requested month (keeping their day) or
+    onto the first requested day."""
+    ym = kwargs.get("ym") or []
+    ymd = kwargs.get("ymd") or []
+    if "202201" in ym or any(d.startswith("202201") for d in ymd):
+        return json
+    if ym:
+        target = f"{ym[0][:4]}-{ym[0][4:6]}"
+    elif ymd:
+        target = f"{ymd[0][:4]}-{ymd[0][4:6]}-{ymd[0][6:8]}"
+    else:
+        return json
+
+    def move(value):
+        return target + value[len(target):]
+
+    return [{**item, "started_at": move(item["started_at"]),
+             "ended_at": move(item["ended_at"])} for item in json]
+
+
 class MockConnpassEventRequest:
     requests = []
     page_requests = []
+    sync_requests = []
 
     def __init__(self, **kwargs):
         MockConnpassEventRequest.requests.append(kwargs)
+        self.kwargs = kwargs
 
     def get_events(self):
-        return Event.from_json(self._fixed_json())
+        return Event.from_json(in_requested_window(self._fixed_json(),
+                                                   self.kwargs))
 
     def get_events_page(self, item_start, item_count, order="desc"):
         MockConnpassEventRequest.page_requests.append(
@@ -43,6 +76,10 @@ class MockConnpassEventRequest:
     def get_total_available(self):
         return 2
 
+    def get_updated_events(self, since, max_pages=2):
+        MockConnpassEventRequest.sync_requests.append(since)
+        return {}
+
     def _fixed_json(self):
         return [
             {
@@ -136,6 +173,7 @@ class MockICalEventRequest:
 
     def __init__(self, **kwargs):
         MockICalEventRequest.requests.append(kwargs)
+        self.kwargs = kwargs
 
     def get_events(self):
         json = [
@@ -165,7 +203,7 @@ class MockICalEventRequest:
                 "source": "icalendar"
             }
         ]
-        events = Event.from_json(json)
+        events = Event.from_json(in_requested_window(json, self.kwargs))
         return events
 
     def get_last_modified(self):
@@ -316,11 +354,30 @@ class MockConnpassGroupRequestJagyamanashi(MockConnpassGroupRequest):
         return Group.from_json(json)
 
 
+def as_async(mock_class):
+    """mock_class with its fetch methods made coroutines, standing in for
+    the Async* provider variants the async routes construct."""
+    def make_async(method):
+        async def wrapper(self, *args, **kwargs):
+            return method(self, *args, **kwargs)
+        return wrapper
+
+    methods = {name: make_async(getattr(mock_class, name))
+               for name in ("get_events", "get_events_page", "get_groups")
+               if hasattr(mock_class, name)}
+    return type("Async" + mock_class.__name__, (mock_class,), methods)
+
+
+class MockAsyncArchiveIndexRequest(MockArchiveIndexRequest):
+    async def preload(self):
+        MockArchiveIndexRequest.preloaded_urls.append(self.url)
+
+
 class MockFailingPreloadArchiveIndexRequest:
     def __init__(self, **kwargs):
         self.url = kwargs.get("url")
 
-    def preload(self):
+    async def preload(self):
         raise ArchiveException(500, "Failed to fetch archive index")
 
 
@@ -329,11 +386,33 @@ def mock_archive_index_request():
     MockArchiveIndexRequest.requested_urls = []
     MockArchiveIndexRequest.preloaded_urls = []
     service._archive_group_keys = None  # reset the process-lifetime memoization
-    with patch("app.service.ArchiveIndexRequest", MockArchiveIndexRequest):
+    with patch("app.service.ArchiveIndexRequest", MockArchiveIndexRequest), \
+            patch("app.service.AsyncArchiveIndexRequest",
+                  as_async(MockArchiveIndexRequest)):
         yield
     service._archive_group_keys = None
 
 
+@pytest.fixture(autouse=True)
+def isolated_event_store():
+    with patch("app.service.store", EventStore()):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache():
+    # The mocks answer any window with the same events, so month shards
+    # cached by one test would contradict the next one's.
+    with patch("app.service.cache", EventRequestCache(prefix="test_")):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def isolated_responses():
+    with patch("app.service.responses", ResponseCache()):
+        yield
+
+
 @pytest.fixture(autouse=True)
 def mock_connpass_event_request_calls():
     MockConnpassEventRequest.requests = []
@@ -625,6 +704,146 @@ def test_read_events_month_returns_304_when_not_modified_since():
     assert response.headers["Cache-Control"] == "public, no-cache"
 
 
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+def test_read_events_month_is_served_from_stored_response():
+    # Only stored once the store already held the month beforehand.
+    client.get("/events/month/2023/12")
+    first = client.get("/events/month/2023/12")
+
+    with patch("app.service.get_events",
+               wraps=service.get_events) as mock_get_events:
+        second = client.get("/events/month/2023/12")
+        assert mock_get_events.call_count == 0
+
+        # Each fields= variant is rendered, then stored, on its own.
+        with_fields = client.get("/events/month/2023/12",
+                                 params={"fields": "uid"})
+        client.get("/events/month/2023/12", params={"fields": " uid,"})
+        assert mock_get_events.call_count == 1
+
+    assert second.status_code == 200
+    assert second.content == first.content
+    assert second.headers["Last-Modified"] == first.headers["Last-Modified"]
+    assert second.headers["Content-Type"] == "application/json"
+    assert [set(ev) for ev in with_fields.json()] == \
+        [{"uid"}] * len(first.json())
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+def test_read_events_month_stored_response_follows_store_reload():
+    first = client.get("/events/month/2023/12").json()
+    service.store.load(["202312"], [])
+
+    response = client.get("/events/month/2023/12")
+
+    assert len(first) > 0
+    assert response.json() == []
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+def test_read_events_month_304_from_version_still_schedules_refresh():
+    baseline = client.get("/events/month/2023/12")
+
+    with patch("app.service.get_events") as mock_get_events, \
+            patch("app.service.schedule_store_refresh") as mock_schedule:
+        response = client.get(
+            "/events/month/2023/12",
+            headers={"If-Modified-Since": baseline.headers["Last-Modified"]})
+
+    assert response.status_code == 304
+    assert response.headers["Last-Modified"] == \
+        baseline.headers["Last-Modified"]
+    mock_get_events.assert_not_called()
+    mock_schedule.assert_called_once()
+    assert mock_schedule.call_args.args[0] is not None  # background tasks
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+def test_read_events_month_returns_304_when_etag_matches():
+    baseline = client.get("/events/month/2023/12")
+    etag = baseline.headers["ETag"]
+
+    # Answered from the rendering, then from the one stored.
+    for _ in range(2):
+        response = client.get("/events/month/2023/12",
+                              headers={"If-None-Match": f'"other", W/{etag}'})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+        assert response.headers["Last-Modified"] == \
+            baseline.headers["Last-Modified"]
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+def test_read_events_month_if_none_match_overrides_if_modified_since():
+    client.get("/events/month/2023/12")
+
+    response = client.get(
+        "/events/month/2023/12",
+        headers={"If-None-Match": '"stale"',
+                 "If-Modified-Since": "Mon, 01 Jan 2035 00:00:00 GMT"})
+
+    assert response.status_code == 200
+    assert len(response.json()) > 0
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+def test_read_events_month_etag_differs_per_fields_variant():
+    full = client.get("/events/month/2023/12")
+    projected = client.get("/events/month/2023/12", params={"fields": "uid"})
+    reordered = client.get("/events/month/2023/12",
+                           params={"fields": "uid,"})
+
+    assert full.headers["ETag"] != projected.headers["ETag"]
+    assert projected.headers["ETag"] == reordered.headers["ETag"]
+
+    response = client.get("/events/month/2023/12",
+                          params={"fields": "uid"},
+                          headers={"If-None-Match": full.headers["ETag"]})
+    assert response.status_code == 200
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+@patch("app.service.compress_min_bytes", 0)
+def test_read_events_month_negotiates_content_encoding():
+    identity = client.get("/events/month/2023/12",
+                          headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/events/month/2023/12",
+                         headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in identity.headers
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    for response in (identity, gzipped):
+        assert "Accept-Encoding" in response.headers["Vary"]
+    assert gzipped.json() == identity.json()
+    assert gzipped.headers["ETag"] != identity.headers["ETag"]
+
+    response = client.get("/events/month/2023/12",
+                          headers={"Accept-Encoding": "gzip",
+                                   "If-None-Match": gzipped.headers["ETag"]})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == gzipped.headers["ETag"]
+    assert "Content-Encoding" not in response.headers
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+def test_read_events_month_small_response_is_not_compressed():
+    response = client.get("/events/month/2023/12", params={"fields": "uid"},
+                          headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+
 @patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
 @patch("app.service.IcalEventRequest", MockICalEventRequest)
 def test_read_events_month_returns_304_when_modified_since_is_later():
@@ -731,6 +950,7 @@ def test_read_events_fromto_year_month_invalid_legacy_path_still_works():
 
 @patch("app.service.cache", EventRequestCache(prefix="test_group_events_plain_"))
 @patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.AsyncConnpassEventRequest", as_async(MockConnpassEventRequest))
 def test_read_group_events_connpass_plain():
     # Plain group, no keyword/uid: fast path, one request, no background refetch.
     response = client.get("/groups/jagyamanashi/events")
@@ -749,6 +969,7 @@ def test_read_group_events_connpass_plain():
 
 @patch("app.service.cache", EventRequestCache(prefix="test_group_events_plain_filtered_"))
 @patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.AsyncConnpassEventRequest", as_async(MockConnpassEventRequest))
 def test_read_group_events_connpass_plain_with_uid_falls_back_to_full_fetch():
     # uid filter forces the get_events() fallback, not the fast path.
     response = client.get("/groups/jagyamanashi/events", params={"uid": "UID 2"})
@@ -766,6 +987,7 @@ def test_read_group_events_connpass_plain_with_uid_falls_back_to_full_fetch():
 
 @patch("app.service.cache", EventRequestCache(prefix="test_group_events_plain_blank_"))
 @patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.AsyncConnpassEventRequest", as_async(MockConnpassEventRequest))
 def test_read_group_events_connpass_plain_with_blank_filters_still_uses_fast_path():
     # Blank keyword/uid must not defeat the upstream-pagination fast path.
     response = client.get("/groups/jagyamanashi/events",
@@ -778,6 +1000,7 @@ def test_read_group_events_connpass_plain_with_blank_filters_still_uses_fast_pat
 
 @patch("app.service.cache", EventRequestCache(prefix="test_group_events_page_default_"))
 @patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.AsyncConnpassEventRequest", as_async(MockConnpassEventRequest))
 def test_read_group_events_default_pagination():
     # MockConnpassEventRequest always reports 2 events available (UID 1, UID 2)
     response = client.get("/groups/jagyamanashi/events")
@@ -793,6 +1016,7 @@ def test_read_group_events_default_pagination():
 
 @patch("app.service.cache", EventRequestCache(prefix="test_group_events_page_cors_"))
 @patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.AsyncConnpassEventRequest", as_async(MockConnpassEventRequest))
 def test_read_group_events_exposes_pagination_headers_for_cors():
     response = client.get("/groups/jagyamanashi/events",
                           headers={"Origin": "https://example.com"})
@@ -801,11 +1025,29 @@ def test_read_group_events_exposes_pagination_headers_for_cors():
     exposed = response.headers["access-control-expose-headers"]
     exposed_headers = {h.strip() for h in exposed.split(",")}
     assert exposed_headers == {
-        "X-Total-Count", "X-Page", "X-Per-Page", "X-Total-Pages"}
+        "X-Total-Count", "X-Page", "X-Per-Page", "X-Total-Pages", "ETag"}
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.AsyncConnpassEventRequest", as_async(MockConnpassEventRequest))
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+@patch("app.service.AsyncIcalEventRequest", as_async(MockICalEventRequest))
+def test_read_group_events_etag_differs_per_page():
+    first = client.get("/groups/jagyamanashi/events",
+                       params={"per_page": 1, "page": 1})
+    second = client.get("/groups/jagyamanashi/events",
+                        params={"per_page": 1, "page": 2})
+
+    assert first.headers["ETag"] != second.headers["ETag"]
+    response = client.get("/groups/jagyamanashi/events",
+                          params={"per_page": 1, "page": 2},
+                          headers={"If-None-Match": second.headers["ETag"]})
+    assert response.status_code == 304
 
 
 @patch("app.service.cache", EventRequestCache(prefix="test_group_events_page_slice_"))
 @patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.AsyncConnpassEventRequest", as_async(MockConnpassEventRequest))
 def test_read_group_events_pagination_slices_pages():
     # Default order "desc" (newest-first): page 2 of 1-per-page is UID 1.
     response = client.get("/groups/jagyamanashi/events",
@@ -827,6 +1069,7 @@ def test_read_group_events_pagination_slices_pages():
 
 @patch("app.service.cache", EventRequestCache(prefix="test_group_events_page_oob_"))
 @patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.AsyncConnpassEventRequest", as_async(MockConnpassEventRequest))
 def test_read_group_events_pagination_out_of_range_page_is_empty():
     response = client.get("/groups/jagyamanashi/events",
                           params={"per_page": 1, "page": 99})
@@ -853,6 +1096,7 @@ def test_read_group_events_pagination_rejects_invalid_params():
 
 @patch("app.service.cache", EventRequestCache(prefix="test_group_events_order_asc_"))
 @patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.AsyncConnpassEventRequest", as_async(MockConnpassEventRequest))
 def test_read_group_events_ascending_order():
     # order=asc reverses the native descending order: page 1 is UID 1.
     response = client.get("/groups/jagyamanashi/events",
@@ -868,6 +1112,7 @@ def test_read_group_events_ascending_order():
 
 @patch("app.service.cache", EventRequestCache(prefix="test_group_events_chapter_desc_"))
 @patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.AsyncConnpassEventRequest", as_async(MockConnpassEventRequest))
 def test_read_group_events_chapter_descending_order():
     # Chapters fall back to get_events() (always ascending); order=desc
     # must reverse that result locally.
@@ -881,6 +1126,7 @@ def test_read_group_events_chapter_descending_order():
 
 @patch("app.service.cache", EventRequestCache(prefix="test_group_events_page_fields_"))
 @patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.AsyncConnpassEventRequest", as_async(MockConnpassEventRequest))
 def test_read_group_events_pagination_headers_kept_with_fields():
     # Default order "desc": page 1 of 1-per-page is the newest event, UID 2.
     response = client.get("/groups/jagyamanashi/events",
@@ -893,6 +1139,7 @@ def test_read_group_events_pagination_headers_kept_with_fields():
 
 @patch("app.service.cache", EventRequestCache(prefix="test_group_events_chapter_"))
 @patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.AsyncConnpassEventRequest", as_async(MockConnpassEventRequest))
 def test_read_group_events_connpass_chapter():
     # Chapter "soracomug-yamanashi" (subdomain "soracomug-tokyo", keyword
     # "山梨") falls back to get_events()'s crawl, not the fast path.
@@ -908,6 +1155,7 @@ def test_read_group_events_connpass_chapter():
 
 @patch("app.service.cache", EventRequestCache(prefix="test_group_events_ical_"))
 @patch("app.service.IcalEventRequest", MockICalEventRequest)
+@patch("app.service.AsyncIcalEventRequest", as_async(MockICalEventRequest))
 def test_read_group_events_icalendar():
     # config.yaml's real icalendar entry, resolved from config alone
     response = client.get("/groups/yamanashi-wordpress-meetup/events")
@@ -938,6 +1186,27 @@ def test_read_group_events_not_found():
     assert response.status_code == 404
 
 
+class MockBlockingConnpassEventRequest(MockConnpassEventRequest):
+    def get_events(self):
+        raise AssertionError("fetched on a service thread")
+
+    def get_events_page(self, item_start, item_count, order="desc"):
+        raise AssertionError("fetched on a service thread")
+
+
+@patch("app.service.cache", EventRequestCache(prefix="test_group_events_async_"))
+@patch("app.service.ConnpassEventRequest", MockBlockingConnpassEventRequest)
+@patch("app.service.AsyncConnpassEventRequest", as_async(MockConnpassEventRequest))
+def test_read_group_events_awaits_async_providers():
+    # Both the upstream-paginated page and the full-fetch fallback.
+    response = client.get("/groups/jagyamanashi/events")
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+
+    response = client.get("/groups/soracomug-yamanashi/events")
+    assert response.status_code == 200
+
+
 def test_find_group_source_connpass_plain():
     source = find_group_source("jagyamanashi")
     assert source == {"type": "connpass", "subdomain": "jagyamanashi",
@@ -991,7 +1260,9 @@ def test_get_archive_group_keys_is_memoized():
 
 @patch("app.service.cache", EventRequestCache(prefix="test_group_events_archive_merge_"))
 @patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.AsyncConnpassEventRequest", as_async(MockConnpassEventRequest))
 @patch("app.service.ArchiveIndexRequest", MockArchiveIndexRequestJagyamanashi)
+@patch("app.service.AsyncArchiveIndexRequest", as_async(MockArchiveIndexRequestJagyamanashi))
 def test_read_group_events_merges_archive_when_key_matches_connpass():
     response = client.get("/groups/jagyamanashi/events")
     assert response.status_code == 200
@@ -1072,6 +1343,24 @@ def test_read_events_summary_returns_304_when_not_modified_since(
     assert response.headers["Cache-Control"] == "public, no-cache"
 
 
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+@patch("app.service.ConnpassGroupRequest", MockConnpassGroupRequest)
+@patch("app.service.get_groups_from_icalendar")
+def test_read_events_summary_returns_304_when_etag_matches(
+        mock_get_groups_from_icalendar):
+    mock_get_groups_from_icalendar.return_value = []
+
+    etag = client.get("/summary/events").headers["ETag"]
+
+    response = client.get("/summary/events", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    response = client.get("/summary/events", headers={"If-None-Match": "*"})
+    assert response.status_code == 304
+
+
 @patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
 @patch("app.service.IcalEventRequest", MockICalEventRequest)
 @patch("app.service.ConnpassGroupRequest", MockConnpassGroupRequest)
@@ -1292,7 +1581,7 @@ def test_read_groups_summary_reuses_events_summary_cache(mock_get_groups_from_ic
     params = normalize_event_params(
         {"ym": ym, "keyword": None, "include_prefecture": False})
 
-    # TestClient runs BackgroundTasks synchronously, so the cache must
+    # A cache miss stores its result before returning, so the cache must
     # already be warm by the time /summary/events returns.
     cached_events, _ = service.get_events_from_cache(service.cache, params)
     assert cached_events is not None
@@ -1303,6 +1592,7 @@ def test_read_groups_summary_reuses_events_summary_cache(mock_get_groups_from_ic
 
 
 @patch("app.service.ConnpassGroupRequest", MockConnpassGroupRequest)
+@patch("app.service.AsyncConnpassGroupRequest", as_async(MockConnpassGroupRequest))
 @patch("app.service.get_groups_from_icalendar")
 def test_read_group(mock_get_groups_from_icalendar):
     mock_get_groups_from_icalendar.return_value = []
@@ -1313,6 +1603,46 @@ def test_read_group(mock_get_groups_from_icalendar):
 
 
 @patch("app.service.ConnpassGroupRequest", MockConnpassGroupRequest)
+@patch("app.service.AsyncConnpassGroupRequest", as_async(MockConnpassGroupRequest))
+@patch("app.service.get_groups_from_icalendar")
+def test_read_group_not_found_is_not_answered_from_version(
+        mock_get_groups_from_icalendar):
+    mock_get_groups_from_icalendar.return_value = []
+    client.get("/groups")
+
+    response = client.get(
+        "/groups/no-such-group",
+        headers={"If-Modified-Since": "Mon, 01 Jan 2035 00:00:00 GMT"})
+
+    assert response.status_code == 404
+
+
+@patch("app.service.get_groups_from_icalendar")
+def test_read_group_not_found_does_not_block_later_refreshes(
+        mock_get_groups_from_icalendar):
+    mock_get_groups_from_icalendar.return_value = []
+    # Stored 2 hours ago, past the 1 hour refresh interval.
+    service.cache.set({}, Group.to_json(MockConnpassGroupRequest().get_groups()),
+                      ex=3600*72 - 7200)
+
+    with patch("app.service.refresh_scheduler",
+               RefreshAheadScheduler(claim_ttl=60)), \
+            patch("app.service.fetch_groups") as mock_fetch_groups, \
+            patch("app.refresh.time.monotonic", return_value=1000.0) as now:
+        response = client.get("/groups/no-such-group")
+        assert response.status_code == 404
+        # The refresh the lookup queued was dropped along with the 404.
+        mock_fetch_groups.assert_not_called()
+
+        # Its claim lapses, so a later request queues the refresh again.
+        now.return_value = 1061.0
+        response = client.get("/groups")
+        assert response.status_code == 200
+        mock_fetch_groups.assert_called_once_with({})
+
+
+@patch("app.service.ConnpassGroupRequest", MockConnpassGroupRequest)
+@patch("app.service.AsyncConnpassGroupRequest", as_async(MockConnpassGroupRequest))
 @patch("app.service.get_groups_from_icalendar")
 def test_read_group_with_fields(mock_get_groups_from_icalendar):
     mock_get_groups_from_icalendar.return_value = []
@@ -1325,6 +1655,7 @@ def test_read_group_with_fields(mock_get_groups_from_icalendar):
 
 
 @patch("app.service.ConnpassGroupRequest", MockConnpassGroupRequest)
+@patch("app.service.AsyncConnpassGroupRequest", as_async(MockConnpassGroupRequest))
 @patch("app.service.get_groups_from_icalendar")
 def test_read_group_with_fields_ignores_unknown_names(mock_get_groups_from_icalendar):
     mock_get_groups_from_icalendar.return_value = []
@@ -1337,6 +1668,7 @@ def test_read_group_with_fields_ignores_unknown_names(mock_get_groups_from_icale
 
 
 @patch("app.service.ConnpassGroupRequest", MockConnpassGroupRequest)
+@patch("app.service.AsyncConnpassGroupRequest", as_async(MockConnpassGroupRequest))
 @patch("app.service.get_groups_from_icalendar")
 def test_read_group_with_empty_fields_is_noop(mock_get_groups_from_icalendar):
     mock_get_groups_from_icalendar.return_value = []
@@ -1348,6 +1680,7 @@ def test_read_group_with_empty_fields_is_noop(mock_get_groups_from_icalendar):
 
 
 @patch("app.service.ConnpassGroupRequest", MockConnpassGroupRequest)
+@patch("app.service.AsyncConnpassGroupRequest", as_async(MockConnpassGroupRequest))
 @patch("app.service.get_groups_from_icalendar")
 def test_read_group_with_fields_keeps_cache_headers(mock_get_groups_from_icalendar):
     mock_get_groups_from_icalendar.return_value = []
@@ -1359,6 +1692,7 @@ def test_read_group_with_fields_keeps_cache_headers(mock_get_groups_from_icalend
 
 
 @patch("app.service.ConnpassGroupRequest", MockConnpassGroupRequest)
+@patch("app.service.AsyncConnpassGroupRequest", as_async(MockConnpassGroupRequest))
 @patch("app.service.get_groups_from_icalendar")
 @patch("app.service.config", {
     "metadata": {"version": "1.0.0"},
@@ -1372,6 +1706,7 @@ def test_read_group_with_fields_keeps_cache_headers(mock_get_groups_from_icalend
     }
 })
 @patch("app.service.ArchiveIndexRequest", MockArchiveIndexRequest)
+@patch("app.service.AsyncArchiveIndexRequest", as_async(MockArchiveIndexRequest))
 @patch("app.service.cache", EventRequestCache(prefix="test_archive_group_"))
 def test_read_group_includes_archive_source(mock_get_groups_from_icalendar):
     mock_get_groups_from_icalendar.return_value = []
@@ -1389,6 +1724,7 @@ def test_read_group_includes_archive_source(mock_get_groups_from_icalendar):
 
 
 @patch("app.service.ConnpassGroupRequest", MockConnpassGroupRequestJagyamanashi)
+@patch("app.service.AsyncConnpassGroupRequest", as_async(MockConnpassGroupRequestJagyamanashi))
 @patch("app.service.get_groups_from_icalendar")
 @patch("app.service.config", {
     "metadata": {"version": "1.0.0"},
@@ -1402,6 +1738,7 @@ def test_read_group_includes_archive_source(mock_get_groups_from_icalendar):
     }
 })
 @patch("app.service.ArchiveIndexRequest", MockArchiveIndexRequestJagyamanashi)
+@patch("app.service.AsyncArchiveIndexRequest", as_async(MockArchiveIndexRequestJagyamanashi))
 @patch("app.service.cache", EventRequestCache(prefix="test_groups_merge_archive_"))
 def test_read_groups_merges_duplicate_key_from_archive(mock_get_groups_from_icalendar):
     mock_get_groups_from_icalendar.return_value = []
@@ -1423,6 +1760,7 @@ def test_read_groups_merges_duplicate_key_from_archive(mock_get_groups_from_ical
 
 
 @patch("app.service.ConnpassGroupRequest", MockConnpassGroupRequest)
+@patch("app.service.AsyncConnpassGroupRequest", as_async(MockConnpassGroupRequest))
 @patch("app.service.get_groups_from_icalendar")
 def test_read_group_by_key(mock_get_groups_from_icalendar):
     mock_get_groups_from_icalendar.return_value = []
@@ -1436,6 +1774,7 @@ def test_read_group_by_key(mock_get_groups_from_icalendar):
 
 
 @patch("app.service.ConnpassGroupRequest", MockConnpassGroupRequest)
+@patch("app.service.AsyncConnpassGroupRequest", as_async(MockConnpassGroupRequest))
 @patch("app.service.get_groups_from_icalendar")
 def test_read_group_by_key_not_found(mock_get_groups_from_icalendar):
     mock_get_groups_from_icalendar.return_value = []
@@ -1445,6 +1784,7 @@ def test_read_group_by_key_not_found(mock_get_groups_from_icalendar):
 
 
 @patch("app.service.ConnpassGroupRequest", MockConnpassGroupRequest)
+@patch("app.service.AsyncConnpassGroupRequest", as_async(MockConnpassGroupRequest))
 @patch("app.service.get_groups_from_icalendar")
 def test_read_group_by_key_with_fields(mock_get_groups_from_icalendar):
     mock_get_groups_from_icalendar.return_value = []
@@ -1455,6 +1795,7 @@ def test_read_group_by_key_with_fields(mock_get_groups_from_icalendar):
 
 
 @patch("app.service.ConnpassGroupRequest", MockConnpassGroupRequest)
+@patch("app.service.AsyncConnpassGroupRequest", as_async(MockConnpassGroupRequest))
 @patch("app.service.get_groups_from_icalendar")
 def test_read_group_by_key_returns_304_when_not_modified_since(
         mock_get_groups_from_icalendar):
@@ -1571,6 +1912,298 @@ def test_get_groups_without_background_tasks(mock_get_groups_from_icalendar):
     assert len(groups) > 0
 
 
+class RecordingBackgroundTasks:
+    def __init__(self):
+        self.tasks = []
+
+    def add_task(self, func, *args, **kwargs):
+        self.tasks.append((func, args, kwargs))
+
+
+# Date windows are answered from the store; include_prefecture=False (as
+# used by get_full_history()) keeps these on the per-params cache path.
+HISTORY_PARAMS = {"ym": ["202201"], "keyword": None,
+                  "include_prefecture": False}
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+@patch("app.service.cache", EventRequestCache(prefix="test_get_events_miss_"))
+def test_get_events_cache_miss_stores_result_without_queueing_refresh():
+    background_tasks = RecordingBackgroundTasks()
+
+    events, _ = get_events(HISTORY_PARAMS, background_tasks)
+
+    assert len(events) > 0
+    assert background_tasks.tasks == []
+    params = normalize_event_params(HISTORY_PARAMS)
+    cached_events, _ = service.get_events_from_cache(service.cache, params)
+    assert [e.uid for e in cached_events] == [e.uid for e in events]
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+@patch("app.service.cache", EventRequestCache(prefix="test_get_events_fresh_hit_"))
+def test_get_events_fresh_cache_hit_does_not_refetch_upstream():
+    get_events(HISTORY_PARAMS)
+    MockConnpassEventRequest.requests = []
+    background_tasks = RecordingBackgroundTasks()
+
+    get_events(HISTORY_PARAMS, background_tasks)
+
+    assert MockConnpassEventRequest.requests == []
+    assert background_tasks.tasks == []
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+@patch("app.service.cache", EventRequestCache(prefix="test_get_events_due_hit_"))
+def test_get_events_due_cache_hit_queues_one_refresh():
+    params = normalize_event_params(HISTORY_PARAMS)
+    # Stored 2 hours ago, past the default 1 hour refresh interval.
+    service.cache.set(params, Event.to_json([]), ex=3600*72 - 7200)
+    background_tasks = RecordingBackgroundTasks()
+
+    get_events(HISTORY_PARAMS, background_tasks)
+    get_events(HISTORY_PARAMS, background_tasks)
+
+    # The second request is deduplicated against the pending refresh.
+    assert len(background_tasks.tasks) == 1
+    func, args, _ = background_tasks.tasks[0]
+    assert func is service.fetch_events
+
+    func(*args)
+
+    cached_events, _ = service.get_events_from_cache(service.cache, params)
+    assert len(cached_events) > 0
+    # Once the refresh has run, the fresh entry no longer needs one.
+    get_events(HISTORY_PARAMS, background_tasks)
+    assert len(background_tasks.tasks) == 1
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+def test_get_events_store_miss_loads_window_without_queueing_refresh():
+    background_tasks = RecordingBackgroundTasks()
+
+    events, last_modified = get_events({"ym": ["202201"], "keyword": None},
+                                       background_tasks)
+
+    assert [e.uid for e in events] == ["UID 1", "UID 2"]
+    assert last_modified == datetime.fromtimestamp(123, timezone.utc)
+    assert background_tasks.tasks == []
+    assert service.store.missing(["202201"]) == []
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+def test_get_events_overlapping_windows_share_one_fetch():
+    get_events({"ym": ["202201"], "keyword": None, "uid": None})
+    MockConnpassEventRequest.requests = []
+
+    day, _ = get_events({"ymd": ["20220102"], "keyword": None, "uid": None})
+    keyword, _ = get_events({"ym": ["202201"], "keyword": "python",
+                             "uid": None})
+
+    # Both answered from the month already loaded.
+    assert MockConnpassEventRequest.requests == []
+    assert [e.uid for e in day] == ["UID 2"]
+    assert [e.uid for e in keyword] == ["UID 2"]
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+def test_get_events_due_store_hit_queues_one_refresh():
+    # Loaded 2 hours ago, past the default 1 hour refresh interval.
+    service.store.load(["202201"], [], ex=3600*72 - 7200)
+    background_tasks = RecordingBackgroundTasks()
+
+    get_events({"ym": ["202201"], "keyword": None}, background_tasks)
+    get_events({"ymd": ["20220101"], "keyword": None}, background_tasks)
+
+    # The day is covered by the month, whose refresh is already pending.
+    assert len(background_tasks.tasks) == 1
+    func, args, _ = background_tasks.tasks[0]
+    assert func is service.fetch_store_units
+    assert args[0] == ["202201"]
+
+    func(*args)
+
+    events, _ = get_events({"ym": ["202201"], "keyword": None},
+                           background_tasks)
+    assert len(events) > 0
+    assert len(background_tasks.tasks) == 1
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.config", {
+    "metadata": {"version": "1.0.0"},
+    "scope": {
+        "connpass": [{"subdomain": "jagyamanashi"}]
+    }
+})
+def test_request_events_only_fetches_months_not_yet_sharded():
+    request_events({"ym": ["202112", "202201"]})
+    MockConnpassEventRequest.requests = []
+
+    events, last_modified = request_events(
+        {"ym": ["202201", "202202", "202203"]})
+
+    assert [r["ym"] for r in MockConnpassEventRequest.requests] == \
+        [["202202", "202203"]]
+    assert [e.uid for e in events] == ["UID 1", "UID 2"]
+    assert last_modified == datetime.fromtimestamp(123, timezone.utc)
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.upstream_month_shards", False)
+@patch("app.service.config", {
+    "metadata": {"version": "1.0.0"},
+    "scope": {
+        "connpass": [{"subdomain": "jagyamanashi"}]
+    }
+})
+def test_request_events_without_month_shards_sends_whole_range():
+    request_events({"ym": ["202112", "202201"]})
+    request_events({"ym": ["202201", "202202"]})
+
+    assert [r["ym"] for r in MockConnpassEventRequest.requests] == \
+        [["202112", "202201"], ["202201", "202202"]]
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.config", {
+    "metadata": {"version": "1.0.0"},
+    "scope": {
+        "connpass": [{"subdomain": "jagyamanashi"}]
+    }
+})
+def test_full_history_refresh_only_refetches_recent_months():
+    now = datetime.now()
+    recent = f"{now.year:04}{now.month:02}"
+    ym = ["202112", "202201", recent]
+    request_events({"ym": ym}, cache_ttl=3600*24)
+    MockConnpassEventRequest.requests = []
+
+    # A day later: the recent month's shard is due again, the closed
+    # ones aren't.
+    service.cache.set_object(
+        {"shard": {"source": "connpass", "subdomain": ["jagyamanashi"]},
+         "ym": recent}, [], Event, ex=-1)
+    request_events({"ym": ym}, cache_ttl=3600*24)
+
+    assert [r["ym"] for r in MockConnpassEventRequest.requests] == [[recent]]
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.config", {
+    "metadata": {"version": "1.0.0"},
+    "scope": {
+        "connpass": [{"subdomain": "jagyamanashi"}]
+    }
+})
+def test_request_events_syncs_due_months_instead_of_refetching():
+    now = datetime.now()
+    ym = ["202201", f"{now.year:04}{now.month:02}"]
+    request_events({"ym": ym}, cache_ttl=0)
+    MockConnpassEventRequest.requests = []
+    MockConnpassEventRequest.sync_requests = []
+
+    events, _ = request_events({"ym": ym}, cache_ttl=0)
+
+    # The only request is the one sync() builds, without any months.
+    assert [r["ym"] for r in MockConnpassEventRequest.requests] == [None]
+    assert MockConnpassEventRequest.sync_requests == \
+        ["2022-01-01T00:00:00+09:00"]
+    assert [e.uid for e in events] == ["UID 1", "UID 2"]
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+def test_invalidate_months_refetches_closed_month():
+    get_events({"ym": ["202201"], "keyword": None, "uid": None})
+    MockConnpassEventRequest.requests = []
+
+    service.invalidate_months(["202201"])
+    events, _ = get_events({"ym": ["202201"], "keyword": None, "uid": None})
+
+    assert len(events) > 0
+    assert len(MockConnpassEventRequest.requests) > 0
+    assert all(r["ym"] == ["202201"]
+               for r in MockConnpassEventRequest.requests)
+
+
+class MockConnpassEventRequestCorrected(MockConnpassEventRequest):
+    """Answers with title for UID 2 (the iCal mock has a UID 1 of its
+    own), so a test can correct it upstream."""
+    title = "Python Event"
+
+    def _fixed_json(self):
+        return [{**item, "title": MockConnpassEventRequestCorrected.title}
+                if item["uid"] == "UID 2" else item
+                for item in super()._fixed_json()]
+
+
+def titles_of_uid_2(events):
+    return {e["title"] if isinstance(e, dict) else e.title
+            for e in events
+            if (e["uid"] if isinstance(e, dict) else e.uid) == "UID 2"}
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequestCorrected)
+@patch("app.service.ConnpassGroupRequest", MockConnpassGroupRequest)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+@patch("app.service.events_refresh_token", "secret-token")
+def test_invalidate_events_refetches_month_and_full_history():
+    MockConnpassEventRequestCorrected.title = "Python Event"
+    assert titles_of_uid_2(client.get("/events/month/2022/1").json()) == \
+        {"Python Event"}
+    assert titles_of_uid_2(service.get_full_history()[0]) == \
+        {"Python Event"}
+
+    MockConnpassEventRequestCorrected.title = "Corrected"
+    # Both still answer from what they hold...
+    assert titles_of_uid_2(client.get("/events/month/2022/1").json()) == \
+        {"Python Event"}
+    assert titles_of_uid_2(service.get_full_history()[0]) == \
+        {"Python Event"}
+
+    response = client.post("/events/invalidate?ym=202201",
+                           headers={"X-Refresh-Token": "secret-token"})
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-store"
+    assert response.json() == {"invalidated": ["202201"]}
+
+    # ...until the month is invalidated.
+    assert titles_of_uid_2(client.get("/events/month/2022/1").json()) == \
+        {"Corrected"}
+    assert titles_of_uid_2(service.get_full_history()[0]) == {"Corrected"}
+
+
+@patch("app.service.events_refresh_token", "secret-token")
+def test_invalidate_events_rejects_missing_token():
+    response = client.post("/events/invalidate?ym=202201")
+    assert response.status_code == 401
+
+
+@patch("app.service.events_refresh_token", "secret-token")
+@patch("app.service.invalidate_months")
+def test_invalidate_events_rejects_invalid_month(mock_invalidate_months):
+    response = client.post("/events/invalidate?ym=202201&ym=202213",
+                           headers={"X-Refresh-Token": "secret-token"})
+    assert response.status_code == 400
+    mock_invalidate_months.assert_not_called()
+
+
+@patch("app.service.request_events")
+def test_fetch_store_units_swallows_upstream_failure(mock_request_events):
+    mock_request_events.side_effect = HTTPException(status_code=502, detail="boom")
+
+    service.fetch_store_units(["202401"])
+
+    assert service.store.missing(["202401"]) == ["202401"]
+
+
 @patch("app.service.request_events")
 @patch("app.service.cache", EventRequestCache(prefix="test_fetch_events_swallow_"))
 def test_fetch_events_swallows_upstream_failure(mock_request_events):
@@ -2150,6 +2783,138 @@ def test_request_events_dedupes_repeated_chapter_keyword():
     assert MockConnpassEventRequestCountingCalls.instances[0]["keyword"] == ["山梨"]
 
 
+class MockConnpassEventRequestSlowPrefecture:
+    """The prefecture query (listed first) finishes last."""
+
+    def __init__(self, **kwargs):
+        self.is_prefecture = bool(kwargs.get("prefecture"))
+
+    def get_events(self):
+        if self.is_prefecture:
+            time.sleep(0.05)
+        title = "Prefecture" if self.is_prefecture else "Subdomain"
+        return [Event(uid="UID 1", event_id=1, title=title, catch=None,
+                      hash_tag=None, event_url="Event URL", image_url=None,
+                      started_at="2022-01-01T12:00:00+09:00",
+                      ended_at="2022-01-01T13:00:00+09:00",
+                      updated_at="2022-01-01T00:00:00+09:00",
+                      open_status="close")]
+
+    def get_last_modified(self):
+        return datetime.fromtimestamp(456 if self.is_prefecture else 123,
+                                      timezone.utc)
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequestSlowPrefecture)
+@patch("app.service.config", {
+    "metadata": {"version": "1.0.0"},
+    "scope": {
+        "prefecture": ["山梨県"],
+        "connpass": [{"subdomain": "jagyamanashi"}]
+    }
+})
+def test_request_events_merges_concurrent_sources_in_config_order():
+    events, last_modified = request_events({})
+
+    # distinct_by_uid() keeps the later duplicate, i.e. the subdomain
+    # query's, even though the prefecture query completed after it.
+    assert [e.title for e in events] == ["Subdomain"]
+    assert last_modified == datetime.fromtimestamp(456, timezone.utc)
+
+
+class MockConnpassEventRequestHanging(MockConnpassEventRequestCountingCalls):
+    def get_events(self):
+        time.sleep(0.5)
+        return []
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequestHanging)
+@patch("app.service.config", {
+    "metadata": {"version": "1.0.0"},
+    "scope": {
+        "connpass": [{"subdomain": "jagyamanashi"}]
+    }
+})
+def test_request_events_raises_504_past_deadline():
+    with pytest.raises(HTTPException) as exc_info:
+        request_events({}, deadline=0.05)
+
+    assert exc_info.value.status_code == 504
+
+
+class MockConnpassEventRequestSlow(MockConnpassEventRequestCountingCalls):
+    def get_events(self):
+        time.sleep(0.1)
+        return []
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequestSlow)
+@patch("app.service.cache", EventRequestCache(prefix="test_get_events_coalesce_"))
+@patch("app.service.config", {
+    "metadata": {"version": "1.0.0"},
+    "scope": {
+        "connpass": [{"subdomain": "jagyamanashi"}]
+    }
+})
+def test_get_events_coalesces_concurrent_cache_misses():
+    MockConnpassEventRequestCountingCalls.instances = []
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(get_events, {"ym": ["202201"], "keyword": None})
+                   for _ in range(4)]
+        results = [f.result() for f in futures]
+
+    # One upstream fetch shared by all four callers.
+    assert len(MockConnpassEventRequestCountingCalls.instances) == 1
+    assert all(last_modified == datetime.fromtimestamp(456, timezone.utc)
+               for _, last_modified in results)
+
+
+class MockConnpassEventRequestSlowMonth(MockConnpassEventRequest):
+    """A month query is a slow cold fetch; a day query answers at once."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.is_month = bool(kwargs.get("ym"))
+
+    def get_events(self):
+        if self.is_month:
+            time.sleep(0.5)
+        return super().get_events()
+
+
+@patch("app.service.ConnpassEventRequest", MockConnpassEventRequestSlowMonth)
+@patch("app.service.IcalEventRequest", MockICalEventRequest)
+@patch("app.service.cache", EventRequestCache(prefix="test_warm_latency_"))
+def test_warm_requests_stay_fast_while_cold_fetch_is_in_flight():
+    async def measure():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport,
+                                     base_url="http://test") as ac:
+            warm_url = "/events/day/2022/1/1"
+            assert (await ac.get(warm_url)).status_code == 200
+
+            cold = asyncio.create_task(ac.get("/events/month/2023/1"))
+            await asyncio.sleep(0.05)  # let the cold fetch start
+
+            latencies = []
+            for _ in range(5):
+                started = time.perf_counter()
+                response = await ac.get(warm_url)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200
+
+            assert not cold.done()
+            assert (await cold).status_code == 200
+            return latencies
+
+    latencies = asyncio.run(measure())
+
+    # Served from the cache while the cold fetch is still sleeping, rather
+    # than queued behind it on the event loop.
+    assert max(latencies) < 0.2
+
+
 class MockConnpassGroupRequestForChapters:
     def __init__(self, **kwargs):
         pass
@@ -2234,8 +2999,9 @@ def test_get_archive_urls():
         ]
     }
 })
+@patch("app.service.AsyncArchiveIndexRequest", MockAsyncArchiveIndexRequest)
 def test_preload_archive_indexes():
-    preload_archive_indexes()
+    asyncio.run(preload_archive_indexes())
 
     assert MockArchiveIndexRequest.preloaded_urls == [
         "https://example.com/archive/index-1.json",
@@ -2256,9 +3022,9 @@ def test_preload_archive_indexes():
     }
 })
 def test_preload_archive_indexes_does_not_raise_on_error():
-    with patch("app.service.ArchiveIndexRequest",
+    with patch("app.service.AsyncArchiveIndexRequest",
                MockFailingPreloadArchiveIndexRequest):
-        preload_archive_indexes()
+        asyncio.run(preload_archive_indexes())
 
 
 def test_legacy_routes_marked_deprecated_in_openapi_schema():
@@ -2290,14 +3056,22 @@ def test_legacy_routes_marked_deprecated_in_openapi_schema():
 
 class MockConnpassEventRequestCapturingSkipCache:
     received_skip_cache = []
+    fetched_ym = []
+    sync_requests = []
 
     def __init__(self, **kwargs):
         MockConnpassEventRequestCapturingSkipCache.received_skip_cache.append(
             kwargs.get("skip_cache"))
+        self.ym = kwargs.get("ym")
 
     def get_events(self):
+        MockConnpassEventRequestCapturingSkipCache.fetched_ym.append(self.ym)
         return []
 
+    def get_updated_events(self, since, max_pages=2):
+        MockConnpassEventRequestCapturingSkipCache.sync_requests.append(since)
+        return {}
+
     def get_last_modified(self):
         return datetime.fromtimestamp(123, timezone.utc)
 
@@ -2326,7 +3100,7 @@ def test_refresh_events_rejects_wrong_token():
 @patch("app.service.IcalEventRequest", MockICalEventRequest)
 @patch("app.service.events_refresh_token", "secret-token")
 @patch("app.service.cache", EventRequestCache(prefix="test_refresh_success_"))
-def test_refresh_events_success_returns_fresh_data_and_updates_cache():
+def test_refresh_events_success_returns_fresh_data_and_updates_store():
     import app.service as service_module
     import app.routes as routes_module
 
@@ -2345,11 +3119,7 @@ def test_refresh_events_success_returns_fresh_data_and_updates_cache():
     dt_to = now + timedelta(days=days)
     ym = routes_module.year_month_range(dt_from.year, dt_from.month,
                                         dt_to.year, dt_to.month)
-    params = service_module.normalize_event_params(
-        {"ym": ym, "keyword": None, "uid": None})
-    cached = service_module.cache.get(params)
-    assert cached is not None
-    assert cached["json"] is not None
+    assert service_module.store.missing(ym) == []
 
 
 @patch("app.service.ConnpassEventRequest", MockConnpassEventRequest)
@@ -2371,18 +3141,36 @@ def test_refresh_events_rate_limited_on_second_call():
 @patch("app.service.events_refresh_token", "secret-token")
 @patch("app.service.cache", EventRequestCache(prefix="test_refresh_skip_cache_"))
 def test_refresh_events_forces_connpass_cache_bypass():
+    import app.routes as routes_module
+
+    days = service.config.get("recent_days", 90)
+    now = datetime.now()
+    dt_from = now - timedelta(days=days)
+    dt_to = now + timedelta(days=days)
+    units = routes_module.year_month_range(dt_from.year, dt_from.month,
+                                           dt_to.year, dt_to.month)
+    # Months already cached, with sync watermarks to sync them from.
+    with patch("app.service.ConnpassEventRequest", MockConnpassEventRequest):
+        service.store_requested_units(units, ex=3600*72)
     MockConnpassEventRequestCapturingSkipCache.received_skip_cache = []
+    MockConnpassEventRequestCapturingSkipCache.fetched_ym = []
+    MockConnpassEventRequestCapturingSkipCache.sync_requests = []
 
     response = client.post("/events/refresh",
                            headers={"X-Refresh-Token": "secret-token"})
     assert response.status_code == 200
     assert len(MockConnpassEventRequestCapturingSkipCache.received_skip_cache) > 0
     assert all(MockConnpassEventRequestCapturingSkipCache.received_skip_cache)
+    # Refetched in full, not synced: sync can't see upstream deletions.
+    assert MockConnpassEventRequestCapturingSkipCache.sync_requests == []
+    fetched = MockConnpassEventRequestCapturingSkipCache.fetched_ym
+    assert sorted(fetched[0]) == sorted(units)
 
 
 def test_refresh_events_excluded_from_schema_and_mcp():
     schema = client.get("/openapi.json").json()
     assert "/events/refresh" not in schema["paths"]
+    assert "/events/invalidate" not in schema["paths"]
 
     from app.routes import mcp
     tool_names = {t.name for t in mcp.tools}
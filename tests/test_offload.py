@@ -0,0 +1,46 @@
+import asyncio
+import threading
+import time
+import unittest
+from app.offload import ServiceExecutor
+
+
+class TestServiceExecutor(unittest.TestCase):
+
+    def test_run_returns_result_from_worker_thread(self):
+        executor = ServiceExecutor(max_threads=2)
+
+        def work(a, b=0):
+            return threading.current_thread() is not main, a + b
+
+        main = threading.current_thread()
+        off_main, total = asyncio.run(executor.run(work, 1, b=2))
+
+        self.assertTrue(off_main)
+        self.assertEqual(total, 3)
+
+    def test_run_caps_concurrent_calls(self):
+        executor = ServiceExecutor(max_threads=2)
+        lock = threading.Lock()
+        state = {"running": 0, "peak": 0}
+
+        def work():
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            time.sleep(0.02)
+            with lock:
+                state["running"] -= 1
+
+        async def run_all():
+            await asyncio.gather(*(executor.run(work) for _ in range(6)))
+
+        asyncio.run(run_all())
+        # A fresh event loop gets its own limiter.
+        asyncio.run(run_all())
+
+        self.assertEqual(state["peak"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+import unittest
+from app.cache import EventRequestCache
+from app.ratelimit import TokenBucketLimiter, BACKGROUND, FOREGROUND
+from app.ratelimit import background_priority, current_priority
+
+
+class TestTokenBucketLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = EventRequestCache(prefix="test_ratelimit_")
+        self.limiter = TokenBucketLimiter(rate=20.0, burst=1)
+
+    def start_waiters(self, priorities, order):
+        """Queue one acquire() per priority, in list order, behind a caller
+        already holding the only token."""
+        threads = []
+        for i, priority in enumerate(priorities):
+            def run(i=i, priority=priority):
+                self.limiter.acquire(self.cache, priority)
+                order.append(i)
+            thread = threading.Thread(target=run)
+            thread.start()
+            threads.append(thread)
+            # Let each one reach the queue before the next.
+            time.sleep(0.01)
+        return threads
+
+    def test_acquire_paces_to_rate(self):
+        started = time.monotonic()
+        for _ in range(3):
+            self.limiter.acquire(self.cache)
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+        self.assertEqual(self.limiter.stats()["acquired"], 3)
+
+    def test_burst_is_not_paced(self):
+        limiter = TokenBucketLimiter(rate=1.0, burst=3)
+        started = time.monotonic()
+        for _ in range(3):
+            limiter.acquire(self.cache)
+
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_waiters_are_served_in_fifo_order(self):
+        self.limiter.acquire(self.cache)
+        order = []
+
+        for thread in self.start_waiters([FOREGROUND] * 4, order):
+            thread.join(2)
+
+        self.assertEqual(order, [0, 1, 2, 3])
+
+    def test_foreground_goes_before_queued_background(self):
+        self.limiter.acquire(self.cache)
+        order = []
+
+        threads = self.start_waiters(
+            [BACKGROUND, BACKGROUND, BACKGROUND, FOREGROUND], order)
+        for thread in threads:
+            thread.join(2)
+
+        # The first background caller may already have its token.
+        self.assertIn(order.index(3), (0, 1))
+
+    def test_stats_report_queue_depth(self):
+        limiter = TokenBucketLimiter(rate=5.0, burst=1)
+        limiter.acquire(self.cache)
+        order = []
+        self.limiter = limiter
+        threads = self.start_waiters([FOREGROUND, BACKGROUND], order)
+
+        stats = limiter.stats()
+        self.assertEqual(stats["waiting"], {"foreground": 1, "background": 1})
+        for thread in threads:
+            thread.join(2)
+        self.assertEqual(limiter.stats()["waiting"],
+                         {"foreground": 0, "background": 0})
+        self.assertEqual(limiter.stats()["max_waiting"], 2)
+
+    def test_acquire_without_cache_is_not_paced(self):
+        self.limiter.acquire(None)
+        self.limiter.acquire(None)
+
+        self.assertEqual(self.limiter.stats()["acquired"], 0)
+
+    def test_acquire_async_paces_without_blocking_loop(self):
+        ticks = []
+
+        async def tick():
+            while len(ticks) < 5:
+                ticks.append(1)
+                await asyncio.sleep(0.01)
+
+        async def main():
+            ticker = asyncio.create_task(tick())
+            for _ in range(2):
+                await self.limiter.acquire_async(self.cache)
+            await ticker
+
+        started = time.monotonic()
+        asyncio.run(main())
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+        self.assertEqual(self.limiter.stats()["acquired"], 2)
+
+    def test_token_is_taken_outside_the_lock(self):
+        calls = []
+
+        class RemoteBucket:
+            # Like Redis: a blocking round-trip per token.
+            def take_request_token(bucket, rate, burst):
+                calls.append((self.limiter._lock.locked(),
+                              threading.get_ident()))
+                return 0
+
+        self.limiter.acquire(RemoteBucket())
+
+        async def main():
+            await self.limiter.acquire_async(RemoteBucket())
+            return threading.get_ident()
+
+        loop_thread = asyncio.run(main())
+
+        self.assertEqual([locked for locked, _ in calls], [False, False])
+        # The async caller's round-trip runs off the event loop.
+        self.assertNotEqual(calls[1][1], loop_thread)
+
+    def test_background_priority_context(self):
+        self.assertEqual(current_priority(), FOREGROUND)
+        with background_priority():
+            self.assertEqual(current_priority(), BACKGROUND)
+        self.assertEqual(current_priority(), FOREGROUND)
+
+
+if __name__ == '__main__':
+    unittest.main()
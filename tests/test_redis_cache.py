@@ -0,0 +1,209 @@
+import math
+import time
+import unittest
+from datetime import datetime, timezone
+from app.cache import EventRequestCache
+from app.models import Group
+from app.redis_cache import RedisEventRequestCache
+
+
+class FakeRedis:
+    """Stand-in for redis.Redis(decode_responses=True), covering just the
+    commands RedisEventRequestCache sends."""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def _alive(self, name):
+        expires = self.expires.get(name)
+        if expires is not None and time.monotonic() >= expires:
+            self.data.pop(name, None)
+            self.expires.pop(name, None)
+        return name in self.data
+
+    def get(self, name):
+        return self.data[name] if self._alive(name) else None
+
+    def mget(self, *names):
+        return [self.get(name) for name in names]
+
+    def set(self, name, value, px=None, nx=False):
+        if nx and self._alive(name):
+            return None
+        self.data[name] = str(value)
+        self.expires.pop(name, None)
+        if px is not None:
+            self.expires[name] = time.monotonic() + px / 1000
+        return True
+
+    def delete(self, *names):
+        deleted = 0
+        for name in names:
+            deleted += int(self._alive(name))
+            self.data.pop(name, None)
+            self.expires.pop(name, None)
+        return deleted
+
+    def pttl(self, name):
+        if not self._alive(name):
+            return -2
+        if name not in self.expires:
+            return -1
+        return int((self.expires[name] - time.monotonic()) * 1000)
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def set(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+    def execute(self):
+        return [self.client.set(*args, **kwargs)
+                for args, kwargs in self.commands]
+
+
+class TestRedisEventRequestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeRedis()
+        self.cache = RedisEventRequestCache(self.client, prefix="request_")
+
+    def test_get_existing_key(self):
+        dt = datetime.fromtimestamp(123, timezone.utc)
+        self.cache.set({"param": "value"}, {"key": "value"}, last_modified=dt,
+                       ex=3600)
+
+        response = self.cache.get({"param": "value"})
+
+        self.assertEqual(response["content"], '{"key": "value"}')
+        self.assertEqual(response["json"], {"key": "value"})
+        self.assertEqual(response["last_modified"], dt)
+
+    def test_uses_same_keys_as_memory_cache(self):
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=3600)
+
+        expected_key = EventRequestCache(prefix="request_").generate_key(
+            {"param": "value"}) + ":content"
+        self.assertEqual(self.client.get(expected_key), '{"key": "value"}')
+
+    def test_get_non_existing_key(self):
+        self.assertIsNone(self.cache.get({"param": "value"}))
+        self.assertIsNone(self.cache.peek({"param": "value"}))
+        self.assertIsNone(self.cache.peek_digest({"param": "value"}))
+        self.assertIsNone(self.cache.ttl({"param": "value"}))
+
+    def test_peek_digest_outlives_expired_content(self):
+        dt = datetime.fromtimestamp(123, timezone.utc)
+        self.cache.set({"param": "value"}, {"key": "value"}, last_modified=dt,
+                       ex=-1)
+        time.sleep(0.01)
+
+        self.assertIsNone(self.cache.get({"param": "value"}))
+        self.assertIsNone(self.cache.peek({"param": "value"}))
+        self.assertEqual(self.cache.peek_digest({"param": "value"}), {
+            "digest": self.cache.content_digest({"key": "value"}),
+            "last_modified": dt
+        })
+        self.assertLess(self.cache.ttl({"param": "value"}), 0)
+
+    def test_content_expires_from_redis_with_entry(self):
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=3600)
+
+        key = self.cache.generate_key({"param": "value"})
+        remaining = self.client.pttl(key + ":content") / 1000
+        self.assertTrue(3600 - 5 < remaining <= 3600)
+
+    def test_digest_expires_from_redis_after_retention(self):
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=3600)
+
+        key = self.cache.generate_key({"param": "value"}) + ":digest"
+        remaining = self.client.pttl(key) / 1000
+        retention = EventRequestCache.STALE_RETENTION_SECONDS
+        self.assertTrue(3600 + retention - 5 < remaining <= 3600 + retention)
+
+    def test_set_without_expiry(self):
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=None)
+
+        self.assertEqual(self.cache.get({"param": "value"})["json"],
+                         {"key": "value"})
+        self.assertEqual(self.cache.ttl({"param": "value"}), math.inf)
+        key = self.cache.generate_key({"param": "value"}) + ":content"
+        self.assertEqual(self.client.pttl(key), -1)
+
+    def test_entries_are_shared_between_instances(self):
+        other_worker = RedisEventRequestCache(self.client, prefix="request_")
+
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=3600)
+
+        self.assertEqual(other_worker.get({"param": "value"})["json"],
+                         {"key": "value"})
+
+    def test_set_object_is_stored_as_json(self):
+        groups = Group.from_json([{"key": "a", "title": "A"}])
+        other_worker = RedisEventRequestCache(self.client, prefix="request_")
+
+        self.cache.set_object({"param": "value"}, groups, Group, ex=3600)
+
+        response = other_worker.get_object({"param": "value"}, Group)
+        self.assertEqual([g.key for g in response["items"]], ["a"])
+        self.assertEqual(other_worker.get({"param": "value"})["json"],
+                         Group.to_json(groups))
+
+    def test_get_version_is_shared_across_instances(self):
+        dt = datetime.fromtimestamp(123, timezone.utc)
+        other_worker = RedisEventRequestCache(self.client, prefix="request_")
+        self.assertIsNone(other_worker.get_version({"param": "value"}))
+
+        self.cache.set({"param": "value"}, {"key": "value"}, last_modified=dt,
+                       ex=3600)
+
+        version = other_worker.get_version({"param": "value"})
+        self.assertEqual(version["last_modified"], dt)
+        self.assertEqual(version, self.cache.get_version({"param": "value"}))
+
+    def test_add_is_exclusive_across_instances(self):
+        other_worker = RedisEventRequestCache(self.client, prefix="request_")
+
+        self.assertTrue(self.cache.add("events-refresh-lock", "1", ex=60))
+        self.assertFalse(other_worker.add("events-refresh-lock", "1", ex=60))
+        self.assertIsNotNone(other_worker.get("events-refresh-lock"))
+
+    def test_delete_is_seen_by_other_instances(self):
+        other_worker = RedisEventRequestCache(self.client, prefix="request_")
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=3600)
+        self.assertTrue(self.cache.add("lock", "1", ex=60))
+
+        self.cache.delete({"param": "value"})
+        self.cache.delete("lock")
+
+        self.assertIsNone(other_worker.peek_digest({"param": "value"}))
+        self.assertTrue(other_worker.add("lock", "1", ex=60))
+        key = self.cache.generate_key({"param": "value"})
+        self.assertEqual([k for k in self.client.data if k.startswith(key)],
+                         [])
+
+    def test_take_request_token_is_shared_across_instances(self):
+        other_worker = RedisEventRequestCache(self.client, prefix="request_")
+
+        self.assertEqual(self.cache.take_request_token(1.0, 1), 0)
+
+        wait_sec = other_worker.take_request_token(1.0, 1)
+        self.assertTrue(0 < wait_sec <= 1)
+
+    def test_take_request_token_allows_burst(self):
+        self.assertEqual(self.cache.take_request_token(1.0, 2), 0)
+        self.assertEqual(self.cache.take_request_token(1.0, 2), 0)
+
+        wait_sec = self.cache.take_request_token(1.0, 2)
+        self.assertTrue(1 < wait_sec <= 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import math
+import unittest
+from unittest.mock import patch
+from app.refresh import RefreshAheadScheduler
+
+
+class TestRefreshAheadScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = RefreshAheadScheduler(window_ratio=0.1,
+                                               early_expiration=True)
+
+    def test_should_refresh_missing_entry(self):
+        self.assertTrue(self.scheduler.should_refresh(None, 3600, 600))
+
+    def test_should_not_refresh_pinned_entry(self):
+        self.assertFalse(self.scheduler.should_refresh(math.inf, 3600, 600))
+
+    def test_should_not_refresh_fresh_entry(self):
+        # Stored 10 seconds ago, due after 600.
+        self.assertFalse(self.scheduler.should_refresh(3590, 3600, 600))
+
+    def test_should_refresh_once_due(self):
+        # Stored 700 seconds ago, due after 600.
+        self.assertTrue(self.scheduler.should_refresh(2900, 3600, 600))
+
+    def test_should_refresh_inside_window_is_probabilistic(self):
+        # Stored 570 seconds ago: 30 seconds into the 60 second window.
+        with patch("app.refresh.random.random", return_value=0.4):
+            self.assertTrue(self.scheduler.should_refresh(3030, 3600, 600))
+        with patch("app.refresh.random.random", return_value=0.6):
+            self.assertFalse(self.scheduler.should_refresh(3030, 3600, 600))
+
+    def test_should_not_refresh_inside_window_without_early_expiration(self):
+        scheduler = RefreshAheadScheduler(window_ratio=0.1,
+                                          early_expiration=False)
+        with patch("app.refresh.random.random", return_value=0.0):
+            self.assertFalse(scheduler.should_refresh(3030, 3600, 600))
+
+    def test_try_begin_drops_duplicate_refresh(self):
+        self.assertTrue(self.scheduler.try_begin("key"))
+        self.assertFalse(self.scheduler.try_begin("key"))
+        self.assertTrue(self.scheduler.try_begin("other-key"))
+
+        self.scheduler.finish("key")
+
+        self.assertTrue(self.scheduler.try_begin("key"))
+
+
+    def test_try_begin_reclaims_lapsed_claim(self):
+        scheduler = RefreshAheadScheduler(claim_ttl=60)
+        with patch("app.refresh.time.monotonic", return_value=1000.0):
+            self.assertTrue(scheduler.try_begin("key"))
+        with patch("app.refresh.time.monotonic", return_value=1059.0):
+            self.assertFalse(scheduler.try_begin("key"))
+        # Never finished (e.g. dropped with a failed request): free again.
+        with patch("app.refresh.time.monotonic", return_value=1060.0):
+            self.assertTrue(scheduler.try_begin("key"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import gzip
+import unittest
+from unittest.mock import patch
+from app.responses import ENCODINGS, RenderedResponse, ResponseCache
+from app.responses import compress, negotiate_encoding
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.responses = ResponseCache()
+
+    def test_get_only_returns_entry_of_same_version(self):
+        self.responses.put("key", RenderedResponse(b"[]", version=1))
+
+        self.assertEqual(self.responses.get("key", 1).body, b"[]")
+        self.assertIsNone(self.responses.get("key", 2))
+        self.assertIsNone(self.responses.get("other", 1))
+        self.assertEqual(self.responses.stats()["hits"], 1)
+        self.assertEqual(self.responses.stats()["misses"], 2)
+
+    def test_put_evicts_least_recently_used_over_budget(self):
+        responses = ResponseCache(max_bytes=10)
+        responses.put("a", RenderedResponse(b"aaaa", version=1))
+        responses.put("b", RenderedResponse(b"bbbb", version=1))
+        responses.get("a", 1)
+
+        responses.put("c", RenderedResponse(b"cccc", version=1))
+
+        self.assertIsNotNone(responses.get("a", 1))
+        self.assertIsNone(responses.get("b", 1))
+        self.assertIsNotNone(responses.get("c", 1))
+        self.assertEqual(responses.stats()["bytes"], 8)
+        self.assertEqual(responses.stats()["evictions"], 1)
+
+    def test_put_skips_entry_larger_than_budget(self):
+        responses = ResponseCache(max_bytes=2)
+
+        responses.put("a", RenderedResponse(b"aaaa", version=1))
+
+        self.assertIsNone(responses.get("a", 1))
+        self.assertEqual(responses.stats()["bytes"], 0)
+
+    def test_generate_key_normalizes_fields(self):
+        key = ResponseCache.generate_key("events", {"ym": ["202401"]},
+                                         "uid, title")
+
+        self.assertEqual(
+            ResponseCache.generate_key("events", {"ym": ["202401"]},
+                                       "title,uid,"), key)
+        self.assertEqual(
+            ResponseCache.generate_key("events", {"ym": ["202401"]}, ""),
+            ResponseCache.generate_key("events", {"ym": ["202401"]}))
+        self.assertNotEqual(
+            ResponseCache.generate_key("events", {"ym": ["202402"]},
+                                       "uid,title"), key)
+
+
+
+class TestRenderedResponse(unittest.TestCase):
+
+    def test_compresses_body_of_at_least_min_bytes(self):
+        body = b'[{"description": "' + b"x" * 2000 + b'"}]'
+
+        rendered = RenderedResponse(body, version=1, compress_min_bytes=1024)
+        small = RenderedResponse(b"[]", version=1, compress_min_bytes=1024)
+
+        self.assertEqual(gzip.decompress(rendered.variant("gzip")), body)
+        etag = rendered.variant_etag("gzip")
+        self.assertNotEqual(etag, rendered.etag)
+        self.assertIn(etag, rendered.etags())
+        self.assertEqual(small.encodings, ())
+        self.assertEqual(small.etags(), [small.etag])
+
+    def test_compresses_lazily_unless_stored(self):
+        body = b"[" + b"1," * 1000 + b"1]"
+
+        with patch("app.responses.compress",
+                   side_effect=compress) as mock_compress:
+            rendered = RenderedResponse(body, version=1,
+                                        compress_min_bytes=0)
+            self.assertIn(rendered.variant_etag("gzip"), rendered.etags())
+            mock_compress.assert_not_called()
+
+            rendered.variant("gzip")
+            rendered.variant("gzip")
+            mock_compress.assert_called_once_with(body, "gzip")
+
+            ResponseCache().put("key", rendered)
+            self.assertEqual(mock_compress.call_count, len(ENCODINGS))
+        self.assertEqual(rendered.size(),
+                         len(body) + sum(len(rendered.variant(encoding))
+                                         for encoding in ENCODINGS))
+
+    def test_compressed_variant_is_deterministic(self):
+        body = b"[" + b"1," * 1000 + b"1]"
+
+        first = RenderedResponse(body, version=1, compress_min_bytes=0)
+        second = RenderedResponse(body, version=2, compress_min_bytes=0)
+
+        self.assertEqual(first.variant("gzip"), second.variant("gzip"))
+
+
+class TestNegotiateEncoding(unittest.TestCase):
+
+    def test_negotiate_encoding(self):
+        available = ["br", "gzip"]
+
+        self.assertEqual(negotiate_encoding("gzip, deflate, br", available),
+                         "br")
+        self.assertEqual(negotiate_encoding("br;q=0.5, gzip", available),
+                         "gzip")
+        self.assertEqual(negotiate_encoding("*", available), "br")
+        self.assertEqual(negotiate_encoding("gzip;q=0, *;q=0.1", available),
+                         "br")
+        self.assertIsNone(negotiate_encoding("identity", available))
+        self.assertIsNone(negotiate_encoding("gzip;q=0", ["gzip"]))
+        self.assertIsNone(negotiate_encoding(None, available))
+        self.assertIsNone(negotiate_encoding("gzip", []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,340 @@
+import threading
+import time
+import unittest
+from datetime import datetime, timezone
+from app.cache import EventRequestCache
+from app.models import Event
+from app.shards import MonthShardedRequest, MonthTtlPolicy
+
+
+def make_event(uid, started_at, updated_at=None, title=None):
+    return Event.from_json({
+        "uid": uid,
+        "title": title or uid,
+        "event_url": f"https://example.com/{uid}",
+        "started_at": started_at,
+        "ended_at": started_at,
+        "updated_at": updated_at or started_at,
+        "open_status": "open"
+    })
+
+
+class FakeRequest:
+    """Answers any ym with the events in those months."""
+
+    def __init__(self, events, ym, calls, last_modified=123):
+        self.events = events
+        self.ym = ym
+        self.last_modified = last_modified
+        calls.append(ym)
+
+    def get_events(self):
+        return [ev for ev in self.events
+                if ev.started_at[:7].replace("-", "") in self.ym]
+
+    def get_last_modified(self):
+        return datetime.fromtimestamp(self.last_modified, timezone.utc)
+
+
+class TestMonthShardedRequest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = EventRequestCache(prefix="test_shards_")
+        self.calls = []
+        self.events = [
+            make_event("a", "2024-01-10T10:00:00+09:00"),
+            make_event("b", "2024-02-10T10:00:00+09:00"),
+            make_event("c", "2024-03-10T10:00:00+09:00"),
+        ]
+
+    def request(self, ym, source=None, **kwargs):
+        return MonthShardedRequest(
+            self.cache, source or {"source": "connpass"}, ym,
+            lambda months: FakeRequest(self.events, months, self.calls),
+            **kwargs)
+
+    def test_fetches_missing_months_in_one_request(self):
+        events = self.request(["202401", "202402"]).get_events()
+
+        self.assertEqual([e.uid for e in events], ["a", "b"])
+        self.assertEqual(self.calls, [["202401", "202402"]])
+
+    def test_overlapping_month_lists_share_shards(self):
+        self.request(["202401", "202402"]).get_events()
+
+        r = self.request(["202402", "202403"])
+        events = r.get_events()
+
+        self.assertEqual([e.uid for e in events], ["b", "c"])
+        self.assertEqual(self.calls, [["202401", "202402"], ["202403"]])
+        self.assertEqual(r.get_last_modified(),
+                         datetime.fromtimestamp(123, timezone.utc))
+
+    def test_empty_month_is_cached_too(self):
+        self.request(["202312"]).get_events()
+        self.request(["202312"]).get_events()
+
+        self.assertEqual(self.calls, [["202312"]])
+
+    def test_expired_month_is_refetched(self):
+        self.request(["202401"], ex=-1).get_events()
+        self.request(["202401", "202402"]).get_events()
+
+        self.assertEqual(self.calls, [["202401"], ["202401", "202402"]])
+
+    def test_skip_cache_refetches_every_month(self):
+        self.request(["202401"]).get_events()
+        self.request(["202401"], skip_cache=True).get_events()
+
+        self.assertEqual(self.calls, [["202401"], ["202401"]])
+
+    def test_unparseable_updated_at_is_served(self):
+        # Without sync, updated_at is never looked at.
+        self.events = [
+            make_event("a", "2024-01-10T10:00:00+09:00",
+                       "2024-01-01T00:00:00Z"),
+            make_event("b", "2024-01-11T10:00:00+09:00",
+                       "2024-01-01T00:00:00"),
+            make_event("c", "2024-01-12T10:00:00+09:00", "yesterday"),
+        ]
+
+        events = self.request(["202401"]).get_events()
+
+        self.assertEqual([e.uid for e in events], ["a", "b", "c"])
+
+    def test_sources_keep_separate_shards(self):
+        self.request(["202401"], source={"source": "a"}).get_events()
+        self.request(["202401"], source={"source": "b"}).get_events()
+
+        self.assertEqual(len(self.calls), 2)
+
+    def test_returned_events_are_copies(self):
+        self.request(["202401"]).get_events()[0].group_key = "relabeled"
+
+        events = self.request(["202401"]).get_events()
+
+        self.assertIsNone(events[0].group_key)
+
+    def test_ttl_policy_keeps_closed_months_longer(self):
+        policy = MonthTtlPolicy(closed_after_months=2, closed_ttl=None)
+        now = datetime.now()
+        current = f"{now.year:04}{now.month:02}"
+
+        self.request(["202401", current], ex=3600,
+                     ttl_policy=policy).get_events()
+
+        key = self.cache.generate_key({"shard": {"source": "connpass"},
+                                       "ym": "202401"})
+        self.assertIsNone(self.cache._expiry[key + ":content"])
+        self.assertTrue(3590 < self.cache.ttl(
+            {"shard": {"source": "connpass"}, "ym": current}) <= 3600)
+
+    def test_invalidate_refetches_month_for_every_source(self):
+        policy = MonthTtlPolicy(closed_ttl=None)
+        for source in ({"source": "a"}, {"source": "b"}):
+            self.request(["202401", "202402"], source=source,
+                         ttl_policy=policy).get_events()
+
+        MonthShardedRequest.invalidate(self.cache, ["202402"])
+        self.calls.clear()
+        for source in ({"source": "a"}, {"source": "b"}):
+            events = self.request(["202401", "202402"], source=source,
+                                  ttl_policy=policy).get_events()
+            self.assertEqual([e.uid for e in events], ["a", "b"])
+
+        self.assertEqual(self.calls, [["202402"], ["202402"]])
+
+
+    def test_refetch_deletes_superseded_shards(self):
+        policy = MonthTtlPolicy(closed_ttl=None)
+        self.request(["202401"], ttl_policy=policy).get_events()
+        MonthShardedRequest.invalidate(self.cache, ["202401"])
+        MonthShardedRequest.invalidate(self.cache, ["202401"])
+
+        self.request(["202401"], ttl_policy=policy).get_events()
+
+        key = {"shard": {"source": "connpass"}, "ym": "202401"}
+        self.assertIsNone(self.cache.peek(key))
+        self.assertIsNone(self.cache.peek({**key, "generation": 1}))
+        self.assertIsNotNone(self.cache.get({**key, "generation": 2}))
+
+    def test_concurrent_invalidations_keep_every_bump(self):
+        class SlowCache(EventRequestCache):
+            def get(self, key_data):
+                response = super().get(key_data)
+                if key_data == MonthShardedRequest.GENERATIONS_KEY:
+                    # Wide open to a lost update without the lock.
+                    time.sleep(0.05)
+                return response
+
+        cache = SlowCache(prefix="test_shards_slow_")
+        threads = [threading.Thread(target=MonthShardedRequest.invalidate,
+                                    args=(cache, [month]))
+                   for month in ("202401", "202402")]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(MonthShardedRequest._load_generations(cache),
+                         {"202401": 1, "202402": 1})
+
+
+class TestMonthShardedRequestSync(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = EventRequestCache(prefix="test_shards_sync_")
+        self.calls = []
+        self.syncs = []
+        self.updates = {}
+        self.events = [
+            make_event("a", "2024-01-10T10:00:00+09:00"),
+            make_event("b", "2024-02-10T10:00:00+09:00"),
+        ]
+
+    def sync(self, since):
+        self.syncs.append(since)
+        return self.updates
+
+    def request(self, ym, ex=-1, **kwargs):
+        # ex=-1: every shard is already due when read back.
+        return MonthShardedRequest(
+            self.cache, {"source": "connpass"}, ym,
+            lambda months: FakeRequest(self.events, months, self.calls),
+            ex=ex, sync=self.sync, **kwargs)
+
+    def test_stale_shard_is_synced_from_watermark(self):
+        self.request(["202401", "202402"]).get_events()
+
+        self.updates = {"b": make_event("b", "2024-02-10T10:00:00+09:00",
+                                        "2024-03-01T00:00:00+09:00",
+                                        title="renamed")}
+        events = self.request(["202401", "202402"]).get_events()
+
+        self.assertEqual([e.title for e in events], ["a", "renamed"])
+        self.assertEqual(self.calls, [["202401", "202402"]])
+        self.assertEqual(self.syncs, ["2024-02-10T10:00:00+09:00"])
+
+        self.request(["202401", "202402"]).get_events()
+        self.assertEqual(self.syncs[-1], "2024-03-01T00:00:00+09:00")
+
+    def test_fresh_shard_is_not_synced(self):
+        self.request(["202401"], ex=3600).get_events()
+        self.request(["202401"], ex=3600).get_events()
+
+        self.assertEqual(self.syncs, [])
+
+    def test_sync_moves_and_drops_events(self):
+        self.request(["202401", "202402"]).get_events()
+
+        self.updates = {
+            "a": make_event("a", "2024-02-20T10:00:00+09:00",
+                            "2024-03-01T00:00:00+09:00"),
+            "b": None,
+            "c": make_event("c", "2024-01-05T10:00:00+09:00",
+                            "2024-03-01T00:00:00+09:00"),
+        }
+        events = self.request(["202401", "202402"]).get_events()
+
+        self.assertEqual([(e.uid, e.started_at[:10]) for e in events],
+                         [("c", "2024-01-05"), ("a", "2024-02-20")])
+
+    def test_unchanged_sync_keeps_last_modified(self):
+        self.request(["202401"]).get_events()
+
+        self.updates = {"a": make_event("a", "2024-01-10T10:00:00+09:00")}
+        r = self.request(["202401"])
+        r.get_events()
+
+        self.assertEqual(r.get_last_modified(),
+                         datetime.fromtimestamp(123, timezone.utc))
+
+    def test_failed_sync_refetches_in_full(self):
+        self.request(["202401"]).get_events()
+
+        self.updates = None
+        self.request(["202401"]).get_events()
+
+        self.assertEqual(self.calls, [["202401"], ["202401"]])
+
+    def test_month_without_watermark_is_refetched(self):
+        self.request(["202312"]).get_events()
+        self.request(["202312"]).get_events()
+
+        self.assertEqual(self.syncs, [])
+        self.assertEqual(self.calls, [["202312"], ["202312"]])
+
+    def test_watermark_skips_unparseable_updated_at(self):
+        self.events = [
+            make_event("a", "2024-01-10T10:00:00+09:00", "yesterday"),
+            make_event("b", "2024-01-11T10:00:00+09:00",
+                       "2024-01-01T00:00:00"),
+            make_event("c", "2024-01-12T10:00:00+09:00",
+                       "2024-01-02T00:00:00+09:00"),
+        ]
+        self.request(["202401"]).get_events()
+        self.request(["202401"]).get_events()
+
+        self.assertEqual(self.syncs, ["2024-01-02T00:00:00+09:00"])
+
+    def test_month_without_parseable_watermark_is_refetched(self):
+        self.events = [make_event("a", "2024-01-10T10:00:00+09:00",
+                                  "yesterday")]
+        self.request(["202401"]).get_events()
+        self.request(["202401"]).get_events()
+
+        self.assertEqual(self.syncs, [])
+        self.assertEqual(self.calls, [["202401"], ["202401"]])
+
+    def test_concurrent_requests_keep_each_others_sync_state(self):
+        self.request(["202403"], ex=3600).get_events()
+        other = self.request(["202402", "202403"], ex=3600)
+
+        def make_request(months):
+            # Another request stores its month while this one fetches.
+            other.get_events()
+            return FakeRequest(self.events, months, self.calls)
+
+        MonthShardedRequest(
+            self.cache, {"source": "connpass"}, ["202401", "202403"],
+            make_request, ex=3600, sync=self.sync).get_events()
+        self.calls.clear()
+        self.request(["202401", "202402"], ex=3600).get_events()
+
+        self.assertEqual(self.calls, [])
+        self.assertEqual(self.syncs, [])
+
+    def test_skip_cache_refetches_synced_shards_in_full(self):
+        self.request(["202401"], ex=3600).get_events()
+
+        # Deleted upstream, which a sync wouldn't notice.
+        self.events = []
+        events = self.request(["202401"], ex=3600,
+                              skip_cache=True).get_events()
+
+        self.assertEqual(events, [])
+        self.assertEqual(self.calls, [["202401"], ["202401"]])
+        self.assertEqual(self.syncs, [])
+
+
+class TestMonthTtlPolicy(unittest.TestCase):
+
+    def test_is_closed(self):
+        policy = MonthTtlPolicy(closed_after_months=2)
+        today = datetime(2026, 10, 18)
+
+        self.assertTrue(policy.is_closed("202607", today))
+        self.assertTrue(policy.is_closed("202512", today))
+        self.assertFalse(policy.is_closed("202608", today))
+        self.assertFalse(policy.is_closed("202610", today))
+        self.assertFalse(policy.is_closed("202703", today))
+
+    def test_ttl(self):
+        policy = MonthTtlPolicy(closed_after_months=0, closed_ttl=86400)
+
+        self.assertEqual(policy.ttl("201001", 3600), 86400)
+        self.assertEqual(policy.ttl("209912", 3600), 3600)
+
+
+if __name__ == '__main__':
+    unittest.main()
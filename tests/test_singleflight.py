@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from app.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight()
+
+    def test_do_coalesces_concurrent_calls(self):
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(1)
+            return "result"
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            leader = executor.submit(self.flight.do, "key", fetch)
+            started.wait(1)
+            followers = [executor.submit(self.flight.do, "key", fetch)
+                         for _ in range(3)]
+            # Let the followers reach the wait before the leader finishes.
+            time.sleep(0.05)
+            release.set()
+            results = [leader.result()] + [f.result() for f in followers]
+
+        self.assertEqual(results, ["result"] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertFalse(self.flight.in_flight("key"))
+
+    def test_do_shares_exception_with_waiting_callers(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def fail():
+            started.set()
+            release.wait(1)
+            raise ValueError("upstream failed")
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(self.flight.do, "key", fail)
+            started.wait(1)
+            follower = executor.submit(self.flight.do, "key", fail)
+            time.sleep(0.05)
+            release.set()
+
+            with self.assertRaises(ValueError):
+                leader.result()
+            with self.assertRaises(ValueError):
+                follower.result()
+
+    def test_do_runs_again_after_call_returns(self):
+        calls = []
+
+        self.flight.do("key", calls.append, 1)
+        self.flight.do("key", calls.append, 2)
+
+        self.assertEqual(calls, [1, 2])
+
+    def test_do_does_not_coalesce_different_keys(self):
+        calls = []
+
+        self.flight.do("key1", calls.append, 1)
+        self.flight.do("key2", calls.append, 2)
+
+        self.assertEqual(calls, [1, 2])
+
+    def test_do_async_coalesces_concurrent_tasks(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def run_all():
+            return await asyncio.gather(
+                *(self.flight.do_async("key", fetch) for _ in range(4)))
+
+        self.assertEqual(asyncio.run(run_all()), ["result"] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertFalse(self.flight.in_flight("key"))
+
+    def test_do_async_joins_a_flight_started_by_do(self):
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(1)
+            return "result"
+
+        async def never_called():
+            calls.append(2)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            leader = executor.submit(self.flight.do, "key", fetch)
+            started.wait(1)
+            threading.Timer(0.05, release.set).start()
+            result = asyncio.run(self.flight.do_async("key", never_called))
+
+            self.assertEqual(leader.result(), "result")
+        self.assertEqual(result, "result")
+        self.assertEqual(calls, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
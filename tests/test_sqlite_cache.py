@@ -0,0 +1,176 @@
+import math
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+from datetime import datetime, timezone
+from app.cache import EventRequestCache
+from app.models import Group
+from app.sqlite_cache import SqliteEventRequestCache
+
+
+class TestSqliteEventRequestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.sqlite3")
+        self.cache = SqliteEventRequestCache(self.path, prefix="request_")
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def restart(self) -> SqliteEventRequestCache:
+        """A new process' cache: empty memory, same file."""
+        self.cache.flush()
+        return SqliteEventRequestCache(self.path, prefix="request_")
+
+    def test_get_survives_restart(self):
+        dt = datetime.fromtimestamp(123, timezone.utc)
+        self.cache.set({"param": "value"}, {"key": "value"}, last_modified=dt,
+                       ex=3600)
+
+        response = self.restart().get({"param": "value"})
+
+        self.assertEqual(response["content"], '{"key": "value"}')
+        self.assertEqual(response["json"], {"key": "value"})
+        self.assertEqual(response["last_modified"], dt)
+
+    def test_ttl_survives_restart(self):
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=3600)
+        self.cache.set({"param": "pinned"}, {"key": "value"}, ex=None)
+
+        cache = self.restart()
+
+        self.assertTrue(3590 < cache.ttl({"param": "value"}) <= 3600)
+        self.assertEqual(cache.ttl({"param": "pinned"}), math.inf)
+        self.assertIsNone(cache.ttl({"param": "missing"}))
+
+    def test_expired_entry_is_only_peekable_after_restart(self):
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=-1)
+
+        cache = self.restart()
+
+        self.assertIsNone(cache.get({"param": "value"}))
+        self.assertEqual(cache.peek({"param": "value"})["json"],
+                         {"key": "value"})
+
+    def test_delete_survives_restart(self):
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=3600)
+        # Queued behind the write it undoes.
+        self.cache.delete({"param": "value"})
+
+        cache = self.restart()
+        self.assertIsNone(cache.peek({"param": "value"}))
+        self.assertIsNone(cache.peek_digest({"param": "value"}))
+
+    def test_set_evicted_before_write_behind_is_skipped(self):
+        # As if a concurrent set() evicted the entry the moment it landed
+        # in memory.
+        def set_then_evict(cache, key_data, *args, **kwargs):
+            EventRequestCache._delete(cache, cache.generate_key(key_data))
+
+        with patch.object(EventRequestCache, "set", autospec=True,
+                          side_effect=set_then_evict):
+            self.cache.set({"param": "value"}, {"key": "value"}, ex=3600)
+
+        self.assertIsNone(self.restart().peek({"param": "value"}))
+
+    def test_renew_survives_restart(self):
+        dt = datetime.fromtimestamp(123, timezone.utc)
+        self.cache.set({"param": "value"}, {"key": "value"}, last_modified=dt,
+                       ex=-1)
+
+        cache = self.restart()
+        self.assertEqual(cache.renew({"param": "value"}, ex=3600)["json"],
+                         {"key": "value"})
+        cache.flush()
+        self.cache = cache
+
+        response = self.restart().get({"param": "value"})
+        self.assertEqual(response["json"], {"key": "value"})
+        self.assertEqual(response["last_modified"], dt)
+
+    def test_set_without_last_modified_keeps_previous(self):
+        dt = datetime.fromtimestamp(123, timezone.utc)
+        self.cache.set({"param": "value"}, {"key": "old"}, last_modified=dt)
+        self.cache.set({"param": "value"}, {"key": "new"})
+
+        response = self.restart().get({"param": "value"})
+
+        self.assertEqual(response["json"], {"key": "new"})
+        self.assertEqual(response["last_modified"], dt)
+
+    def test_set_object_survives_restart(self):
+        groups = Group.from_json([{"key": "a", "title": "A"}])
+        self.cache.set_object({"param": "value"}, groups, Group, ex=3600)
+
+        response = self.restart().get_object({"param": "value"}, Group)
+
+        self.assertEqual([g.key for g in response["items"]], ["a"])
+
+    def test_sweep_deletes_rows_stale_beyond_retention(self):
+        already_stale_ex = -(EventRequestCache.STALE_RETENTION_SECONDS + 1)
+        self.cache.set({"param": "old"}, {"key": "value"}, ex=already_stale_ex)
+        self.cache.set({"param": "recent"}, {"key": "value"}, ex=-1)
+        self.cache.flush()
+
+        self.cache.sweep()
+
+        cache = self.restart()
+        self.assertIsNone(cache.peek_digest({"param": "old"}))
+        self.assertIsNotNone(cache.peek_digest({"param": "recent"}))
+
+    def test_sweep_keeps_only_digest_of_expired_rows(self):
+        dt = datetime.fromtimestamp(123, timezone.utc)
+        self.cache.set({"param": "value"}, {"key": "value"}, last_modified=dt,
+                       ex=-1)
+        self.cache.flush()
+
+        self.cache.sweep()
+
+        cache = self.restart()
+        self.assertIsNone(cache.peek({"param": "value"}))
+        self.assertEqual(cache.peek_digest({"param": "value"}), {
+            "digest": cache.content_digest({"key": "value"}),
+            "last_modified": dt
+        })
+
+    def test_set_object_digest_survives_restart(self):
+        groups = Group.from_json([{"key": "a", "title": "A"}])
+        self.cache.set_object({"param": "value"}, groups, Group, ex=3600)
+
+        digest = self.restart().peek_digest({"param": "value"})["digest"]
+
+        self.assertEqual(digest,
+                         self.cache.content_digest(Group.to_json(groups)))
+
+    def test_get_version_survives_restart(self):
+        dt = datetime.fromtimestamp(123, timezone.utc)
+        self.cache.set({"param": "value"}, {"key": "value"}, last_modified=dt,
+                       ex=3600)
+
+        version = self.restart().get_version({"param": "value"})
+
+        self.assertEqual(version["last_modified"], dt)
+
+    def test_drops_table_from_older_schema(self):
+        self.cache.close()
+        conn = sqlite3.connect(self.path)
+        with conn:
+            conn.execute("DROP TABLE entries")
+            conn.execute("CREATE TABLE entries (key TEXT PRIMARY KEY,"
+                         " content TEXT NOT NULL, last_modified INTEGER,"
+                         " expires_at REAL)")
+            conn.execute("PRAGMA user_version = 0")
+        conn.close()
+
+        self.cache = SqliteEventRequestCache(self.path, prefix="request_")
+        self.cache.set({"param": "value"}, {"key": "value"}, ex=3600)
+
+        self.assertEqual(self.restart().get({"param": "value"})["json"],
+                         {"key": "value"})
+
+if __name__ == '__main__':
+    unittest.main()
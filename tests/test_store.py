@@ -0,0 +1,217 @@
+import math
+import unittest
+from datetime import datetime, timezone
+from app.models import Event
+from app.store import EventStore
+
+
+def make_event(uid, started_at, group_key=None, source="connpass",
+               title=None):
+    return Event.from_json({
+        "uid": uid,
+        "title": title or uid,
+        "event_url": f"https://example.com/{uid}",
+        "started_at": started_at,
+        "ended_at": started_at,
+        "updated_at": started_at,
+        "open_status": "open",
+        "group_key": group_key,
+        "source": source
+    })
+
+
+class TestEventStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = EventStore()
+
+    def test_query_returns_window_sorted_by_started_at(self):
+        self.store.load(["202401", "202402"], [
+            make_event("b", "2024-02-01T10:00:00+09:00"),
+            make_event("a", "2024-01-31T10:00:00+09:00"),
+            make_event("c", "2024-02-15T10:00:00+09:00"),
+        ])
+
+        events, _ = self.store.query(["202402"])
+        self.assertEqual([e.uid for e in events], ["b", "c"])
+
+        events, _ = self.store.query(["20240131", "20240201"])
+        self.assertEqual([e.uid for e in events], ["a", "b"])
+
+    def test_load_ignores_events_outside_units(self):
+        self.store.load(["202401"], [
+            make_event("a", "2024-01-31T10:00:00+09:00"),
+            make_event("b", "2024-02-01T10:00:00+09:00"),
+        ])
+
+        self.assertEqual(self.store.stats()["events"], 1)
+
+    def test_load_replaces_previous_events_of_unit(self):
+        self.store.load(["202401"], [
+            make_event("a", "2024-01-10T10:00:00+09:00"),
+            make_event("b", "2024-01-11T10:00:00+09:00"),
+        ])
+        self.store.load(["202401"], [
+            make_event("b", "2024-01-12T10:00:00+09:00"),
+        ])
+
+        events, _ = self.store.query(["202401"])
+        self.assertEqual([(e.uid, e.started_at[:10]) for e in events],
+                         [("b", "2024-01-12")])
+
+    def test_load_moves_event_between_units(self):
+        self.store.load(["202401"], [
+            make_event("a", "2024-01-10T10:00:00+09:00")])
+        self.store.load(["202402"], [
+            make_event("a", "2024-02-10T10:00:00+09:00")])
+
+        self.assertEqual(self.store.query(["202401"])[0], [])
+        self.assertEqual([e.uid for e in self.store.query(["202402"])[0]],
+                         ["a"])
+
+    def test_day_is_covered_by_loaded_month(self):
+        self.store.load(["202401"], [])
+
+        self.assertEqual(self.store.missing(["20240105", "20240205"]),
+                         ["20240205"])
+        self.assertEqual(self.store.covering(["20240105", "20240106"]),
+                         ["202401"])
+
+    def test_expired_unit_is_missing(self):
+        self.store.load(["202401"], [], ex=-1)
+
+        self.assertEqual(self.store.missing(["202401"]), ["202401"])
+        self.assertLess(self.store.ttl("202401"), 0)
+
+    def test_invalidate_makes_units_missing_until_reloaded(self):
+        self.store.load(["202401"], [
+            make_event("a", "2024-01-10T10:00:00+09:00")])
+        self.store.load(["20240210"], [])
+
+        self.store.invalidate(["202401", "202402"])
+
+        self.assertEqual(self.store.missing(["202401", "20240210"]),
+                         ["202401", "20240210"])
+        self.store.load(["202401"], [])
+        self.assertEqual(self.store.query(["202401"])[0], [])
+
+    def test_ttl(self):
+        self.store.load(["202401"], [], ex=3600)
+        self.store.load(["202402"], [], ex=None)
+
+        self.assertTrue(3590 < self.store.ttl("202401") <= 3600)
+        self.assertEqual(self.store.ttl("202402"), math.inf)
+        self.assertIsNone(self.store.ttl("202403"))
+
+    def test_query_filters(self):
+        self.store.load(["202401"], [
+            make_event("a", "2024-01-10T10:00:00+09:00", group_key="g1",
+                       title="Python"),
+            make_event("b", "2024-01-11T10:00:00+09:00", group_key="g2",
+                       source="icalendar"),
+            make_event("c", "2024-01-12T10:00:00+09:00", group_key="g1",
+                       source="archive"),
+        ])
+
+        def uids(**kwargs):
+            return [e.uid for e in self.store.query(["202401"],
+                                                    **kwargs)[0]]
+
+        self.assertEqual(uids(keyword="python"), ["a"])
+        self.assertEqual(uids(uid="b"), ["b"])
+        self.assertEqual(uids(group_key="g1"), ["a", "c"])
+        self.assertEqual(uids(source="icalendar"), ["b"])
+        self.assertEqual(uids(group_key="g1", source="archive"), ["c"])
+        self.assertEqual(uids(group_key="missing"), [])
+
+    def test_query_last_modified_is_latest_of_units(self):
+        older = datetime.fromtimestamp(100, timezone.utc)
+        newer = datetime.fromtimestamp(200, timezone.utc)
+        self.store.load(["202401"], [], last_modified=newer)
+        self.store.load(["202402"], [], last_modified=older)
+
+        self.assertEqual(self.store.query(["202402"])[1], older)
+        self.assertEqual(self.store.query(["202401", "202402"])[1], newer)
+        self.assertEqual(self.store.query(["20240105"])[1], newer)
+        self.assertIsNone(self.store.query(["202403"])[1])
+
+    def test_query_does_not_repeat_day_inside_requested_month(self):
+        self.store.load(["202401"], [
+            make_event("a", "2024-01-10T10:00:00+09:00")])
+
+        events, _ = self.store.query(["202401", "20240110"])
+
+        self.assertEqual([e.uid for e in events], ["a"])
+
+    def test_month_load_supersedes_day_units(self):
+        self.store.load(["20240110"], [], ex=60)
+        self.store.load(["202401"], [], ex=3600)
+
+        self.assertEqual(self.store.covering(["20240110"]), ["202401"])
+        self.assertEqual(self.store.stats()["units"], 1)
+
+    def test_sweep_drops_expired_units_and_their_events(self):
+        self.store.load(["202401"], [
+            make_event("a", "2024-01-10T10:00:00+09:00")], ex=-1)
+        self.store.load(["202402"], [
+            make_event("b", "2024-02-10T10:00:00+09:00")], ex=3600)
+
+        self.assertEqual(self.store.sweep(), 1)
+
+        self.assertEqual(self.store.stats(),
+                         {"events": 1, "units": 1, "groups": 1})
+
+    def test_sweep_keeps_events_of_day_still_covered(self):
+        self.store.load(["202401"], [
+            make_event("a", "2024-01-10T10:00:00+09:00"),
+            make_event("b", "2024-01-11T10:00:00+09:00")])
+        self.store.load(["20240110"], [
+            make_event("a", "2024-01-10T10:00:00+09:00")], ex=-1)
+
+        self.store.sweep()
+
+        events, _ = self.store.query(["202401"])
+        self.assertEqual([e.uid for e in events], ["a", "b"])
+
+    def test_get_version_needs_every_unit_loaded(self):
+        dt = datetime.fromtimestamp(100, timezone.utc)
+        self.assertIsNone(self.store.get_version(["202401"]))
+
+        self.store.load(["202401"], [], last_modified=dt)
+
+        self.assertEqual(self.store.get_version(["20240105"])["last_modified"],
+                         dt)
+        self.assertIsNone(self.store.get_version(["202401", "202402"]))
+
+    def test_get_version_changes_when_its_units_are_loaded(self):
+        self.store.load(["202401"], [])
+        first = self.store.get_version(["202401"])["version"]
+
+        self.store.load(["202401"], [
+            make_event("a", "2024-01-01T10:00:00+09:00")])
+        self.assertNotEqual(self.store.get_version(["202401"])["version"],
+                            first)
+
+    def test_get_version_ignores_other_units(self):
+        self.store.load(["202401"], [])
+        first = self.store.get_version(["202401"])["version"]
+
+        self.store.load(["202402"], [
+            make_event("a", "2024-02-01T10:00:00+09:00")])
+        self.store.invalidate(["202402"])
+
+        self.assertEqual(self.store.get_version(["202401"])["version"], first)
+
+    def test_get_version_changes_when_an_event_moves_out(self):
+        self.store.load(["202401"], [
+            make_event("a", "2024-01-01T10:00:00+09:00")])
+        first = self.store.get_version(["202401"])["version"]
+
+        self.store.load(["202402"], [
+            make_event("a", "2024-02-01T10:00:00+09:00")])
+
+        self.assertNotEqual(self.store.get_version(["202401"])["version"],
+                            first)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import contextvars
+import threading
+import unittest
+from app import timing
+from app.timing import RequestTimings, ServerTimingMiddleware
+
+
+class TestRequestTimings(unittest.TestCase):
+
+    def test_measure_adds_up_time_and_calls(self):
+        timings = RequestTimings()
+        token = timing._timings.set(timings)
+        try:
+            for _ in range(2):
+                with timing.measure("connpass"):
+                    pass
+            timing.count("cache-hit")
+            timing.count("cache-hit")
+        finally:
+            timing._timings.reset(token)
+
+        header = timings.header_value()
+        self.assertRegex(header,
+                         r'^connpass;dur=\d+\.\d;desc="2 calls", '
+                         r'cache-hit;desc="2"$')
+
+    def test_nothing_is_recorded_outside_a_request(self):
+        with timing.measure("connpass"):
+            timing.count("cache-hit")
+            timing.mark("respond")
+
+        self.assertIsNone(timing.current())
+
+    def test_threads_report_into_the_same_timings(self):
+        timings = RequestTimings()
+        token = timing._timings.set(timings)
+        try:
+            threads = [threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(timing.count, "cache-miss")) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            timing._timings.reset(token)
+
+        self.assertEqual(timings.header_value(), 'cache-miss;desc="3"')
+
+
+class TestServerTimingMiddleware(unittest.TestCase):
+
+    def test_adds_header_with_handler_metrics(self):
+        async def app(scope, receive, send):
+            with timing.measure("sort"):
+                pass
+            timing.mark("respond")
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body", "body": b"[]"})
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(ServerTimingMiddleware(app)(
+            {"type": "http"}, None, send))
+
+        headers = dict(sent[0]["headers"])
+        names = [part.split(";")[0]
+                 for part in headers[b"server-timing"].decode().split(", ")]
+        self.assertEqual(names, ["sort", "serialize", "total"])
+        self.assertIsNone(timing.current())
+
+
+if __name__ == '__main__':
+    unittest.main()